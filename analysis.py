@@ -1,17 +1,29 @@
+import asyncio
+import base64
 import json
-import ollama
-import fitz  # PyMuPDF for reading PDFs
 import os
 import re
+import sys
 import mailparser
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Tuple
-import pdfplumber
 from datetime import datetime
 
+# Shared pipeline modules live next to the Streamlit app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "code"))
+from document_extractor import DocumentExtractor
+from llm_backend import LLMBackend, get_backend
+from llm_cache import ResponseCache, get_response_cache
+from prompt_resources import PromptResources, get_prompt_resources
+from response_parser import parse_json_response, stream_json_response
+
 
 class FileReader:
     """Handles reading content from various file types."""
 
+    def __init__(self, extractor: Optional[DocumentExtractor] = None):
+        self.extractor = extractor or DocumentExtractor()
+
     def read_text_file(self, filename: str) -> str:
         """Reads content from a text file."""
         try:
@@ -22,15 +34,21 @@ class FileReader:
             return ""
 
     def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extracts text from a PDF file using pdfplumber."""
+        """Extracts text from a PDF file (PyMuPDF, pdfplumber only for sparse pages)."""
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                text = " ".join(page.extract_text() or "" for page in pdf.pages)
-            return text
+            return self.extractor.extract_text(pdf_path)
         except Exception as e:
             print(f"Error extracting text from {pdf_path}: {e}")
             return ""
 
+    def extract_text_from_pdf_bytes(self, pdf_data: bytes) -> str:
+        """Extracts text from in-memory PDF bytes without writing a temp file."""
+        try:
+            return self.extractor.extract_text(pdf_data)
+        except Exception as e:
+            print(f"Error extracting text from PDF attachment: {e}")
+            return ""
+
     def extract_text_from_eml(self, eml_path: str) -> Tuple[str, str]:
         """Extracts text from an EML file, including attachments."""
         try:
@@ -43,13 +61,9 @@ class FileReader:
                 if "text/plain" in content_type:
                     attachment_text += f" Attachment Text: {payload}"
                 elif "application/pdf" in content_type:
-                    import base64
                     try:
                         pdf_data = base64.b64decode(payload)
-                        with open("temp.pdf", "wb") as f:
-                            f.write(pdf_data)
-                        attachment_text += f" Attachment PDF: {self.extract_text_from_pdf('temp.pdf')}"
-                        os.remove("temp.pdf")
+                        attachment_text += f" Attachment PDF: {self.extract_text_from_pdf_bytes(pdf_data)}"
                     except Exception as e:
                         print(f"Error processing PDF attachment in {eml_path}: {e}")
             return email_body, attachment_text
@@ -76,9 +90,8 @@ class DataExtractor:
             file_path = os.path.join(self.folder, filename)
             if filename.lower().endswith(".pdf"):
                 try:
-                    with fitz.open(file_path) as doc:
-                        text = " ".join([page.get_text("text").replace("\n", " ") for page in doc]).strip()
-                        extracted_text.append(f"[{filename}]: {text}")
+                    text = self.reader.extractor.extract_text(file_path)
+                    extracted_text.append(f"[{filename}]: {text}")
                 except Exception as e:
                     print(f"Error reading {filename}: {e}")
             elif filename.lower().endswith(".eml"):
@@ -121,38 +134,63 @@ class PromptBuilder:
 class Classifier:
     """Handles classification and sub-classification using an AI model."""
 
-    def __init__(self, model: str = "deepseek-r1:14b"):
-        self.model = model
+    def __init__(self, model: str = "deepseek-r1:14b", max_concurrency: int = 4, timeout: float = 120.0, resources: Optional[PromptResources] = None, cache: Optional[ResponseCache] = None, backend: Optional[LLMBackend] = None, stream: bool = False):
+        # Backend is shared per model so its pooled client and keep_alive survive across runs
+        self.backend = backend or get_backend(model=model)
+        self.model = self.backend.model
+        self.stream = stream
+        self.llm_metrics = []
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
         self.reader = FileReader()
+        self.resources = resources or get_prompt_resources()
+        self.cache = cache or get_response_cache()
 
     def extract_json_block(self, text: str) -> Optional[str]:
         """Extracts JSON block from text."""
         match = re.search(r'```json\n(.*?)\n```', text, re.DOTALL)
         return match.group(1) if match else None
 
+    def chat(self, prompt: str) -> str:
+        """Sends a prompt to the model, answering from the response cache when possible."""
+        key = self.cache.make_key(self.model, prompt, self.resources.version)
+        cached = self.cache.get(key)
+        if cached is not None:
+            print("♻️ Reusing cached model response.")
+            return cached
+        if self.stream:
+            content, metrics = stream_json_response(self.backend.chat_stream(prompt))
+            self.llm_metrics.append(metrics)
+            print(f"⏱️ First token after {metrics['time_to_first_token'] or 0:.2f}s, JSON complete after {metrics['time_to_json'] or metrics['total_time']:.2f}s")
+        else:
+            content = self.backend.chat(prompt)
+        if parse_json_response(content)[0] is not None:
+            self.cache.put(key, content)
+        return content
+
     def classify(self, prompt: str) -> List[Dict]:
         """Sends prompt to the model and processes the response."""
         print("🤖 Gearing up the AI engine... Compiling the classification request!")
-        response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
-        response_content_text = response['message']['content']
-        response_content = self.extract_json_block(response_content_text)
+        response_content_text = self.chat(prompt)
+        # Tolerates answers without the ```json fence, with trailing commas or surrounding prose
+        response_content, _ = parse_json_response(response_content_text)
 
-        if not response_content:
+        if response_content is None:
             print("❌ ERROR: No valid JSON found in response.")
             return []
 
         print("📊 Data processed! Here’s the classified breakdown:")
         print(response_content)
-        return json.loads(response_content)
+        return response_content if isinstance(response_content, list) else [response_content]
 
-    def sub_classify(self, category: str, associated_text: str, confidence_score: float, extracted_fields: Dict) -> List[Dict]:
-        """Performs sub-classification for specific categories."""
-        final_output = []
-        sub_categories_file_mapping = self.reader.read_text_file("resources/ruleset_files.json")
-        mapping = json.loads(sub_categories_file_mapping) if sub_categories_file_mapping else {}
+    def build_sub_prompt(self, category: str, associated_text: str) -> Optional[str]:
+        """Builds the sub-classification prompt, or None if the category has no ruleset."""
+        return self.resources.build_sub_prompt(category, associated_text)
 
-        sub_categories_file_name = mapping.get(category)
-        if not sub_categories_file_name:
+    def build_sub_result(self, category: str, confidence_score: float, extracted_fields: Dict, response_sub_content_text: Optional[str]) -> List[Dict]:
+        """Turns a raw sub-classification response into the final output entry."""
+        final_output = []
+        if response_sub_content_text is None:
             final_output.append({
                 "category": category,
                 "confidence_score": confidence_score,
@@ -161,20 +199,12 @@ class Classifier:
             })
             return final_output
 
-        sub_categories = self.reader.read_text_file(sub_categories_file_name)
-        sub_objective = self.reader.read_text_file("resources/sub_objective.txt")
-        sub_instructions = self.reader.read_text_file("resources/sub_instructions.txt")
-
-        prompt_sub = f"{sub_objective}\n\n{sub_categories}\n\nEmail to Classify:\n{associated_text}\n\n{sub_instructions}"
-        response_sub = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt_sub}])
-        response_sub_content_text = response_sub['message']['content']
-        response_sub_content = self.extract_json_block(response_sub_content_text)
+        sub_response, _ = parse_json_response(response_sub_content_text)
 
         print("📊 Sub-classification processed! Here’s the breakdown:")
-        print(response_sub_content)
+        print(sub_response)
 
-        try:
-            sub_response = json.loads(response_sub_content)
+        if isinstance(sub_response, dict):
             final_output.append({
                 "category": category,
                 "confidence_score": confidence_score,
@@ -184,9 +214,9 @@ class Classifier:
                 },
                 "extracted_fields": extracted_fields
             })
-        except json.JSONDecodeError:
+        else:
             print("❌ ERROR: Sub-response is not valid JSON.")
-            print(response_sub_content)
+            print(response_sub_content_text)
             final_output.append({
                 "category": category,
                 "confidence_score": confidence_score,
@@ -196,6 +226,54 @@ class Classifier:
 
         return final_output
 
+    def sub_classify(self, category: str, associated_text: str, confidence_score: float, extracted_fields: Dict) -> List[Dict]:
+        """Performs sub-classification for specific categories."""
+        prompt_sub = self.build_sub_prompt(category, associated_text)
+        if prompt_sub is None:
+            return self.build_sub_result(category, confidence_score, extracted_fields, None)
+
+        return self.build_sub_result(category, confidence_score, extracted_fields, self.chat(prompt_sub))
+
+    async def _chat_async(self, pool: ThreadPoolExecutor, semaphore: asyncio.Semaphore, prompt: str) -> Optional[str]:
+        """Runs one blocking chat call on the pool under the concurrency cap and timeout."""
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(pool, self.chat, prompt), self.timeout)
+            except asyncio.TimeoutError:
+                print(f"❌ ERROR: Sub-classification timed out after {self.timeout}s.")
+                return None
+
+    def sub_classify_all(self, items: List[Dict]) -> List[Dict]:
+        """Sub-classifies all items concurrently and returns results in the original item order."""
+        prompts = {}
+        for index, item in enumerate(items):
+            prompt_sub = self.build_sub_prompt(item["classification"]["category"], item.get("associated_text", "No associated text found"))
+            if prompt_sub is not None:
+                prompts[index] = prompt_sub
+
+        async def gather_responses(pool):
+            semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+            return await asyncio.gather(*(self._chat_async(pool, semaphore, prompt) for prompt in prompts.values()))
+
+        responses = {}
+        if prompts:
+            # A dedicated pool that is not waited for, so a timed-out call does not hold up the run (asyncio.run joins its default executor)
+            pool = ThreadPoolExecutor(max_workers=max(1, self.max_concurrency))
+            try:
+                responses = dict(zip(prompts, asyncio.run(gather_responses(pool))))
+            finally:
+                pool.shutdown(wait=False)
+
+        final_output = []
+        for index, item in enumerate(items):
+            final_output.extend(self.build_sub_result(
+                item["classification"]["category"],
+                item["classification"]["confidence_score"],
+                item.get("extracted_fields", {}),
+                responses.get(index)
+            ))
+        return final_output
+
 
 class AnalysisApp:
     """Main application class coordinating the analysis process."""
@@ -208,7 +286,7 @@ class AnalysisApp:
             data_folder="data",
             output_file="resources/request.txt"
         )
-        self.classifier = Classifier(model="deepseek-r1:14b")
+        self.classifier = Classifier(model="deepseek-r1:14b", cache=get_response_cache("cache/llm_responses.sqlite"))
 
     def run(self):
         """Runs the full analysis process."""
@@ -217,17 +295,10 @@ class AnalysisApp:
         print("🚀 Sending the prompt to the AI model... Stand by for classification!")
 
         classifications = self.classifier.classify(prompt)
-        final_output = []
 
         for item in classifications:
-            category = item["classification"]["category"]
-            confidence_score = item["classification"]["confidence_score"]
-            associated_text = item.get("associated_text", "No associated text found")
-            extracted_fields = item.get("extracted_fields", {})
-            
-            print(f"📌 {category}: {associated_text}")
-            sub_results = self.classifier.sub_classify(category, associated_text, confidence_score, extracted_fields)
-            final_output.extend(sub_results)
+            print(f"📌 {item['classification']['category']}: {item.get('associated_text', 'No associated text found')}")
+        final_output = self.classifier.sub_classify_all(classifications)
 
         print("Here's the final output. Enjoy!")
         print(json.dumps(final_output, indent=4))
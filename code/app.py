@@ -1,52 +1,219 @@
 import streamlit as st
+import logging
 import os
-import shutil
+import time
+import uuid
 import pandas as pd 
-import numpy as np
-from classifier import AnalysisLauncher
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+import classifier
+from dedup import Deduplicator, analyze_deduplicated
+from extraction_cache import get_extraction_cache
+from field_normalizer import normalize_output
+from instrumentation import Tracer
+from job_queue import get_job_queue
+from llm_cache import get_response_cache
+from model_cascade import get_model_cascade
+from pre_classifier import PreClassifier
+from prompt_budget import PromptBudget
+from results_store import get_results_store
+from workspace import PromptArchive, Workspace
+
+# Normalized result columns shown in the results table, in display order
+DISPLAY_COLUMNS = {"file": "File Name", "category": "Category", "confidence": "Category Confidence", "sub_category": "Sub-Category",
+                   "sub_confidence": "Sub-Category Confidence", "deal_name": "Deal Name", "amount": "Amount", "transaction_date": "Transaction Date",
+                   "account_number": "Account Number", "currency": "Currency", "fields_verified": "Fields Verified"}
+
+logger = logging.getLogger(__name__)
 
 class LendingServiceApp:
-    def __init__(self):
+    def __init__(self, llm_workers: int = 1, extract_workers: int = 0, cache_path: Optional[str] = None, stream: bool = False, extraction_cache_path: Optional[str] = None, max_prompt_tokens: int = 0, pre_classify: bool = False, combined: bool = False, dedup: bool = False, static_prefix: bool = False, fast_model: str = "", escalation_threshold: float = 0.7, trace_path: Optional[str] = None, job_db_path: Optional[str] = None, results_store_path: Optional[str] = None, workspace_root: Optional[str] = None, archive_root: Optional[str] = None):
         self.file_paths = []
-        self.temp_dir = "temp"
-        os.makedirs(self.temp_dir, exist_ok=True)
+        # Uploads go to a private workspace per browser session (system temp folder unless WORKSPACE_ROOT is set); analysis reads only file_paths
+        self.workspace_root = workspace_root
+        self.workspace: Optional[Workspace] = None
+        self.archive_root = archive_root  # Prompts and responses are archived per run below this folder when set and enabled
+        self.archive_prompts = False
+        # llm_workers: threads issuing model calls; extract_workers: processes for PDF/EML parsing (0 = inline)
+        self.llm_workers = llm_workers
+        self.extract_workers = extract_workers
+        self.stream = stream  # Stream model output and stop once the JSON answer is complete
+        self.errors = {}
+        # Model responses are cached in memory, and also in SQLite when cache_path is set
+        self.cache = get_response_cache(cache_path)
+        # Extracted text is cached on disk by content hash when extraction_cache_path is set
+        self.extraction_cache_path = extraction_cache_path
+        self.max_prompt_tokens = max_prompt_tokens  # 0 sends the full email in one prompt
+        self.pre_classify = pre_classify  # Answer clear-cut emails from keyword rules without a model call
+        self.pre_classifier = PreClassifier()
+        self.combined = combined  # One model call per email for category and sub-category (False = two-stage)
+        self.dedup = dedup  # Classify one email per cluster of duplicates, forwards and replies
+        self.deduplicator = Deduplicator()
+        self.static_prefix = static_prefix  # Static prompt sections as a system message, email last, so the model server reuses its prefix cache
+        self.fast_model = fast_model  # Small first-pass model; empty sends everything to the default model
+        self.escalation_threshold = escalation_threshold  # Fast-model answers less confident than this go to the default model
+        self.tracer = Tracer(trace_path)  # Per-stage spans, also appended to trace_path as JSONL when set
+        # With a job database, Analyze queues a job for the background worker instead of blocking the page
+        self.job_db_path = job_db_path
+        self.poll_seconds = 1.0
+        self.results_store_path = results_store_path  # Parquet store that keeps every run's classifications, when set
     
+    def make_launcher(self, archive: Optional[PromptArchive] = None):
+        extraction_cache = get_extraction_cache(self.extraction_cache_path) if self.extraction_cache_path else None
+        budget = PromptBudget(self.max_prompt_tokens) if self.max_prompt_tokens else None
+        return classifier.AnalysisLauncher(None, cache=self.cache, stream=self.stream, extraction_cache=extraction_cache, budget=budget,
+                                           pre_classifier=self.pre_classifier if self.pre_classify else None, combined=self.combined, tracer=self.tracer,
+                                           static_prefix=self.static_prefix,
+                                           cascade=get_model_cascade(self.fast_model, threshold=self.escalation_threshold) if self.fast_model else None,
+                                           archive=archive)
+
+    def analyze_file(self, path, extract_future=None, archive=None):
+        engine = self.make_launcher(archive)
+        text = extract_future.result() if extract_future is not None else engine.extract_text_from_path(path)
+        return engine.process_text(os.path.basename(path), classifier.require_text(path, text))
+
+    # A fresh archive folder per run, so concurrent sessions never write to the same place
+    def make_archive(self) -> Optional[PromptArchive]:
+        if not (self.archive_root and self.archive_prompts):
+            return None
+        return PromptArchive(os.path.join(self.archive_root, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"))
+
     def analyze_files(self):
+        paths = list(self.file_paths)
+        archive = self.make_archive()
+        if self.dedup:
+            return self.analyze_files_deduplicated(paths, archive)
         output_dict = {}
-        for filename in os.listdir(self.temp_dir):    
-            engine = AnalysisLauncher(self.file_paths)
-            output = engine.process(filename)
-            output_dict[filename] = output
+        self.errors = {}
+        extract_pool = ProcessPoolExecutor(max_workers=self.extract_workers) if self.extract_workers > 0 else None
+        try:
+            # Queue all extractions up front so parsing runs ahead of the model calls
+            extract_futures = {path: extract_pool.submit(classifier.extract_file_text, path, self.extraction_cache_path) for path in paths} if extract_pool else {}
+            with ThreadPoolExecutor(max_workers=max(1, self.llm_workers)) as llm_pool:
+                futures = {path: llm_pool.submit(self.analyze_file, path, extract_futures.get(path), archive) for path in paths}
+                for path in paths:
+                    filename = os.path.basename(path)
+                    # A failing file is recorded and left empty instead of aborting the batch
+                    try:
+                        output_dict[filename] = futures[path].result()
+                    except Exception as e:
+                        logger.error(f"Error analyzing {filename}: {e}")
+                        self.errors[filename] = str(e)
+                        output_dict[filename] = []
+        finally:
+            if extract_pool:
+                extract_pool.shutdown()
         return output_dict
     
+    def analyze_files_deduplicated(self, paths, archive=None):
+        output_dict = {os.path.basename(path): [] for path in paths}
+        self.errors = {}
+        for path, results, error in analyze_deduplicated(paths, lambda path: classifier.require_text(path, self.make_launcher(archive).extract_text_from_path(path)),
+                                                         lambda path, text: self.make_launcher(archive).process_text(os.path.basename(path), text),
+                                                         self.deduplicator, self.llm_workers):
+            output_dict[os.path.basename(path)] = results
+            if error:
+                logger.error(f"Error analyzing {os.path.basename(path)}: {error}")
+                self.errors[os.path.basename(path)] = error
+        return output_dict
+
+    def job_options(self):
+        return {"llm_workers": self.llm_workers, "stream": self.stream, "max_prompt_tokens": self.max_prompt_tokens,
+                "pre_classify": self.pre_classify, "combined": self.combined, "dedup": self.dedup,
+                "static_prefix": self.static_prefix, "fast_model": self.fast_model, "escalation_threshold": self.escalation_threshold, "archive": self.archive_prompts}
+
+    def job_queue(self):
+        return get_job_queue(self.job_db_path, cache_path=self.cache.db_path, extraction_cache_path=self.extraction_cache_path,
+                             results_store_path=self.results_store_path, archive_root=self.archive_root)
+
+    def submit_job(self, uploaded: bool) -> str:
+        queue = self.job_queue()
+        workspace = None
+        paths = [os.path.abspath(path) for path in self.file_paths]
+        if uploaded and self.workspace:
+            # The job takes over the session's upload workspace and the worker deletes it; new uploads get a new one
+            workspace = os.path.abspath(self.workspace.detach())
+            self.release_workspace()
+        return queue.submit(paths, self.job_options(), workspace)
+
+    def show_job(self, job_id: str):
+        queue = self.job_queue()
+        job = queue.job(job_id)
+        if job is None:
+            st.error(f"Unknown job {job_id}")
+            return
+        # Results already fetched survive reruns; a page refresh starts again from the first file
+        state = st.session_state.setdefault(f"job-{job_id}", {"after": 0, "frame": self.flatten_output({}), "errors": {}})
+        running = job["status"] in ("queued", "running")
+
+        @st.fragment(run_every=self.poll_seconds if running else None)
+        def progress():
+            job = queue.job(job_id)
+            rows = queue.results(job_id, state["after"])
+            if rows:
+                # Only the newly finished files are flattened and appended to the frame
+                state["after"] = rows[-1]["seq"]
+                state["frame"] = pd.concat([state["frame"], self.flatten_output({row["file"]: row["results"] for row in rows})], ignore_index=True)
+                state["errors"].update({row["file"]: row["error"] for row in rows if row["error"]})
+            st.progress(job["done"] / job["total"] if job["total"] else 1.0, text=f"Job {job_id}: {job['status']}, {job['done']}/{job['total']} file(s)")
+            if job["error"]:
+                st.error(f"Job {job_id} failed: {job['error']}")
+            for filename, error in state["errors"].items():
+                st.warning(f"{filename} failed: {error}")
+            st.dataframe(state["frame"])
+            if running and job["status"] not in ("queued", "running"):
+                st.rerun()  # Stop polling once the job is done
+
+        progress()
+
+    # The session's upload workspace survives Streamlit reruns in session_state; outside Streamlit it lives on the app
+    def session_workspace(self) -> Workspace:
+        if self.workspace is None:
+            state = st.session_state if st.runtime.exists() else {}
+            self.workspace = state.get("workspace") or Workspace(self.workspace_root)
+            state["workspace"] = self.workspace
+        return self.workspace
+
+    def release_workspace(self):
+        self.workspace = None
+        if st.runtime.exists():
+            st.session_state.pop("workspace", None)
+
+    # Spool one uploaded file into the session's workspace in fixed-size chunks
+    def save_upload(self, uploaded_file) -> str:
+        return self.session_workspace().save_upload(uploaded_file)
+
+    # Deletes only this session's uploads; folder inputs and other sessions' files are never touched
     def clean_inventory(self):
-        if os.path.exists(self.temp_dir) and os.path.isdir(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
-            print(f"Deleted folder: {self.temp_dir}")
+        if self.workspace is not None:
+            self.workspace.cleanup()
+            logger.info(f"🧹 Deleted folder: {self.workspace.path}")
+            self.release_workspace()
 
+    # Typed, source-checked fields for the whole batch at once (Decimal amounts, datetime64 dates, ISO currencies)
     def flatten_output(self, output_dict):
-        data = []
-        for file_name, entries in output_dict.items():
-            for entry in entries:
-                row = {
-                    "File Name": file_name,
-                    "Category": entry["category"],
-                    "Category Confidence": entry["confidence_score"],
-                    "Sub-Category": entry["sub_category"].get("name", "N/A"),
-                    "Sub-Category Confidence": entry["sub_category"].get("confidence_score", np.nan),
-                    "Deal Name": entry["extracted_fields"].get("deal_name", "N/A"),
-                    "Amount": entry["extracted_fields"].get("amount", np.nan),
-                    "Transaction Date": entry["extracted_fields"].get("transaction_date", "N/A"),
-                    "Account Number": entry["extracted_fields"].get("account_number", "N/A"),
-                    "Currency": entry["extracted_fields"].get("currency", "N/A"),
-                }
-                data.append(row)
-        return pd.DataFrame(data)
+        frame = normalize_output(output_dict)
+        frame["sub_category"] = frame["sub_category"].fillna("N/A")
+        return frame.rename(columns=DISPLAY_COLUMNS)[list(DISPLAY_COLUMNS.values())]
 
     def run(self):
         st.title("Commercial Bank Lending Service")
         st.write("Choose how to provide files for analysis:")
         
+        self.llm_workers = int(st.sidebar.number_input("Concurrent model calls", min_value=1, max_value=32, value=self.llm_workers))
+        self.extract_workers = int(st.sidebar.number_input("Extraction processes (0 = inline)", min_value=0, max_value=32, value=self.extract_workers))
+        self.stream = st.sidebar.checkbox("Stream model responses", value=self.stream)
+        self.max_prompt_tokens = int(st.sidebar.number_input("Prompt token budget (0 = off)", min_value=0, max_value=131072, value=self.max_prompt_tokens, step=512))
+        self.pre_classify = st.sidebar.checkbox("Rule-based pre-classifier", value=self.pre_classify)
+        self.combined = st.sidebar.checkbox("Single-pass classification", value=self.combined, help="Classify and sub-classify in one model call")
+        self.static_prefix = st.sidebar.checkbox("Static prompt prefix", value=self.static_prefix, help="Send categories and instructions as a fixed system message so the model server can reuse its prompt cache")
+        self.fast_model = st.sidebar.text_input("Fast first-pass model", value=self.fast_model, help="e.g. qwen2.5:3b; leave empty to use only the default model").strip()
+        self.escalation_threshold = st.sidebar.slider("Escalation confidence threshold", min_value=0.0, max_value=1.0, value=self.escalation_threshold, step=0.05,
+                                                      disabled=not self.fast_model, help="Fast-model answers below this confidence are re-run on the default model")
+        self.dedup = st.sidebar.checkbox("Skip duplicate emails", value=self.dedup, help="Classify one email per group of duplicates, forwards and replies")
+        if self.archive_root:
+            self.archive_prompts = st.sidebar.checkbox("Archive prompts and responses", value=self.archive_prompts, help=f"Keep every model call of a run under {self.archive_root}")
+
         option = st.radio("Select an option:", ("Upload Files", "Specify Folder Path"))
         
         try:
@@ -55,10 +222,7 @@ class LendingServiceApp:
                 
                 if uploaded_files:
                     for uploaded_file in uploaded_files:
-                        temp_path = os.path.join(self.temp_dir, uploaded_file.name)
-                        with open(temp_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-                        self.file_paths.append(temp_path)
+                        self.file_paths.append(self.save_upload(uploaded_file))
                     st.success(f"Uploaded {len(uploaded_files)} file(s)")
             
             elif option == "Specify Folder Path":
@@ -69,19 +233,39 @@ class LendingServiceApp:
                 else:
                     st.error("Invalid folder path. Please enter a valid directory.")
             
-            if self.file_paths and st.button("Analyze"):
+            analyze = bool(self.file_paths) and st.button("Analyze")
+            if analyze and self.job_db_path:
+                st.query_params["job"] = self.submit_job(uploaded=option == "Upload Files")
+            elif analyze:
                 with st.spinner("Running analysis..."):
                     result = self.analyze_files()
                     st.write(result)
+                    for filename, error in self.errors.items():
+                        st.warning(f"{filename} failed: {error}")
+                    st.caption(f"Model response cache: {self.cache.stats()}")
+                    st.caption(f"Stage timings: {self.tracer.stats()}")
+                    st.caption(f"Pipeline counters: {self.tracer.counters()}")
+                    if self.pre_classify:
+                        st.caption(f"Pre-classifier: {self.pre_classifier.stats()}")
+                    if self.dedup:
+                        st.caption(f"Duplicates: {self.deduplicator.stats()}")
                     df = self.flatten_output(result)
                     st.dataframe(df)
+                    if self.results_store_path:
+                        get_results_store(self.results_store_path).append(result)
                 self.clean_inventory()
             
+            # The job ID lives in the URL, so a refreshed page picks the job up again
+            if self.job_db_path and st.query_params.get("job"):
+                self.show_job(st.query_params["job"])
+
             if not self.file_paths:
                 st.info("Please upload files or specify a valid folder path to enable the 'Analyze' button.")
         except Exception as e:
             st.error(f"An error occurred: {e}")
 
 if __name__ == "__main__":
-    app = LendingServiceApp()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    app = LendingServiceApp(cache_path="cache/llm_responses.sqlite", extraction_cache_path="cache/extractions.sqlite",
+                            job_db_path="results/jobs.sqlite", results_store_path="results/store", archive_root="results/archive")
     app.run()
@@ -0,0 +1,202 @@
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import os
+import sys
+import uuid
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from classifier import AnalysisLauncher, require_text
+from dedup import Deduplicator, analyze_deduplicated
+from extraction_cache import get_extraction_cache
+from instrumentation import Tracer, serve_metrics
+from llm_backend import BACKENDS, get_backend
+from llm_cache import get_response_cache
+from model_cascade import get_model_cascade
+from pre_classifier import PreClassifier
+from prompt_budget import PromptBudget
+from results_store import ResultsStore
+from workspace import PromptArchive
+
+SUPPORTED_EXTENSIONS = (".pdf", ".eml")
+# Classified items buffered before each Parquet write to --results-store
+STORE_BATCH_ROWS = 1000
+
+
+def iter_input_files(paths: Iterable[str]) -> Iterator[str]:
+    """Yields supported files from a mix of file and folder paths."""
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                file_path = os.path.join(path, filename)
+                if os.path.isfile(file_path) and filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                    yield file_path
+        elif os.path.isfile(path):
+            yield path
+        else:
+            print(f"Warning: {path} not found.", file=sys.stderr)
+
+
+def completed_files(output_path: str) -> Set[str]:
+    """Reads an existing JSONL output and returns the files whose terminal "done" record was written.
+
+    Item records alone do not count: a crash can leave only some of a file's items in the output.
+    """
+    done = set()
+    if output_path == "-" or not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partial last line from an interrupted run
+            if record.get("done"):
+                done.add(record["file"])
+    return done
+
+
+def analyze_path(path: str, launcher_factory) -> List[Dict]:
+    """Extracts and classifies one file, returning one record per classified item."""
+    try:
+        launcher = launcher_factory()
+        filename = os.path.basename(path)
+        items = launcher.process_text(filename, require_text(path, launcher.extract_text_from_path(path)))
+    except Exception as e:
+        return [{"file": path, "error": str(e)}]
+    return to_records(path, items)
+
+
+def to_records(path: str, items: List[Dict], error: Optional[str] = None) -> List[Dict]:
+    """One record per item, then a terminal {"done": true} record that tells --resume the file is complete; failures get one error record."""
+    if error is not None:
+        return [{"file": path, "error": error}]
+    return [{"file": path, "index": index, **item} for index, item in enumerate(items)] + [{"file": path, "done": True, "items": len(items)}]
+
+
+def iter_records(files: Iterable[str], launcher_factory, workers: int = 1) -> Iterator[Dict]:
+    """Yields records as files finish, keeping at most 2 x workers files in flight."""
+    files = iter(files)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        in_flight = set()
+        for path in files:
+            in_flight.add(pool.submit(analyze_path, path, launcher_factory))
+            if len(in_flight) >= 2 * max(1, workers):
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield from future.result()
+        for future in in_flight:
+            yield from future.result()
+
+
+def iter_deduplicated_records(files: Iterable[str], launcher_factory, deduplicator: Deduplicator, workers: int = 1, window: int = 500) -> Iterator[Dict]:
+    """Yields records window by window, classifying one file per cluster of duplicates within each window."""
+    files = iter(files)
+    while True:
+        batch = list(itertools.islice(files, window))
+        if not batch:
+            return
+        for path, items, error in analyze_deduplicated(batch, lambda path: require_text(path, launcher_factory().extract_text_from_path(path)),
+                                                       lambda path, text: launcher_factory().process_text(os.path.basename(path), text),
+                                                       deduplicator, workers):
+            yield from to_records(path, items, error)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Classify PDF/EML files in batch and stream one JSONL record per classified item.")
+    parser.add_argument("paths", nargs="+", help="Files and/or folders to analyze")
+    parser.add_argument("--output", "-o", default="-", help="JSONL output file ('-' for stdout)")
+    parser.add_argument("--workers", type=int, default=1, help="Files analyzed concurrently")
+    parser.add_argument("--resume", action="store_true", help="Skip files already completed in --output")
+    parser.add_argument("--limit", type=int, help="Analyze at most this many files")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="ollama")
+    parser.add_argument("--model", help="Model name for the backend")
+    parser.add_argument("--fast-model", help="Small model for a first pass; invalid or low-confidence answers escalate to --model")
+    parser.add_argument("--escalation-threshold", type=float, default=0.7, help="With --fast-model, escalate answers whose confidence is below this")
+    parser.add_argument("--stream", action="store_true", help="Stream model output and stop at the first complete JSON block")
+    parser.add_argument("--max-prompt-tokens", type=int, default=0, help="Compact/chunk emails to this prompt size (0 = off)")
+    parser.add_argument("--pre-classify", action="store_true", help="Answer clear-cut emails from keyword rules without a model call")
+    parser.add_argument("--single-pass", action="store_true", help="Classify and sub-classify in one model call instead of 1 + N")
+    parser.add_argument("--static-prefix", action="store_true", help="Send static prompt sections as a system message with the email last")
+    parser.add_argument("--dedup", action="store_true", help="Classify one file per cluster of duplicate, forwarded or threaded emails")
+    parser.add_argument("--dedup-window", type=int, default=500, help="Files extracted and clustered together with --dedup")
+    parser.add_argument("--response-cache", default="cache/llm_responses.sqlite")
+    parser.add_argument("--extraction-cache", default="cache/extractions.sqlite")
+    parser.add_argument("--results-store", help="Also append classified items to this Parquet results store folder")
+    parser.add_argument("--archive-dir", help="Keep every prompt and response under this folder, one subfolder per file")
+    parser.add_argument("--log-level", default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    parser.add_argument("--trace-log", help="Append per-stage spans to this JSONL file")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port while running")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="Interface for --metrics-port (0.0.0.0 exposes file names on every interface)")
+    parser.add_argument("--profile-dir", help="Write a cProfile dump per file and stage to this folder")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stderr, level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    tracer = Tracer(args.trace_log, args.profile_dir)
+    metrics_server = serve_metrics(tracer, args.metrics_port, args.metrics_host) if args.metrics_port else None
+
+    backend = get_backend(args.backend, **({"model": args.model} if args.model else {}))
+    response_cache = get_response_cache(args.response_cache)
+    extraction_cache = get_extraction_cache(args.extraction_cache)
+    pre_classifier = PreClassifier() if args.pre_classify else None
+    deduplicator = Deduplicator() if args.dedup else None
+    archive = PromptArchive(args.archive_dir) if args.archive_dir else None
+    cascade = get_model_cascade(args.fast_model, args.model, args.escalation_threshold, args.backend) if args.fast_model else None
+
+    def launcher_factory():
+        budget = PromptBudget(args.max_prompt_tokens) if args.max_prompt_tokens else None
+        return AnalysisLauncher(None, cache=response_cache, backend=backend, stream=args.stream, extraction_cache=extraction_cache, budget=budget,
+                                pre_classifier=pre_classifier, combined=args.single_pass, tracer=tracer,
+                                static_prefix=args.static_prefix, cascade=cascade, archive=archive)
+
+    done = completed_files(args.output) if args.resume else set()
+    files = (path for path in iter_input_files(args.paths) if path not in done)
+    if args.limit is not None:
+        files = (path for _, path in zip(range(args.limit), files))
+
+    out = sys.stdout if args.output == "-" else open(args.output, "a" if args.resume else "w", encoding="utf-8")
+    written = 0
+    results_store = ResultsStore(args.results_store) if args.results_store else None
+    run_id = uuid.uuid4().hex
+    pending, pending_rows = defaultdict(list), 0
+    try:
+        # Progress prints go to stderr so stdout carries only JSONL
+        with contextlib.redirect_stdout(sys.stderr):
+            records = iter_deduplicated_records(files, launcher_factory, deduplicator, args.workers, args.dedup_window) if deduplicator \
+                else iter_records(files, launcher_factory, args.workers)
+            for record in records:
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                written += 1
+                if results_store and "category" in record:
+                    pending[record["file"]].append(record)
+                    pending_rows += 1
+                    if pending_rows >= STORE_BATCH_ROWS:
+                        results_store.append(pending, run_id)
+                        pending, pending_rows = defaultdict(list), 0
+    finally:
+        if results_store and pending:
+            results_store.append(pending, run_id)
+        if out is not sys.stdout:
+            out.close()
+        tracer.close()
+        if metrics_server:
+            metrics_server.shutdown()
+    print(f"Wrote {written} record(s); response cache {response_cache.stats()}", file=sys.stderr)
+    if pre_classifier:
+        print(f"Pre-classifier {pre_classifier.stats()}", file=sys.stderr)
+    if deduplicator:
+        print(f"Duplicates {deduplicator.stats()}", file=sys.stderr)
+    if cascade:
+        print(f"Model cascade {cascade.stats()}", file=sys.stderr)
+    print(f"Stage timings {tracer.stats()}", file=sys.stderr)
+    print(f"Pipeline counters {tracer.counters()}", file=sys.stderr)
+    print(f"Prompt evaluation {backend.eval_stats()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
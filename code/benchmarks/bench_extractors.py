@@ -0,0 +1,113 @@
+"""Compares PDF extraction engines on the sample corpus for throughput and peak memory.
+
+Run from the code/ folder:
+    python benchmarks/bench_extractors.py --corpus ../artifacts/dataset --synthetic-pages 200
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import fitz  # PyMuPDF for reading PDFs
+import mailparser
+import pdfplumber
+from document_extractor import DocumentExtractor
+
+
+def load_corpus(folder: str) -> List[bytes]:
+    """Collects top-level PDFs and PDF attachments of EML files from a folder."""
+    documents = []
+    for filename in sorted(os.listdir(folder)):
+        path = os.path.join(folder, filename)
+        if filename.lower().endswith(".pdf"):
+            with open(path, "rb") as f:
+                documents.append(f.read())
+        elif filename.lower().endswith(".eml"):
+            for attachment in mailparser.parse_from_file(path).attachments:
+                if "application/pdf" in attachment.get("mail_content_type", "").lower():
+                    documents.append(base64.b64decode(attachment["payload"]))
+    return documents
+
+
+def synthetic_pdf(pages: int) -> bytes:
+    """Builds a multi-page agreement-like PDF so page-level parallelism has something to split."""
+    doc = fitz.open()
+    for index in range(pages):
+        page = doc.new_page()
+        lines = [f"Section {index}.{line} The Borrower shall pay USD {1000 + line:,}.00 to Account 5432{line} on 03/{line % 28 + 1:02d}/2025." for line in range(40)]
+        page.insert_text((36, 48), "\n".join(lines), fontsize=8)
+    return doc.tobytes()
+
+
+def run_pdfplumber(document: bytes) -> str:
+    import io
+    with pdfplumber.open(io.BytesIO(document)) as pdf:
+        return " ".join(page.extract_text() or "" for page in pdf.pages)
+
+
+ENGINES = {
+    "pymupdf": lambda document: DocumentExtractor(page_workers=1).extract_text(document),
+    "pymupdf-parallel": lambda document: DocumentExtractor(parallel_page_threshold=16).extract_text(document),
+    "pdfplumber": run_pdfplumber,
+}
+
+
+def measure(engine: str, documents: List[bytes], repeat: int, queue):
+    """Runs one engine in a fresh process so peak RSS is attributable to it."""
+    pages = sum(fitz.open(stream=document, filetype="pdf").page_count for document in documents)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    chars = 0
+    for _ in range(repeat):
+        for document in documents:
+            chars += len(ENGINES[engine](document))
+    elapsed = time.perf_counter() - start
+    queue.put({
+        "engine": engine,
+        "documents": len(documents) * repeat,
+        "pages": pages * repeat,
+        "seconds": round(elapsed, 4),
+        "pages_per_second": round(pages * repeat / elapsed, 2) if elapsed else None,
+        "chars": chars,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_rss_growth_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join("..", "artifacts", "dataset"), help="Folder with PDF/EML samples")
+    parser.add_argument("--synthetic-pages", type=int, default=100, help="Add a synthetic PDF with this many pages (0 to skip)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    documents = load_corpus(args.corpus) if os.path.isdir(args.corpus) else []
+    if args.synthetic_pages:
+        documents.append(synthetic_pdf(args.synthetic_pages))
+
+    results: List[Dict] = []
+    context = multiprocessing.get_context("fork")
+    for engine in args.engines.split(","):
+        queue = context.Queue()
+        process = context.Process(target=measure, args=(engine, documents, args.repeat, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+        print(json.dumps(results[-1]))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
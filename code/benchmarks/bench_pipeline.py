@@ -0,0 +1,252 @@
+"""End-to-end throughput benchmark of AnalysisLauncher.process and LendingServiceApp.analyze_files against a fake Ollama server.
+
+Runs offline on CPU. Run from the code/ folder:
+    python benchmarks/bench_pipeline.py --pdfs 20 --emls 20 --attachments 2 --attachment-pages 10 --latency 0.2 --output ../results/bench.json
+    python benchmarks/bench_pipeline.py --compare ../results/bench.json --output ../results/bench-new.json
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import fitz  # PyMuPDF for writing PDFs
+import numpy as np
+
+import classifier
+from fake_ollama import FakeOllamaServer
+from llm_backend import get_backend
+from llm_cache import ResponseCache
+
+CODE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# One template per category, worded like the sample emails so every category gets traffic
+TEMPLATES = [
+    "Please adjust the fee structure for Deal {deal} to ${amount:,} effective {date}.",
+    "Transfer ${amount:,} from Deal {deal} to Deal {deal}B on {date}.",
+    "Issue a closing notice for Deal {deal} with a ${amount:,} reallocation fee on {date}, account {account}.",
+    "Adjust commitment for Deal {deal} by ${amount:,} on {date}.",
+    "Submit the quarterly ongoing fee payment of ${amount:,} for Deal {deal} on {date}, account {account}.",
+    "We received ${amount:,} principal repayment inbound for Deal {deal} on {date}, account {account}.",
+    "Send ${amount:,} outbound disbursement for Deal {deal} on {date} in USD, account {account}.",
+]
+FILLER = "The parties agree that the terms of the facility agreement remain in full force and effect. "
+
+
+def transaction(rng: random.Random, index: int) -> str:
+    template = rng.choice(TEMPLATES)
+    # Unique deal names keep prompts distinct, so the response cache never hides model latency
+    return template.format(deal=f"D{index:05d}", amount=rng.randrange(500, 90000, 50),
+                           date=f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2025", account=rng.randrange(10000, 99999))
+
+
+def synthetic_pdf(text: str, pages: int) -> bytes:
+    doc = fitz.open()
+    for page_index in range(max(1, pages)):
+        lines = [text] if page_index == 0 else []
+        lines += [FILLER.strip()] * 30
+        doc.new_page().insert_textbox(fitz.Rect(36, 36, 576, 806), "\n".join(lines), fontsize=8)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_corpus(folder: str, pdfs: int, emls: int, attachments: int, attachment_pages: int, seed: int = 7) -> Dict[str, int]:
+    """Writes synthetic PDF requests and EML requests with PDF attachments; returns the corpus size."""
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    total_bytes = 0
+    for index in range(pdfs):
+        data = synthetic_pdf(transaction(rng, index), attachment_pages)
+        with open(os.path.join(folder, f"request_{index:04d}.pdf"), "wb") as f:
+            f.write(data)
+        total_bytes += len(data)
+    for index in range(pdfs, pdfs + emls):
+        message = EmailMessage()
+        message["Subject"] = f"Payment request {index}"
+        message["From"] = "agent.bank@example.com"
+        message["To"] = "loan.servicing@example.com"
+        message["Message-ID"] = f"<bench-{index}@example.com>"
+        message.set_content(f"Dear Team,\n\n{transaction(rng, index)}\n\nBest regards,\nAlex Carter")
+        for attachment in range(attachments):
+            message.add_attachment(synthetic_pdf(transaction(rng, index * 100 + attachment), attachment_pages),
+                                   maintype="application", subtype="pdf", filename=f"details_{attachment}.pdf")
+        data = message.as_bytes()
+        with open(os.path.join(folder, f"request_{index:04d}.eml"), "wb") as f:
+            f.write(data)
+        total_bytes += len(data)
+    return {"files": pdfs + emls, "bytes": total_bytes}
+
+
+class StageTimer:
+    """Collects per-stage durations from every launcher in the process."""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.durations[stage].append(seconds)
+
+    def timed(self, stage: str, function):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return wrapper
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        summary = {}
+        for stage, values in sorted(self.durations.items()):
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            summary[stage] = {"count": len(values), "p50": round(float(p50), 4), "p90": round(float(p90), 4),
+                              "p99": round(float(p99), 4), "max": round(max(values), 4), "total": round(sum(values), 4)}
+        return summary
+
+
+def instrument(timer: StageTimer):
+    """Wraps the launcher's stage methods so every launcher created afterwards reports into timer."""
+    launcher = classifier.AnalysisLauncher
+    for stage, name in (("file", "process_text"), ("extract", "extract_text_from_path"), ("classify", "classify_text"),
+                        ("llm_call", "chat"), ("sub_classify", "sub_classify_all")):
+        setattr(launcher, name, timer.timed(stage, getattr(launcher, name)))
+
+
+def run_scenario(scenario: str, args, corpus_dir: str, queue):
+    """Runs one scenario in a fresh process so peak RSS is attributable to it."""
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Prompt resources are read from resources/ relative to the working directory; inputs are passed as paths
+    os.chdir(CODE_DIR)
+    timer = StageTimer()
+    # Extraction in --extract-workers processes is not timed; run with 0 workers for the extract stage
+    instrument(timer)
+    filenames = sorted(os.listdir(corpus_dir))
+
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    start = time.perf_counter()
+    with output:
+        if scenario == "launcher":
+            for filename in filenames:
+                classifier.AnalysisLauncher(corpus_dir, cache=ResponseCache(), stream=args.stream, static_prefix=args.static_prefix).process(filename)
+            errors = 0
+        else:
+            from app import LendingServiceApp
+            app = LendingServiceApp(llm_workers=args.llm_workers, extract_workers=args.extract_workers, stream=args.stream, static_prefix=args.static_prefix)
+            app.cache = ResponseCache()
+            app.file_paths = [os.path.join(corpus_dir, filename) for filename in filenames]
+            app.analyze_files()
+            errors = len(app.errors)
+    elapsed = time.perf_counter() - start
+
+    queue.put({
+        "scenario": scenario,
+        "files": len(filenames),
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "files_per_second": round(len(filenames) / elapsed, 3) if elapsed else None,
+        "stages": timer.summary(),
+        # Server-reported prompt evaluation; comparing runs with and without --static-prefix shows the prefix cache hits
+        "prompt_eval": get_backend().eval_stats(),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_rss_growth_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+    })
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=CODE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous: Dict, current: Dict) -> List[str]:
+    """Describes files/sec and p50 stage changes against an earlier results file."""
+    lines = []
+    before = {result["scenario"]: result for result in previous.get("results", [])}
+    for result in current["results"]:
+        old = before.get(result["scenario"])
+        if not old or not old.get("files_per_second"):
+            continue
+        ratio = result["files_per_second"] / old["files_per_second"]
+        lines.append(f"{result['scenario']}: {old['files_per_second']} -> {result['files_per_second']} files/s ({ratio:.2f}x vs {previous.get('commit')})")
+        if old.get("prompt_eval") and result.get("prompt_eval"):
+            lines.append(f"  mean prompt eval: {old['prompt_eval']['mean_prompt_eval_seconds']} -> {result['prompt_eval']['mean_prompt_eval_seconds']} s, "
+                         f"{old['prompt_eval']['mean_prompt_eval_tokens']} -> {result['prompt_eval']['mean_prompt_eval_tokens']} tokens")
+        for stage, stats in result["stages"].items():
+            if stage in old["stages"]:
+                lines.append(f"  {stage} p50: {old['stages'][stage]['p50']} -> {stats['p50']} s")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdfs", type=int, default=10, help="Synthetic PDF requests")
+    parser.add_argument("--emls", type=int, default=10, help="Synthetic EML requests")
+    parser.add_argument("--attachments", type=int, default=1, help="PDF attachments per EML")
+    parser.add_argument("--attachment-pages", type=int, default=5, help="Pages per PDF and per attachment")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake model seconds per request")
+    parser.add_argument("--latency-per-kchar", type=float, default=0.0, help="Extra fake model seconds per 1000 evaluated prompt characters")
+    parser.add_argument("--llm-workers", type=int, default=4, help="LendingServiceApp concurrent model calls")
+    parser.add_argument("--extract-workers", type=int, default=0, help="LendingServiceApp extraction processes")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--static-prefix", action="store_true", help="Static prompt sections as a system message, email last")
+    parser.add_argument("--scenarios", default="launcher,app")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's progress prints")
+    parser.add_argument("--corpus", help="Reuse this corpus folder instead of generating one")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else tempfile.mkdtemp(prefix="bench-corpus-")
+    corpus = {"files": len(os.listdir(corpus_dir))} if args.corpus else make_corpus(corpus_dir, args.pdfs, args.emls, args.attachments, args.attachment_pages)
+
+    results: List[Dict] = []
+    context = multiprocessing.get_context("fork")
+    with FakeOllamaServer(latency=args.latency, latency_per_kchar=args.latency_per_kchar) as server:
+        # The shared default backend reads OLLAMA_HOST, so the real client and pool are exercised
+        os.environ["OLLAMA_HOST"] = server.url
+        for scenario in args.scenarios.split(","):
+            queue = context.Queue()
+            process = context.Process(target=run_scenario, args=(scenario, args, corpus_dir, queue))
+            process.start()
+            results.append(queue.get())
+            process.join()
+            print(json.dumps(results[-1]), file=sys.stderr)
+        model_requests = server.requests
+    if not args.corpus:
+        shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    report = {"commit": git_commit(), "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "corpus": corpus,
+              "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+              "model_requests": model_requests, "results": results}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            for line in compare(json.load(f), report):
+                print(line)
+    if args.output:
+        if os.path.dirname(args.output):
+            os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Local stand-in for the Ollama /api/chat endpoint with configurable latency and prompt prefix caching, for offline benchmarks.
+
+Run from the code/ folder to point the app at it:
+    python benchmarks/fake_ollama.py --port 11434 --latency 2.0
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from llm_backend import StubBackend
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so the client's connection pool is exercised like with real Ollama
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        # Enough of /api/tags for health checks
+        self._send_json({"models": [{"name": self.server.model}]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path != "/api/chat":
+            self._send_json({"error": f"{self.path} not supported"}, status=404)
+            return
+        server = self.server
+        if not body.get("messages"):
+            # Model preload: nothing to evaluate
+            self._send_json({"model": body.get("model", server.model), "created_at": datetime.now(timezone.utc).isoformat(),
+                             "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "load"})
+            return
+        prompt = "\n\n".join(message["content"] for message in body["messages"])
+        content = server.responder(prompt)
+        with server.lock:
+            server.requests += 1
+            # Like llama.cpp, only the part after the longest prefix shared with a recently evaluated prompt is evaluated again
+            cached = max((len(os.path.commonprefix([prompt, recent])) for recent in server.recent_prompts), default=0)
+            server.recent_prompts.append(prompt)
+        prompt_eval = server.latency_per_kchar * (len(prompt) - cached) / 1000
+        delay = server.latency + prompt_eval
+        stats = {"done": True, "done_reason": "stop", "total_duration": int(delay * 1e9), "prompt_eval_count": (len(prompt) - cached) // 4,
+                 "prompt_eval_duration": int(prompt_eval * 1e9), "eval_count": len(content) // 4, "eval_duration": int(server.latency * 1e9)}
+
+        def message(text, done=False):
+            return {"model": body.get("model", server.model), "created_at": datetime.now(timezone.utc).isoformat(),
+                    "message": {"role": "assistant", "content": text}, **(stats if done else {"done": False})}
+
+        if not body.get("stream", True):
+            time.sleep(delay)
+            self._send_json(message(content, done=True))
+            return
+
+        # Streamed answers arrive as NDJSON, with the latency spread over the chunks
+        chunks = [content[start:start + server.chunk_size] for start in range(0, len(content), server.chunk_size)] or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                time.sleep(delay / len(chunks))
+                self._write_chunk(json.dumps(message(chunk)) + "\n")
+            self._write_chunk(json.dumps(message("", done=True)) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client stopped reading once its JSON answer was complete
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Streaming clients hang up as soon as their JSON answer is complete
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class FakeOllamaServer:
+    """Serves deterministic StubBackend answers over HTTP, sleeping latency + latency_per_kchar per request."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.5, latency_per_kchar: float = 0.0,
+                 chunk_size: int = 32, model: str = "deepseek-r1:14b", responder: Optional[Callable[[str], str]] = None, cache_slots: int = 4):
+        self.httpd = _Server((host, port), _ChatHandler)
+        self.httpd.latency = latency
+        self.httpd.latency_per_kchar = latency_per_kchar  # Extra seconds per 1000 evaluated prompt characters (prompt eval cost)
+        self.httpd.recent_prompts = deque(maxlen=cache_slots)  # Prompts whose evaluated prefix the server still holds, one per slot
+        self.httpd.chunk_size = chunk_size
+        self.httpd.model = model
+        self.httpd.responder = responder or StubBackend(model=model).default_response
+        self.httpd.requests = 0
+        self.httpd.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per request")
+    parser.add_argument("--latency-per-kchar", type=float, default=0.0, help="Extra seconds per 1000 prompt characters")
+    args = parser.parse_args()
+    server = FakeOllamaServer(args.host, args.port, args.latency, args.latency_per_kchar)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
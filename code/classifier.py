@@ -1,16 +1,61 @@
+import asyncio
+import contextvars
+import functools
 import json
-import ollama
-import fitz  # PyMuPDF for reading PDFs
+import logging
 import os
 import re
+import time
 import mailparser
-import pdfplumber
-from typing import Dict, List, Optional, Tuple
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
+from document_extractor import EXTRACTOR_VERSION, DocumentExtractor, PdfSource, SpillBuffer, decode_base64
+from extraction_cache import ExtractionCache, file_digest, get_extraction_cache
+from instrumentation import Tracer, current_trace, get_tracer
+from llm_backend import LLMBackend, get_backend
+from llm_cache import ResponseCache, get_response_cache
+from model_cascade import ModelCascade
+from pre_classifier import PreClassifier, parse_definitions
+from prompt_budget import PromptBudget, estimate_tokens, merge_classifications
+from prompt_resources import PromptResources, get_prompt_resources
+from response_parser import parse_json_response, stream_json_response
+from response_schema import classification_schema, sub_classification_schema, validate_classification_items, validate_sub_classification
+from workspace import PromptArchive
+
+# Appended to a prompt whose answer could not be parsed, for the bounded retry
+RETRY_SUFFIX = "\n\nYour previous answer could not be parsed. Reply with only the JSON described above."
+
+# Progress goes to INFO (one line per file); prompts, email bodies and raw answers only to DEBUG
+logger = logging.getLogger(__name__)
 
 class AnalysisLauncher:
-    def __init__(self, folder_name: str):
-        self.folder_name = folder_name 
+    def __init__(self, folder_name: str, sub_concurrency: int = 4, sub_timeout: float = 120.0, resources: Optional[PromptResources] = None, cache: Optional[ResponseCache] = None, backend: Optional[LLMBackend] = None, stream: bool = False, extractor: Optional[DocumentExtractor] = None, extraction_cache: Optional[ExtractionCache] = None, budget: Optional[PromptBudget] = None, pre_classifier: Optional[PreClassifier] = None, combined: bool = False, structured: bool = True, max_retries: int = 1, tracer: Optional[Tracer] = None, static_prefix: bool = False, cascade: Optional[ModelCascade] = None, archive: Optional[PromptArchive] = None):
+        self.folder_name = folder_name  # Folder process() reads filenames from; None falls back to temp/
+        self.resources = resources  # Falls back to the shared registry for resources/
+        self.cache = cache  # Falls back to the shared in-memory response cache
+        self.backend = backend  # Falls back to the shared Ollama backend (deepseek-r1:14b)
+        self.stream = stream  # Stream tokens and stop at the first complete JSON block
+        self.llm_metrics = []  # Streaming timings per model call
+        self.sub_concurrency = sub_concurrency  # Max sub-classification calls in flight per file
+        self.sub_timeout = sub_timeout  # Seconds before a single sub-classification call is abandoned
+        self.extractor = extractor or DocumentExtractor()  # PyMuPDF with per-page pdfplumber fallback
+        self.extraction_cache = extraction_cache  # Optional on-disk cache of extracted text
+        self.budget = budget  # Optional prompt token budget (compaction + chunking)
+        self.budget_reports = []  # Tokens saved per compaction step, per processed text
+        self.pre_classifier = pre_classifier  # Optional rule-based pass that skips the model for clear-cut emails
+        self.decisions = []  # Which stage (rules or model) decided each category and sub-category
+        self.combined = combined  # One call returns category and sub-category; False keeps the two-stage path for A/B runs
+        self.structured = structured  # Constrain answers to a JSON schema through Ollama's format parameter
+        self.max_retries = max_retries  # Extra calls allowed per prompt when an answer cannot be parsed
+        self.parse_stats = Counter()  # How answers were parsed (fenced/raw/repaired), plus retries and failures
+        self.tracer = tracer or get_tracer()  # Per-stage spans; falls back to the shared in-memory tracer
+        self.static_prefix = static_prefix  # Send static prompt sections as a system message and the email last, for server-side prefix caching
+        self.cascade = cascade  # Optional fast-then-strong model routing; when set, its fast model replaces backend
+        self.archive = archive  # Optional per-batch record of every prompt and response
+        self._schemas = None
+        self._schemas_version = None
     # Function to read content from a text file
     def extract_json_block(self, text):
         match = re.search(r'```json\n(.*?)\n```', text, re.DOTALL)
@@ -18,11 +63,17 @@ class AnalysisLauncher:
 
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                text = " ".join(page.extract_text() or "" for page in pdf.pages)  # Replaced \n with space
-            return text
+            return self.extractor.extract_text(pdf_path)
+        except Exception as e:
+            logger.error(f"Error extracting text from {pdf_path}: {e}")
+            return ""
+
+    # Read text from PDF bytes held in memory (e.g. a decoded attachment), or from the file they were spilled to
+    def extract_text_from_pdf_bytes(self, pdf_data: PdfSource) -> str:
+        try:
+            return self.extractor.extract_text(pdf_data)
         except Exception as e:
-            print(f"Error extracting text from {pdf_path}: {e}")
+            logger.error(f"Error extracting text from PDF attachment: {e}")
             return ""
 
     def read_file(self,filename):
@@ -30,157 +81,395 @@ class AnalysisLauncher:
             with open(filename, "r", encoding="utf-8") as f:
                 return f.read().strip()
         except FileNotFoundError:
-            print(f"Warning: {filename} not found.")
+            logger.warning(f"Warning: {filename} not found.")
             return ""
 
     def extract_text_from_eml(self, eml_path: str) -> Tuple[str, str]:
-            try:
-                mail = mailparser.parse_from_file(eml_path)
-                email_body = f"{mail.body}"
-                attachment_text = ""
-                for attachment in mail.attachments:
-                    content_type = attachment.get("mail_content_type", "application/pdf").lower()
-                    payload = attachment.get("payload", "")
-                    attachment_filename = attachment.get("filename", "temp.pdf")  # Get actual filename
-                    print(f"attachment_filename:", attachment_filename)
-                    print(f"attachment: {attachment}")
-                    if "text/plain" in content_type:
-                        attachment_text += f" Attachment Text: {payload}"
-                    elif "application/pdf" in content_type:
-                        import base64
-                        try:
-                            pdf_data = base64.b64decode(payload)
-                            with open(attachment_filename, "wb") as f:
-                                f.write(pdf_data)
-                            attachment_text += f" Attachment PDF: {self.extract_text_from_pdf(attachment_filename)}"
-                            os.remove(attachment_filename)
-                        except Exception as e:
-                            print(f"Error processing PDF attachment in {eml_path}: {e}")
-                return email_body, attachment_text
-            except Exception as e:
-                print(f"Error extracting text from {eml_path}: {e}")
-                return "", ""
+        try:
+            parts = list(self.iter_eml_parts(eml_path))
+        except Exception as e:
+            logger.error(f"Error extracting text from {eml_path}: {e}")
+            return "", ""
+        return (parts[0] if parts else ""), "".join(parts[1:])
 
-    def extract_text_from_file(self, filename):
-        extracted_text = []
-        if filename.lower().endswith(".pdf"):  # Process only PDF files
-                pdf_path = os.path.join("temp", filename)
+    # Yield the email body, then one " Attachment ...: text" piece per attachment, decoding one attachment at a time
+    def iter_eml_parts(self, eml_path: str) -> Iterator[str]:
+        mail = mailparser.parse_from_file(eml_path)
+        yield f"{mail.body}"
+        for attachment in mail.attachments:
+            content_type = attachment.get("mail_content_type", "application/pdf").lower()
+            payload = attachment.get("payload", "")
+            attachment_filename = attachment.get("filename", "attachment.pdf")  # Get actual filename
+            logger.debug(f"attachment_filename: {attachment_filename} ({content_type}, {len(payload)} chars)")
+            if "text/plain" in content_type:
+                yield f" Attachment Text: {payload}"
+            elif "application/pdf" in content_type:
                 try:
-                    with fitz.open(pdf_path) as doc:
-                        text = " ".join([page.get_text("text").replace("\n", " ") for page in doc]).strip()
-                        extracted_text.append(f"[{filename}]: {text}")
+                    # Decoded bytes stay in memory up to the extractor's spill limit, larger PDFs are read from a temporary file
+                    with SpillBuffer(self.extractor.spill_bytes) as buffer:
+                        decode_base64(payload, buffer)
+                        text = self.extract_text_from_pdf_bytes(buffer.source())
+                    yield f" Attachment PDF: {text}"
                 except Exception as e:
-                    print(f"Error reading {filename}: {e}")
+                    logger.error(f"Error processing PDF attachment in {eml_path}: {e}")
+
+    # Yield normalized text chunks for one document: one per PDF page, or the email body and one per attachment;
+    # extraction errors propagate, so callers never mistake the chunks yielded so far for the whole document
+    def iter_document_chunks(self, path) -> Iterator[str]:
+        filename = os.path.basename(path)
+        if filename.lower().endswith(".pdf"):  # Process only PDF files
+            yield from self.extractor.iter_text(path)
         if (filename.lower().endswith(".doc") or filename.lower().endswith(".docx")):  # Process only doc files
-                print("Get docs")
+            logger.debug("Get docs")
         if filename.lower().endswith(".eml"):  # Process only eml files
-                eml_path = os.path.join("temp", filename)
-                print(f"eml_path:",eml_path)
-                email_text, attachment_text = self.extract_text_from_eml(eml_path)
-                print(f"email_text:",email_text)
-                print(f"attachment_text:",attachment_text)
-                text = (email_text.replace("\n", " ")).replace("*","").strip()
-                extracted_text.append(f"[{filename}]: {text}")
-                if attachment_text:
-                    attachment_text = (attachment_text.replace("\n", " ")).replace("*","").strip()
-                    extracted_text.append(f"--- Attachment Content --- {attachment_text}")
-                
-        return " ".join(extracted_text) if extracted_text else ""        
-    
+            logger.debug(f"eml_path: {path}")
+            parts = self.iter_eml_parts(path)
+            yield (next(parts, "").replace("\n", " ")).replace("*", "").strip()
+            marker = "--- Attachment Content --- "
+            for part in parts:
+                part = (part.replace("\n", " ")).replace("*", "").strip()
+                if part:
+                    yield f"{marker}{part}"
+                    marker = ""
+
+    # Extract normalized text from one document, without the [filename] label; None when extraction failed
+    def extract_document_text(self, path):
+        try:
+            chunks = [chunk for chunk in self.iter_document_chunks(path) if chunk]
+        except Exception as e:
+            # Partial text is dropped so it is neither classified nor cached
+            logger.error(f"Error extracting text from {path}: {e}")
+            return None
+        # Chunks are joined once here instead of growing one string per page or attachment
+        return " ".join(chunks) or None
+
+    def extract_text_from_file(self, filename):
+        return self.extract_text_from_path(os.path.join(self.folder_name or "temp", filename))
+
+    # Extract labelled text for any document path, going through the extraction cache when configured
+    def extract_text_from_path(self, path):
+        filename = os.path.basename(path)
+        input_bytes = os.path.getsize(path) if os.path.isfile(path) else 0
+        with self.tracer.profile(f"{filename}.extract"), self.tracer.span("extract", trace=filename, input_bytes=input_bytes) as span:
+            text = self._extract_text_from_path(path, span)
+            span.set(output_chars=len(text))
+            return text
+
+    def _extract_text_from_path(self, path, span):
+        filename = os.path.basename(path)
+        key = None
+        if self.extraction_cache and os.path.isfile(path):
+            # Unchanged documents (same bytes, same extractor) skip parsing entirely
+            key = self.extraction_cache.make_key(file_digest(path), EXTRACTOR_VERSION)
+            text = self.extraction_cache.get(key)
+            span.set(cached=text is not None)
+            if text is not None:
+                logger.debug(f"♻️ Reusing cached extraction for {filename}.")
+                return f"[{filename}]: {text}"
+        text = self.extract_document_text(path)
+        if text is None:
+            return ""
+        if key:
+            self.extraction_cache.put(key, text)
+        return f"[{filename}]: {text}"
+
     def process(self, filename):
-        print(f"Processing file {filename}...")
-        # Define file paths for different sections
-        objective_file = "resources/objective.txt"
-        categories_file = "resources/categories.txt"
-        instructions_file = "resources/instructions.txt"
-        data_folder = self.folder_name  # Folder containing PDFs
-        request_file = "resources/request.txt"  # Output file for the final prompt
-        # Read static sections
-        objective = self.read_file(objective_file)
-        categories = self.read_file(categories_file)
-        instructions = self.read_file(instructions_file)
-        #all_files_output = []
-        final_output = []
+        logger.info(f"Processing file {filename}...")
         # Extract email content from PDFs
         email_to_classify = self.extract_text_from_file(filename)
+        return self.process_text(filename, email_to_classify)
+
+    # Send a prompt to the model, answering from the response cache when the same prompt was seen before
+    def chat(self, prompt: str, schema: Optional[Dict] = None, system: Optional[str] = None, backend: Optional[LLMBackend] = None) -> str:
+        cache = self.cache or get_response_cache()
+        resources = self.resources or get_prompt_resources()
+        backend = backend or (self.cascade.fast if self.cascade else self.backend) or get_backend()
+        full_prompt = f"{system}\n\n{prompt}" if system else prompt
+        key = cache.make_key(backend.model, full_prompt, resources.version)
+        system_args = {"system": system} if system else {}
+        with self.tracer.span("llm_call", model=backend.model, prompt_chars=len(full_prompt), prompt_tokens=estimate_tokens(full_prompt),
+                              static_prefix_chars=len(system or "")) as span:
+            cached = cache.get(key)
+            span.set(cached=cached is not None)
+            if cached is not None:
+                logger.debug("♻️ Reusing cached model response.")
+                if self.archive:
+                    self.archive.record(current_trace(), backend.model, prompt, cached, system, cached=True)
+                return cached
+            started = time.perf_counter()
+            if self.stream:
+                # Stop reading tokens as soon as the fenced JSON answer is complete
+                content, metrics = stream_json_response(backend.chat_stream(prompt, schema if self.structured else None, **system_args))
+                self.llm_metrics.append(metrics)
+                self.tracer.add("streamed_calls")
+                self.tracer.add("stream_first_token_seconds", metrics["time_to_first_token"] or 0.0)
+                self.tracer.add("stream_json_seconds", metrics["time_to_json"] or metrics["total_time"])
+                span.set(time_to_first_token=metrics["time_to_first_token"], time_to_json=metrics["time_to_json"])
+                logger.debug(f"⏱️ First token after {metrics['time_to_first_token'] or 0:.2f}s, JSON complete after {metrics['time_to_json'] or metrics['total_time']:.2f}s")
+            else:
+                content = backend.chat(prompt, schema if self.structured else None, **system_args)
+            if self.cascade:
+                self.cascade.record_call(backend.model, time.perf_counter() - started)
+            span.set(response_chars=len(content), response_tokens=estimate_tokens(content), **backend.last_eval())
+            if self.archive:
+                self.archive.record(current_trace(), backend.model, prompt, content, system)
+            # Only cache answers we can parse, so a bad answer is retried on the next run
+            if parse_json_response(content)[0] is not None:
+                cache.put(key, content)
+            return content
 
-        # Combine all sections into the final prompt
-        prompt = f"{objective}\n\n{categories}\n\nEmail to Classify:\n{email_to_classify}\n\n{instructions}"
+    # JSON schemas for the current resources, with category names as enums
+    def schemas(self) -> Dict:
+        resources = self.resources or get_prompt_resources()
+        resources.refresh()
+        if self._schemas_version != resources.version:
+            categories = [name for name, _, _ in parse_definitions(resources.texts["categories.txt"])]
+            sub_categories = {category: [name for name, _, _ in parse_definitions(text)] for category, text in resources.sub_categories.items()}
+            self._schemas = {
+                "classification": classification_schema(categories),
+                "combined": classification_schema(categories, sub_categories),
+                "sub_classification": {category: sub_classification_schema(names) for category, names in sub_categories.items()},
+            }
+            self._schemas_version = resources.version
+        return self._schemas
 
-        # Save the prompt to a file
-        os.makedirs(os.path.dirname(request_file), exist_ok=True)  # Ensure the folder exists
-        with open(request_file, "w", encoding="utf-8") as f:
-            f.write(prompt)
+    # Parse and validate a JSON answer, re-asking the model at most max_retries times; None when every attempt failed
+    def chat_json(self, prompt: str, schema: Optional[Dict], validate: Callable, content: Optional[str] = None, system: Optional[str] = None,
+                  backend: Optional[LLMBackend] = None, max_retries: Optional[int] = None):
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            if attempt:
+                self.parse_stats["retries"] += 1
+                self.tracer.add("parse_outcomes", method="retry")
+                logger.warning(f"🔁 Model answer could not be parsed, retrying ({attempt}/{max_retries}).")
+                content = self.chat(prompt + RETRY_SUFFIX, schema, system, backend)
+            elif content is None:
+                content = self.chat(prompt, schema, system, backend)
+            with self.tracer.span("parse", response_chars=len(content or "")) as span:
+                value, method = parse_json_response(content)
+                value = validate(value) if value is not None else None
+                span.set(method=method if value is not None else "invalid")
+            if value is not None:
+                self.parse_stats[method] += 1
+                self.tracer.add("parse_outcomes", method=method)
+                return value
+        self.parse_stats["failed"] += 1
+        self.tracer.add("parse_outcomes", method="failed")
+        return None
 
-        print("🤖 Gearing up the AI engine... Compiling the classification request!")
-        print(f"📂 Final prompt saved to {request_file}")
-        print("🚀 Sending the prompt to the AI model... Stand by for classification!")
+    # chat_json through the model cascade: the fast model answers first (no retries), the strong model only when that answer
+    # is invalid or not confident enough; content is an already received fast-model answer
+    def chat_routed(self, prompt: str, schema: Optional[Dict], validate: Callable, stage: str, content: Optional[str] = None, system: Optional[str] = None):
+        if not self.cascade:
+            return self.chat_json(prompt, schema, validate, content=content, system=system)
+        with self.tracer.span("route", stage=stage, model=self.cascade.fast.model) as span:
+            value = self.chat_json(prompt, schema, validate, content=content, system=system, backend=self.cascade.fast, max_retries=0)
+            reason = self.cascade.escalation_reason(value)
+            span.set(escalated=reason is not None, reason=reason)
+            self.cascade.record_route(stage, reason)
+            if reason is None:
+                return value
+            logger.info(f"⬆️ Escalating {stage} to {self.cascade.strong.model} ({reason}).")
+            span.set(model=self.cascade.strong.model)
+            return self.chat_json(prompt, schema, validate, system=system, backend=self.cascade.strong)
+
+    # Send every sub-classification prompt concurrently; responses come back in prompt order (None on timeout)
+    def sub_classify_all(self, prompts: List[str], schemas: Optional[List[Optional[Dict]]] = None, systems: Optional[List[Optional[str]]] = None) -> List[Optional[str]]:
+        async def sub_classify_one(pool, semaphore, prompt, schema, system):
+            async with semaphore:
+                # Copy the context like asyncio.to_thread does, so the call's spans stay under the file's trace
+                call = functools.partial(contextvars.copy_context().run, self.chat, prompt, schema, system)
+                try:
+                    return await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(pool, call), self.sub_timeout)
+                except asyncio.TimeoutError:
+                    logger.error(f"❌ ERROR: Sub-classification timed out after {self.sub_timeout}s.")
+                    return None
+
+        async def sub_classify_batch(pool):
+            semaphore = asyncio.Semaphore(max(1, self.sub_concurrency))
+            return await asyncio.gather(*(sub_classify_one(pool, semaphore, prompt, schema, system)
+                                          for prompt, schema, system in zip(prompts, schemas or [None] * len(prompts), systems or [None] * len(prompts))))
+
+        if not prompts:
+            return []
+        # Not asyncio's default executor: asyncio.run joins that one on exit, so a timed-out call would still hold up the file
+        pool = ThreadPoolExecutor(max_workers=max(1, self.sub_concurrency), thread_name_prefix="sub-classify")
+        with self.tracer.span("sub_classify", prompts=len(prompts)):
+            try:
+                return asyncio.run(sub_classify_batch(pool))
+            finally:
+                pool.shutdown(wait=False)  # Timed-out calls finish in the background; their answers are dropped
+
+    # Run the top-level classification for one piece of email text
+    def classify_text(self, email_to_classify):
+        # Static sections are loaded once and pre-rendered by the shared registry
+        resources = self.resources or get_prompt_resources()
+
+        with self.tracer.span("build_prompt", email_chars=len(email_to_classify)) as span:
+            # Combine all sections into the final prompt
+            if self.static_prefix:
+                system, prompt = resources.build_combined_messages(email_to_classify) if self.combined else resources.build_messages(email_to_classify)
+            else:
+                system, prompt = None, resources.build_combined_prompt(email_to_classify) if self.combined else resources.build_prompt(email_to_classify)
+            full_prompt = f"{system}\n\n{prompt}" if system else prompt
+            span.set(prompt_chars=len(full_prompt), prompt_tokens=estimate_tokens(full_prompt))
+
+        logger.debug("🤖 Gearing up the AI engine... Compiling the classification request!")
+        logger.debug("🚀 Sending the prompt to the AI model... Stand by for classification!")
 
         # Send the prompt to the model
-        response = ollama.chat(model="deepseek-r1:14b", messages=[{'role': 'user', 'content': prompt}]) #deepseek-r1:14b, 0xroyce/plutus:latest
+        schema = self.schemas()["combined" if self.combined else "classification"]
+        items = self.chat_routed(prompt, schema, validate_classification_items, "category", system=system)
+        if items is None:
+            raise ValueError(f"Model returned no parsable classification after {self.max_retries + 1} attempt(s).")
 
         # Print the response content
-        print("📊 Data processed! Here’s the classified breakdown:")
-        response_content_text = response['message']['content']
-        response_content = self.extract_json_block(response_content_text)
-        classification_response = response_content
-        print(response_content)
-        sub_classification_response = []
-        #🔄 Loop through response and process categories
-        for item in json.loads(response_content): 
+        logger.debug("📊 Data processed! Here’s the classified breakdown:")
+        logger.debug(json.dumps(items, indent=4))
+        return items
+
+    # Per-launcher lists keep the detail for one file; the tracer's counters add up across the launchers built per file
+    def record_decision(self, decision: Dict):
+        self.decisions.append(decision)
+        self.tracer.add("decisions", stage=decision["stage"], source=decision["source"])
+
+    def record_budget(self, report: Dict):
+        self.tracer.add("budget_texts", clamped=report["clamped"])
+        self.tracer.add("budget_chunks", report["chunks"])
+        for step, saved in report["saved_tokens"].items():
+            self.tracer.add("budget_saved_tokens", saved, step=step)
+
+    # Classify already extracted text (lets extraction run in a separate worker)
+    def process_text(self, filename, email_to_classify):
+        with self.tracer.profile(f"{filename}.classify"), self.tracer.span("file", trace=filename, input_chars=len(email_to_classify or "")) as span:
+            final_output = self._process_text(filename, email_to_classify)
+            span.set(items=len(final_output))
+            return final_output
+
+    def _process_text(self, filename, email_to_classify):
+        resources = self.resources or get_prompt_resources()
+        final_output = []
+
+        rule_item = None
+        if self.pre_classifier:
+            with self.tracer.span("pre_classify") as span:
+                rule_item = self.pre_classifier.classify(email_to_classify)
+                span.set(matched=rule_item is not None)
+        source = "rules" if rule_item else "model"
+        if rule_item:
+            logger.info(f"⚡ Rule-based pre-classifier matched {rule_item['classification']['category']}, skipping the model.")
+            items = [rule_item]
+        elif self.budget:
+            # Compact the email to the token budget; anything still too large is classified chunk by chunk
+            if self.combined:
+                static_tokens = estimate_tokens(resources.combined_prompt_prefix + resources.combined_prompt_suffix)
+            else:
+                static_tokens = estimate_tokens(resources.prompt_prefix + resources.prompt_suffix)
+            chunks, report = self.budget.compact(email_to_classify, static_tokens)
+            self.budget_reports.append(report)
+            self.record_budget(report)
+            logger.info(f"✂️ Prompt budget: {report['original_tokens']} -> {report['final_tokens']} tokens in {report['chunks']} chunk(s), saved {report['saved_tokens']}")
+            items = merge_classifications([self.classify_text(chunk) for chunk in chunks])
+        else:
+            items = self.classify_text(email_to_classify)
+        for item in items:
+            self.record_decision({"file": filename, "stage": "category", "category": item["classification"]["category"], "source": source})
+
+        #🔄 Loop through response and build one sub-classification prompt per category
+        sub_prompts = {}
+        sub_systems = {}  # Static system message per sub-prompt in the static-prefix layout
+        resolved_subs = {}  # Sub-categories already known without a sub-classification call
+        for index, item in enumerate(items):
             category = item["classification"]["category"]
-            confidence_score = item["classification"]["confidence_score"]
             associated_text = item.get("associated_text", "No associated text found.")
+
+            logger.debug(f"📌 {category}: {associated_text}")
+
+            rule_sub = self.pre_classifier.sub_classify(category, associated_text) if self.pre_classifier else None
+            if rule_sub:
+                resolved_subs[index] = rule_sub
+                self.record_decision({"file": filename, "stage": "sub_category", "category": category, "sub_category": rule_sub["name"], "source": "rules"})
+                continue
+
+            # Single-pass answers carry the sub-category; a missing or malformed one falls back to a sub-classification call
+            combined_sub = item.get("sub_classification") if self.combined else None
+            if category in resources.sub_categories and isinstance(combined_sub, dict) and "category" in combined_sub and "confidence_score" in combined_sub:
+                resolved_subs[index] = {"name": combined_sub["category"], "confidence_score": combined_sub["confidence_score"]}
+                self.record_decision({"file": filename, "stage": "sub_category", "category": category, "sub_category": combined_sub["category"], "source": source})
+                continue
+
+            # Categories without a ruleset skip sub-classification
+            if self.static_prefix:
+                messages = resources.build_sub_messages(category, associated_text)
+                if messages:
+                    sub_systems[index], sub_prompts[index] = messages
+            else:
+                prompt_sub = resources.build_sub_prompt(category, associated_text)
+                if prompt_sub:
+                    sub_prompts[index] = prompt_sub
+
+        #🔥 Send all sub-classification requests at once
+        sub_schemas = [self.schemas()["sub_classification"].get(items[index]["classification"]["category"]) for index in sub_prompts]
+        sub_responses = dict(zip(sub_prompts, self.sub_classify_all(list(sub_prompts.values()), sub_schemas, [sub_systems.get(index) for index in sub_prompts])))
+
+        for index, item in enumerate(items):
+            category = item["classification"]["category"]
+            confidence_score = item["classification"]["confidence_score"]
             extracted_fields = item.get("extracted_fields",[])
-            
-            print(f"📌 {category}: {associated_text}")
-            
-            # Load ruleset
-            sub_categories_file_mapping = self.read_file("resources/ruleset_files.json")
-            sub_categories_file_name = json.loads(sub_categories_file_mapping)[category]
-            if sub_categories_file_name:
-                sub_categories = self.read_file(sub_categories_file_name)
-                sub_objective = self.read_file("resources/sub_objective.txt")
-                sub_instructions = self.read_file("resources/sub_instructions.txt")
-
-                prompt_sub = f"{sub_objective}\n\n{sub_categories}\n\nEmail to Classify:\n{associated_text}\n\n{sub_instructions}"
-
-                #🔥 Send sub-classification request
-                response_sub = ollama.chat(model="deepseek-r1:14b", messages=[{'role': 'user', 'content': prompt_sub}]) 
-
-                print("📊 Sub-classification processed! Here’s the breakdown:")
-                response_sub_content_text = response_sub['message']['content']
-                response_sub_content = self.extract_json_block(response_sub_content_text)
-
-                # ✅ Ensure sub-response is valid JSON
-                try:
-                    print("Here the sub category response with confidence score:")
-                    print(response_sub_content)
-                    sub_classification_response_json = json.loads(response_sub_content)
-                    sub_category_name = sub_classification_response_json["category"]
-                    sub_confidence_score = sub_classification_response_json["confidence_score"]
-                    final_output.append({
-                            "category": category,
-                            "confidence_score": confidence_score,
-                            "sub_category": {
-                                "name": sub_category_name,
-                                "confidence_score": sub_confidence_score
-                            },
-                            "extracted_fields": extracted_fields
-                        })           
-                except json.JSONDecodeError:
-                    print("❌ ERROR: Sub-response is not valid JSON.")
-                    print(response_sub_content)
+            associated_text = item.get("associated_text", "")  # Source text the fields are checked against downstream
+            if index in resolved_subs:
+                final_output.append({
+                        "category": category,
+                        "confidence_score": confidence_score,
+                        "sub_category": resolved_subs[index],
+                        "extracted_fields": extracted_fields,
+                        "associated_text": associated_text
+                    })
+            elif index in sub_responses and sub_responses[index] is not None:
+                logger.debug("📊 Sub-classification processed! Here’s the breakdown:")
+                # ✅ Ensure sub-response is valid JSON, re-asking within the retry budget
+                sub_schema = self.schemas()["sub_classification"].get(category)
+                sub_classification = self.chat_routed(sub_prompts[index], sub_schema, validate_sub_classification, "sub_category",
+                                                      content=sub_responses[index], system=sub_systems.get(index))
+                sub_category = {}
+                if sub_classification is None:
+                    # The top-level result is kept; only the sub-category is left empty
+                    logger.error("❌ ERROR: Sub-response is not valid JSON.")
+                else:
+                    logger.debug(f"Here the sub category response with confidence score: {sub_classification}")
+                    sub_category = {"name": sub_classification["category"], "confidence_score": sub_classification["confidence_score"]}
+                    self.record_decision({"file": filename, "stage": "sub_category", "category": category, "sub_category": sub_category["name"], "source": "model"})
+                final_output.append({
+                        "category": category,
+                        "confidence_score": confidence_score,
+                        "sub_category": sub_category,
+                        "extracted_fields": extracted_fields,
+                        "associated_text": associated_text
+                    })
             else:
+                # No ruleset for this category, or the sub-classification call timed out
                 final_output.append({
                             "category": category,
                             "confidence_score": confidence_score,
                             "sub_category": {},
-                            "extracted_fields": extracted_fields
+                            "extracted_fields": extracted_fields,
+                            "associated_text": associated_text
                         })
         return final_output 
 
+# Extraction errors are logged and come back as empty text; every entry point fails the file instead of classifying nothing
+def require_text(path: str, text: Optional[str]) -> str:
+    if not text:
+        raise ValueError(f"No text could be extracted from {os.path.basename(path)}.")
+    return text
+
+# Module-level extraction entry point so it can be pickled into a process pool
+def extract_file_text(path: str, extraction_cache_path: Optional[str] = None) -> str:
+    extraction_cache = get_extraction_cache(extraction_cache_path) if extraction_cache_path else None
+    return AnalysisLauncher(None, extraction_cache=extraction_cache).extract_text_from_path(path)
+
 if __name__ == "__main__":
-    engine = AnalysisLauncher("temp")
-    output = engine.process()
-    print(output)
+    # Batch runs live in batch_cli.py; with no arguments classify everything in temp/
+    import sys
+    from batch_cli import main
+    main(sys.argv[1:] or ["temp"])
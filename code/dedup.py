@@ -0,0 +1,174 @@
+import copy
+import hashlib
+import itertools
+import os
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.parser import BytesHeaderParser
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from pre_classifier import DEAL
+from prompt_budget import LABEL
+
+TOKEN = re.compile(r'\w+')
+NUMBER = re.compile(r'\d[\d,.]*\d|\d')
+MESSAGE_ID = re.compile(r'<[^<>\s]+>')
+# Reply attributions and forwarded headers add dates and times that are not part of the transaction
+ATTRIBUTION = re.compile(r'\bOn [^.]{0,120}? wrote:|-{2,}\s*(?:Original|Forwarded) Message\s*-{2,}|\b(?:Sent|Date): .{0,60}?(?=\b(?:To|From|Subject|Cc):)', re.IGNORECASE)
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def email_headers(path: str) -> Dict[str, List[str]]:
+    """Reads only the Message-ID, In-Reply-To and References headers of an .eml file, without parsing its body."""
+    if not path.lower().endswith(".eml") or not os.path.isfile(path):
+        return {"message_id": [], "references": []}
+    with open(path, "rb") as f:
+        headers = BytesHeaderParser().parse(f)
+    references = f"{headers.get('In-Reply-To', '')} {headers.get('References', '')}"
+    return {"message_id": MESSAGE_ID.findall(str(headers.get("Message-ID", ""))), "references": MESSAGE_ID.findall(references)}
+
+
+def normalize(text: str) -> str:
+    return " ".join(TOKEN.findall(ATTRIBUTION.sub(" ", LABEL.sub("", text or "")).lower()))
+
+
+def fingerprint(text: str) -> Tuple[str, ...]:
+    """Numbers and deal codes in the text; near-duplicates must agree on them to share a classification."""
+    # Without the [filename]: label, so numbered exports (notice_1.eml, notice_2.eml) can still cluster
+    text = ATTRIBUTION.sub(" ", LABEL.sub("", text or ""))
+    return tuple(sorted({number.replace(",", "") for number in NUMBER.findall(text)} | set(DEAL.findall(text))))
+
+
+class Deduplicator:
+    """Clusters extracted documents by exact hash, MinHash near-duplicate search and Message-ID threads."""
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 64, bands: int = 16, shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold  # Estimated Jaccard similarity of word shingles for a near-duplicate
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # Universal hash functions (a * x + b) mod p over 32-bit shingle hashes; a * x stays below 2**64
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._lock = threading.Lock()
+        self.counts = defaultdict(int)
+
+    def signature(self, words: List[str]) -> np.ndarray:
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {" ".join(words[start:start + size]) for start in range(max(1, len(words) - size + 1))}
+        hashes = np.array([int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little") for shingle in shingles],
+                          dtype=np.uint64)
+        return (((np.outer(hashes, self._a) % MERSENNE_PRIME) + self._b) % MERSENNE_PRIME).min(axis=0)
+
+    def cluster(self, documents: Dict[str, Tuple[str, Dict[str, List[str]]]]) -> Dict[str, str]:
+        """Maps every document key to its cluster representative (the longest text) given {key: (text, headers)}."""
+        parent = {key: key for key in documents}
+
+        def find(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        def union(first, second, reason):
+            first, second = find(first), find(second)
+            if first != second:
+                parent[second] = first
+                links[reason] += 1
+
+        links = defaultdict(int)
+        normalized = {key: normalize(text) for key, (text, _) in documents.items()}
+        fingerprints = {key: fingerprint(text) for key, (text, _) in documents.items()}
+
+        exact = {}
+        for key, text in normalized.items():
+            if not text:
+                continue  # Failed extractions are never merged
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            if digest in exact:
+                union(exact[digest], key, "exact")
+            else:
+                exact[digest] = key
+
+        # LSH: documents sharing any band of their MinHash signature become candidates
+        signatures = {key: self.signature(text.split()) for key, text in normalized.items() if text}
+        rows = len(self._a) // self.bands
+        buckets = defaultdict(list)
+        for key, signature in signatures.items():
+            for band in range(self.bands):
+                buckets[(band, signature[band * rows:(band + 1) * rows].tobytes())].append(key)
+        for members in buckets.values():
+            for first, other in itertools.combinations(members, 2):
+                if find(first) != find(other) and fingerprints[first] == fingerprints[other] \
+                        and np.mean(signatures[first] == signatures[other]) >= self.threshold:
+                    union(first, other, "near")
+
+        # Replies and forwards that add no new amounts, dates or deals belong to the message they answer
+        by_message_id = {message_id: key for key, (_, headers) in documents.items() for message_id in headers.get("message_id", [])}
+        for key, (_, headers) in documents.items():
+            for reference in headers.get("references", []):
+                other = by_message_id.get(reference)
+                if other is not None and other != key and fingerprints[other] == fingerprints[key]:
+                    union(other, key, "thread")
+
+        clusters = defaultdict(list)
+        for key in documents:
+            clusters[find(key)].append(key)
+        representatives = {}
+        for members in clusters.values():
+            representative = max(members, key=lambda key: len(normalized[key]))
+            representatives.update({key: representative for key in members})
+
+        with self._lock:
+            self.counts["documents"] += len(documents)
+            self.counts["clusters"] += len(clusters)
+            for reason, count in links.items():
+                self.counts[reason] += count
+        return representatives
+
+    def stats(self) -> Dict[str, float]:
+        """Cluster ratio (clusters / documents) and the classifications saved by each kind of link."""
+        with self._lock:
+            documents, clusters = self.counts["documents"], self.counts["clusters"]
+            return {"documents": documents, "clusters": clusters, "calls_saved": documents - clusters,
+                    "cluster_ratio": clusters / documents if documents else 1.0,
+                    "exact": self.counts["exact"], "near": self.counts["near"], "thread": self.counts["thread"]}
+
+
+def fan_out(results: List[Dict], representative: str) -> List[Dict]:
+    """Copies a representative's results for a duplicate, noting where they came from."""
+    return [{**copy.deepcopy(item), "duplicate_of": representative} for item in results]
+
+
+def analyze_deduplicated(paths: List[str], extract: Callable[[str], str], classify: Callable[[str, str], List[Dict]],
+                         deduplicator: Deduplicator, workers: int = 1) -> Iterator[Tuple[str, List[Dict], Optional[str]]]:
+    """Extracts every path, classifies one representative per cluster and yields (path, results, error) as clusters finish."""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        extract_futures = {path: pool.submit(extract, path) for path in paths}
+        texts, documents = {}, {}
+        for path, future in extract_futures.items():
+            try:
+                texts[path] = future.result()
+            except Exception as e:
+                yield path, [], str(e)
+                continue
+            documents[path] = (texts[path], email_headers(path))
+
+        members = defaultdict(list)
+        for path, representative in deduplicator.cluster(documents).items():
+            members[representative].append(path)
+        futures = {pool.submit(classify, representative, texts[representative]): representative for representative in members}
+        for future in as_completed(futures):
+            representative = futures[future]
+            try:
+                results, error = future.result(), None
+            except Exception as e:
+                results, error = [], str(e)
+            for path in members[representative]:
+                yield path, results if path == representative else fan_out(results, os.path.basename(representative)), error
@@ -0,0 +1,192 @@
+import base64
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Optional, Union
+
+import fitz  # PyMuPDF for reading PDFs
+import pdfplumber
+
+PdfSource = Union[str, bytes]
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever extraction or text normalization changes so cached extractions are not reused
+EXTRACTOR_VERSION = "2"
+# Decoded attachment bytes held in memory per file before spilling to a temporary file
+SPILL_BYTES = 32 * 1024 * 1024
+# Base64 characters decoded per step; a multiple of 4 so steps never split a quantum
+BASE64_CHUNK_CHARS = 4 * 1024 * 1024
+# Processes in the shared page-extraction pool, whatever the number of extractors or concurrent uploads
+MAX_PAGE_WORKERS = 4
+
+
+def _open_fitz(source: PdfSource):
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=memoryview(source), filetype="pdf")
+
+
+def _open_pdfplumber(source: PdfSource):
+    return pdfplumber.open(source if isinstance(source, str) else io.BytesIO(source))
+
+
+def extract_page_range(source: PdfSource, start: int, stop: int, min_chars: int) -> List[str]:
+    """Extracts pages [start, stop) with PyMuPDF, re-reading sparse pages with pdfplumber."""
+    with _open_fitz(source) as doc:
+        pages = [doc[index].get_text("text") for index in range(start, stop)]
+    # Pages where PyMuPDF finds almost no text usually need layout/table recovery
+    sparse = [offset for offset, text in enumerate(pages) if len(text.strip()) < min_chars]
+    if sparse:
+        try:
+            with _open_pdfplumber(source) as pdf:
+                for offset in sparse:
+                    recovered = pdf.pages[start + offset].extract_text(layout=True) or ""
+                    if len(recovered.strip()) > len(pages[offset].strip()):
+                        pages[offset] = recovered
+        except Exception as e:
+            logger.warning(f"pdfplumber fallback failed: {e}")
+    return pages
+
+
+_page_pool: Optional[ProcessPoolExecutor] = None
+_page_pool_lock = threading.Lock()
+
+
+def get_page_pool() -> ProcessPoolExecutor:
+    """Returns the process pool shared by every extractor for large PDFs, created on first use.
+
+    forkserver (spawn where unavailable) starts workers from a clean process: forking the app, which runs
+    Streamlit's and the model calls' threads, could deadlock the children.
+    """
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _page_pool = ProcessPoolExecutor(max_workers=MAX_PAGE_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _page_pool
+
+
+def _discard_page_pool(pool: ProcessPoolExecutor):
+    # A crashed worker breaks the whole pool; the next large PDF gets a new one
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is pool:
+            _page_pool = None
+    pool.shutdown(wait=False)
+
+
+class SpillBuffer:
+    """Byte sink kept in memory up to max_memory bytes, then moved to a temporary file that is removed on close."""
+
+    def __init__(self, max_memory: int = SPILL_BYTES, dir: Optional[str] = None):
+        self.max_memory = max_memory
+        self.dir = dir
+        self.size = 0
+        self.path: Optional[str] = None
+        self._memory = io.BytesIO()
+        self._file = None
+
+    def write(self, data: bytes) -> int:
+        if self._file is None and self.size + len(data) > self.max_memory:
+            fd, self.path = tempfile.mkstemp(suffix=".spill", dir=self.dir)
+            self._file = os.fdopen(fd, "wb")
+            self._file.write(self._memory.getbuffer())
+            self._memory = io.BytesIO()
+        (self._file or self._memory).write(data)
+        self.size += len(data)
+        return len(data)
+
+    def source(self) -> PdfSource:
+        """The buffered bytes, or the spill file's path once they outgrew memory."""
+        if self._file is not None:
+            self._file.flush()
+            return self.path
+        return self._memory.getvalue()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            os.remove(self.path)
+            self._file = None
+        self._memory = io.BytesIO()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def decode_base64(payload: str, sink, chunk_chars: int = BASE64_CHUNK_CHARS) -> int:
+    """Decodes a base64 payload into sink step by step, so only one step of decoded bytes is in flight; returns bytes written."""
+    written = 0
+    leftover = ""
+    for start in range(0, len(payload), chunk_chars):
+        # MIME wraps base64 in lines; whitespace is dropped before re-aligning to 4-character quanta
+        chunk = leftover + "".join(payload[start:start + chunk_chars].split())
+        usable = len(chunk) - len(chunk) % 4
+        written += sink.write(base64.b64decode(chunk[:usable]))
+        leftover = chunk[usable:]
+    if leftover:
+        written += sink.write(base64.b64decode(leftover + "=" * (-len(leftover) % 4)))
+    return written
+
+
+class DocumentExtractor:
+    """Single PDF extraction path: PyMuPDF by default, pdfplumber only for pages that need it."""
+
+    def __init__(self, page_workers: Optional[int] = None, parallel_page_threshold: int = 32, min_chars_per_page: int = 20, page_batch: int = 16,
+                 spill_bytes: int = SPILL_BYTES):
+        # Page ranges a large document is split into; they run on the shared pool of MAX_PAGE_WORKERS processes
+        self.page_workers = page_workers if page_workers is not None else min(MAX_PAGE_WORKERS, os.cpu_count() or 1)
+        self.parallel_page_threshold = parallel_page_threshold  # Documents with at least this many pages are split across processes
+        self.min_chars_per_page = min_chars_per_page
+        self.page_batch = page_batch  # Pages extracted per step on the sequential path
+        self.spill_bytes = spill_bytes  # Per-file memory cap for decoded attachments (see SpillBuffer)
+
+    def page_count(self, source: PdfSource) -> int:
+        with _open_fitz(source) as doc:
+            return doc.page_count
+
+    def iter_pages(self, source: PdfSource) -> Iterator[str]:
+        """Yields the raw text of every page, in page order, holding one batch of pages (or one range per worker) at a time."""
+        page_count = self.page_count(source)
+        if self.page_workers <= 1 or page_count < self.parallel_page_threshold:
+            for start in range(0, page_count, self.page_batch):
+                yield from extract_page_range(source, start, min(start + self.page_batch, page_count), self.min_chars_per_page)
+            return
+
+        # Large documents: one contiguous page range per worker, each worker opens its own copy
+        workers = min(self.page_workers, page_count)
+        step = -(-page_count // workers)
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        pool = get_page_pool()
+        futures = [pool.submit(extract_page_range, source, start, stop, self.min_chars_per_page) for start, stop in ranges]
+        try:
+            for future in futures:
+                yield from future.result()
+        except BrokenProcessPool:
+            _discard_page_pool(pool)
+            raise
+        finally:
+            for future in futures:
+                future.cancel()  # Ranges not started yet when the caller stops early or a range fails
+
+    def extract_pages(self, source: PdfSource) -> List[str]:
+        """Returns the raw text of every page, in page order."""
+        return list(self.iter_pages(source))
+
+    def iter_text(self, source: PdfSource) -> Iterator[str]:
+        """Yields each page's text as a single line."""
+        for page in self.iter_pages(source):
+            yield page.replace("\n", " ").strip()
+
+    def extract_text(self, source: PdfSource) -> str:
+        """Returns the document text as a single line, pages joined by spaces."""
+        return " ".join(self.iter_text(source)).strip()
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """Returns the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """On-disk cache of normalized extracted text, keyed by file content hash and extractor version."""
+
+    def __init__(self, db_path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes  # Compressed bytes kept before least recently used entries are evicted
+        self.codec = "zstd" if zstandard else "zlib"
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # WAL lets extraction worker processes share the file
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS extractions (key TEXT PRIMARY KEY, codec TEXT NOT NULL, data BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS extractions_accessed ON extractions (accessed)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(content_hash: str, extractor_version: str) -> str:
+        return f"{extractor_version}:{content_hash}"
+
+    def _compress(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+        return zstandard.ZstdCompressor(level=3).compress(data) if self.codec == "zstd" else zlib.compress(data, 6)
+
+    @staticmethod
+    def _decompress(codec: str, blob: bytes) -> Optional[str]:
+        if codec == "zstd":
+            return zstandard.ZstdDecompressor().decompress(blob).decode("utf-8") if zstandard else None
+        return zlib.decompress(blob).decode("utf-8")
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached text for key, or None on a miss."""
+        with self._lock:
+            row = self._db.execute("SELECT codec, data FROM extractions WHERE key = ?", (key,)).fetchone()
+            text = self._decompress(row[0], row[1]) if row else None
+            if text is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE extractions SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            return text
+
+    def put(self, key: str, text: str):
+        """Stores extracted text, then evicts least recently used entries above max_bytes."""
+        blob = self._compress(text)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO extractions (key, codec, data, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                             (key, self.codec, blob, len(blob), time.time()))
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, size in self._db.execute("SELECT key, size FROM extractions ORDER BY accessed").fetchall():
+                    if total <= self.max_bytes or old_key == key:
+                        break
+                    self._db.execute("DELETE FROM extractions WHERE key = ?", (old_key,))
+                    total -= size
+            self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions").fetchone()
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+_caches: Dict[Tuple[int, str], ExtractionCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_extraction_cache(db_path: str) -> ExtractionCache:
+    """Returns the shared cache for a path; keyed by process id so forked workers open their own connection."""
+    key = (os.getpid(), db_path)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = ExtractionCache(db_path)
+        return _caches[key]
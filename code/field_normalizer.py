@@ -0,0 +1,204 @@
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from pre_classifier import ACCOUNT, AMOUNT, CURRENCY_SYMBOLS, DATE, DEAL
+
+FIELDS = ("deal_name", "amount", "transaction_date", "account_number", "currency")
+MISSING = ("", "NA", "N/A", "NONE", "NULL", "NAN", "UNKNOWN")
+CENT = Decimal("0.01")
+
+# Scale word or suffix after a number ("$2.5M", "USD 1.5 million", "EUR 300k"); longer forms first
+SCALE = r'(?:\s*(?P<scale>(?i:thousand|million|billion|mm|mn|bn|k|m|b))\b)?'
+SCALES = {"K": Decimal(10) ** 3, "THOUSAND": Decimal(10) ** 3, "M": Decimal(10) ** 6, "MM": Decimal(10) ** 6, "MN": Decimal(10) ** 6,
+          "MILLION": Decimal(10) ** 6, "B": Decimal(10) ** 9, "BN": Decimal(10) ** 9, "BILLION": Decimal(10) ** 9}
+# A model-written amount: optional symbol or ISO code before, number and scale, optional ISO code after ("$1,250.50", "EUR 14,000", "500 USD")
+AMOUNT_FIELD = re.compile(r'(?P<symbol>US\$|[$€£¥₹])?\s*(?P<code>[A-Za-z]{3})?\s*(?P<number>\d[\d,]*(?:\.\d+)?)' + SCALE + r'\s*(?P<suffix>[A-Za-z]{3})?')
+NUMBER = re.compile(r'(?P<number>\d[\d,]*(?:\.\d+)?)' + SCALE)
+TEXT_AMOUNT = re.compile(AMOUNT.pattern + SCALE)  # Currency-marked amounts in the source text
+DIGITS = re.compile(r'(?P<digits>\d[\d-]*\d)')
+DATE_GROUP = re.compile(f"({DATE.pattern})")
+ORDINAL = re.compile(r'(\d)(?:st|nd|rd|th)\b')
+ACCOUNT_FIELD = re.compile(r'(?P<account>\d[\d -]{2,}\d|\d{3,})')
+DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d", "%B %d, %Y", "%b %d, %Y", "%B %d %Y", "%d %B %Y", "%d %b %Y", "%m/%d/%y")
+ISO_CURRENCIES = frozenset("USD EUR GBP JPY CHF CAD AUD NZD CNY HKD SGD INR SEK NOK DKK MXN BRL ZAR".split())
+CURRENCY_ALIASES = {**CURRENCY_SYMBOLS, "US$": "USD", "₹": "INR", "DOLLAR": "USD", "DOLLARS": "USD", "US DOLLARS": "USD", "EURO": "EUR",
+                    "EUROS": "EUR", "POUND": "GBP", "POUNDS": "GBP", "STERLING": "GBP", "YEN": "JPY", "RUPEE": "INR", "RUPEES": "INR",
+                    **{code: code for code in ISO_CURRENCIES}}
+
+
+def _text(values: pd.Series) -> pd.Series:
+    """Strips the column as strings; placeholders such as "NA" become missing."""
+    text = values.astype("string").str.strip()
+    return text.mask(text.str.upper().isin(MISSING))
+
+
+def _decimal(number: str):
+    try:
+        return Decimal(number).quantize(CENT)
+    except InvalidOperation:  # More digits than Decimal's context holds
+        return np.nan
+
+
+def _decimals(numbers: pd.Series, scales: Optional[pd.Series] = None) -> pd.Series:
+    """Decimal amounts with cents, each multiplied by its scale word when one followed the number."""
+    amounts = numbers.str.replace(",", "", regex=False).map(Decimal, na_action="ignore").astype(object)
+    if scales is not None:
+        factors = scales.str.upper().map(SCALES)
+        scaled = factors.notna() & amounts.notna()
+        amounts[scaled] = amounts[scaled] * factors[scaled]
+    return amounts.map(_decimal, na_action="ignore").astype(object)
+
+
+def _currency(codes: pd.Series) -> pd.Series:
+    return codes.str.upper().map(CURRENCY_ALIASES).astype(object)
+
+
+def parse_amounts(values: pd.Series) -> pd.DataFrame:
+    """Parses a column of amount strings into Decimal amounts and the currency their symbol or code implies."""
+    parts = _text(values).str.extract(AMOUNT_FIELD)
+    hint = _currency(parts["symbol"]).fillna(_currency(parts["code"])).fillna(_currency(parts["suffix"]))
+    return pd.DataFrame({"amount": _decimals(parts["number"], parts["scale"]), "currency": hint}, index=values.index)
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """Parses a column of date strings into datetime64, trying each known format on the rows still unparsed."""
+    text = _text(values).str.replace(ORDINAL, r"\1", regex=True).str.replace(r"\s+", " ", regex=True)
+    dates = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for date_format in DATE_FORMATS:
+        pending = dates.isna() & text.notna()
+        if not pending.any():
+            break
+        dates[pending] = pd.to_datetime(text[pending].astype(object), format=date_format, errors="coerce")
+    return dates
+
+
+def parse_currencies(values: pd.Series) -> pd.Series:
+    """Maps currency names, symbols and codes to ISO 4217 codes."""
+    text = _text(values).str.upper()
+    return text.map(CURRENCY_ALIASES).astype(object).fillna(_currency(text.str.extract(r'\b([A-Z]{3})\b', expand=False)))
+
+
+def parse_accounts(values: pd.Series) -> pd.Series:
+    """Digits of the account number, without labels, spaces or dashes."""
+    accounts = _text(values).str.extract(ACCOUNT_FIELD, expand=False)
+    return accounts.str.replace(r'[ -]', "", regex=True).astype(object)
+
+
+def parse_deals(values: pd.Series) -> pd.Series:
+    """"Deal <CODE>" with the code upper-cased; names without the Deal prefix are kept as written."""
+    text = _text(values)
+    codes = text.str.extract(DEAL.pattern, flags=re.IGNORECASE, expand=False)
+    return ("Deal " + codes.str.upper()).fillna(text).astype(object)
+
+
+def _candidates(source: pd.Series, pattern, parse) -> pd.Series:
+    """Every match of pattern in each row's source text, parsed; indexed by row (repeated per match)."""
+    matches = source.str.extractall(pattern)
+    parsed = parse(matches)
+    parsed.index = matches.index.get_level_values(0)
+    return parsed.dropna()
+
+
+def _check(values: pd.Series, candidates: pd.Series, source: pd.Series) -> pd.Series:
+    """True/False whether each value occurs among its row's candidates; NA without a value or source text."""
+    found = (candidates == values.reindex(candidates.index)).groupby(level=0).any() if len(candidates) else pd.Series(dtype=bool)
+    checked = found.reindex(values.index, fill_value=False).astype("boolean")
+    return checked.mask(values.isna() | source.isna())
+
+
+def _words(values: pd.Series) -> pd.Series:
+    """Lower-cased words joined and padded by single spaces, so word sequences can be matched as substrings."""
+    return " " + values.str.lower().str.replace(r'[^0-9a-z]+', " ", regex=True).str.strip() + " "
+
+
+def _check_deals(deal: pd.Series, text_deals: pd.Series, source: pd.Series) -> pd.Series:
+    """True when the deal name's words occur in the source text; False only when the text names a different "Deal <CODE>".
+
+    Free-form names the text does not repeat word for word stay NA (unknown) rather than failed.
+    """
+    names, texts = _words(deal.astype("string")), _words(source)
+    found = pd.Series([pd.NA if pd.isna(name) or pd.isna(text) else name in text for name, text in zip(names, texts)],
+                      index=deal.index, dtype="boolean")
+    coded = deal.astype("string").str.fullmatch(DEAL.pattern).fillna(False).astype(bool)
+    text_coded = pd.Series(deal.index.isin(text_deals.index), index=deal.index)
+    return found.mask(found.eq(False).fillna(False) & ~(coded & text_coded))
+
+
+def _only(candidates: pd.Series, index: pd.Index) -> pd.Series:
+    """The candidate of rows whose source text holds exactly one distinct value."""
+    if not len(candidates):
+        return pd.Series(np.nan, index=index, dtype=object)
+    grouped = candidates.groupby(level=0)
+    single = grouped.first().where(grouped.nunique() == 1)
+    return single.reindex(index)
+
+
+def normalize_fields(fields: pd.DataFrame, source: Optional[pd.Series] = None) -> pd.DataFrame:
+    """Types raw extracted_fields columns in one pass over the whole batch and checks them against each row's source text.
+
+    Model values win; a field the model left empty is taken from the source text when it holds exactly one candidate.
+    The *_verified columns say whether the value occurs in the source text (NA when either is missing).
+    """
+    fields = fields.reset_index(drop=True).reindex(columns=list(FIELDS))
+    source = (_text(source.reset_index(drop=True)) if source is not None else pd.Series(pd.NA, index=fields.index, dtype="string"))
+
+    # Candidates for filling empty fields come from labelled patterns (currency-marked amounts, "account ...", "Deal ...")
+    text_amounts = _candidates(source, TEXT_AMOUNT, lambda matches: _decimals(matches[2], matches["scale"]))
+    text_currencies = _candidates(source, TEXT_AMOUNT, lambda matches: _currency(matches[0]).fillna(_currency(matches[1])))
+    text_dates = _candidates(source, DATE_GROUP, lambda matches: parse_dates(matches[0]))
+    text_accounts = _candidates(source, ACCOUNT, lambda matches: parse_accounts(matches[0]))
+    text_deals = _candidates(source, DEAL, lambda matches: ("Deal " + matches[0].str.upper()).astype(object))
+    # Verification accepts any occurrence, labelled or not
+    text_numbers = _candidates(source, NUMBER, lambda matches: _decimals(matches["number"], matches["scale"]))
+    text_digits = _candidates(source, DIGITS, lambda matches: matches["digits"].str.replace("-", "", regex=False).astype(object))
+
+    amounts = parse_amounts(fields["amount"])
+    amount = amounts["amount"].fillna(_only(text_amounts, fields.index))
+    dates = parse_dates(fields["transaction_date"]).fillna(pd.to_datetime(_only(text_dates, fields.index)))
+    account = parse_accounts(fields["account_number"]).fillna(_only(text_accounts, fields.index))
+    deal = parse_deals(fields["deal_name"]).fillna(_only(text_deals, fields.index))
+    # Currency: the field, else the amount's symbol or code, else the only currency marked in the text
+    currency = parse_currencies(fields["currency"]).fillna(amounts["currency"]).fillna(_only(text_currencies, fields.index))
+
+    normalized = pd.DataFrame({
+        "deal_name": deal,
+        "amount": amount,
+        "currency": pd.Categorical(currency.where(currency.notna(), None)),
+        "transaction_date": dates,
+        "account_number": account,
+    })
+    normalized["amount_verified"] = _check(amount, text_numbers, source)
+    normalized["date_verified"] = _check(dates, text_dates, source)
+    normalized["account_verified"] = _check(account, text_digits, source)
+    normalized["deal_verified"] = _check_deals(deal, text_deals, source)
+    flags = normalized[["amount_verified", "date_verified", "account_verified", "deal_verified"]]
+    # All checkable fields found in the text; NA when nothing could be checked
+    normalized["fields_verified"] = flags.all(axis=1, skipna=True).astype("boolean").mask(flags.isna().all(axis=1))
+    return normalized
+
+
+def output_frame(output_dict: Dict[str, List[Dict]]) -> pd.DataFrame:
+    """One row per classified item of launcher output ({file: [items]}), with raw fields and the item's supporting text."""
+    rows = []
+    for file_name, entries in output_dict.items():
+        for entry in entries:
+            sub_category = entry.get("sub_category") or {}
+            fields = entry.get("extracted_fields") or {}
+            rows.append({"file": file_name, "category": entry.get("category"), "confidence": entry.get("confidence_score"),
+                         "sub_category": sub_category.get("name"), "sub_confidence": sub_category.get("confidence_score"),
+                         "associated_text": entry.get("associated_text"), **{name: fields.get(name) for name in FIELDS}})
+    columns = ["file", "category", "confidence", "sub_category", "sub_confidence", "associated_text", *FIELDS]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def normalize_output(output_dict: Dict[str, List[Dict]]) -> pd.DataFrame:
+    """output_frame with typed fields next to the raw text the model returned (amount_text, transaction_date_text)."""
+    frame = output_frame(output_dict)
+    normalized = normalize_fields(frame[list(FIELDS)], frame["associated_text"])
+    normalized["amount_text"] = _text(frame["amount"]).astype(object)
+    normalized["transaction_date_text"] = _text(frame["transaction_date"]).astype(object)
+    return pd.concat([frame.drop(columns=list(FIELDS)), normalized], axis=1)
@@ -0,0 +1,197 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from classifier import AnalysisLauncher, require_text
+from extraction_cache import file_digest, get_extraction_cache
+from instrumentation import Tracer, serve_metrics
+from llm_cache import get_response_cache
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional, the daemon falls back to polling
+    Observer = None
+    FileSystemEventHandler = object
+
+SUPPORTED_EXTENSIONS = (".pdf", ".eml")
+
+logger = logging.getLogger(__name__)
+
+
+class _WakeOnChange(FileSystemEventHandler):
+    """Wakes the daemon loop whenever the watched folder changes."""
+
+    def __init__(self, wake: threading.Event):
+        self.wake = wake
+
+    def on_any_event(self, event):
+        self.wake.set()
+
+
+class IngestDaemon:
+    """Watches a drop folder and analyzes only new or changed files, resuming from a checkpoint manifest."""
+
+    def __init__(self, watch_dir: str, store_path: str, manifest_path: str, poll_interval: float = 5.0,
+                 settle_seconds: float = 2.0, use_inotify: bool = True, launcher_factory: Optional[Callable[[], AnalysisLauncher]] = None,
+                 retry_seconds: float = 300.0):
+        self.watch_dir = watch_dir
+        self.store_path = store_path  # Append-only JSONL of per-file results
+        self.manifest_path = manifest_path  # Checkpoint of processed files so restarts resume
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds  # Files modified more recently than this may still be copying
+        self.retry_seconds = retry_seconds  # Unchanged files that failed are retried after this long (and on restart)
+        self.use_inotify = use_inotify and Observer is not None
+        self.launcher_factory = launcher_factory or (lambda: AnalysisLauncher(watch_dir))
+        self.manifest = self._load_manifest()
+        self._failed_at: Dict[str, float] = {}  # When each file last failed in this run; empty after a restart
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self):
+        # Write-then-rename so a crash never leaves a truncated manifest
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _skip(self, filename: str, entry: Dict) -> bool:
+        """True when an unchanged file needs no analysis: it is done, or it failed and its retry is not due yet."""
+        if entry["status"] == "done":
+            return True
+        failed_at = self._failed_at.get(filename)
+        return failed_at is not None and time.monotonic() - failed_at < self.retry_seconds
+
+    def pending_files(self) -> List[str]:
+        """Lists supported files that are new or changed since they were last analyzed."""
+        pending = []
+        now = time.time()
+        for filename in sorted(os.listdir(self.watch_dir)):
+            path = os.path.join(self.watch_dir, filename)
+            if not filename.lower().endswith(SUPPORTED_EXTENSIONS) or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            if now - stat.st_mtime < self.settle_seconds:
+                continue
+            entry = self.manifest.get(filename)
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns and self._skip(filename, entry):
+                continue
+            pending.append(filename)
+        return pending
+
+    def process_file(self, filename: str) -> Optional[Dict]:
+        """Analyzes one file, appends its record to the store and checkpoints it in the manifest."""
+        path = os.path.join(self.watch_dir, filename)
+        stat = os.stat(path)
+        digest = file_digest(path)
+        entry = self.manifest.get(filename)
+        if entry and entry["digest"] == digest and self._skip(filename, entry):
+            # Touched but unchanged: refresh the checkpoint without re-analyzing
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            self._save_manifest()
+            return None
+
+        record = {"file": filename, "digest": digest, "analyzed_at": datetime.now(timezone.utc).isoformat()}
+        try:
+            launcher = self.launcher_factory()
+            record["results"] = launcher.process_text(filename, require_text(path, launcher.extract_text_from_path(path)))
+            status = "done"
+            self._failed_at.pop(filename, None)
+        except Exception as e:
+            logger.error(f"Error analyzing {filename}: {e}")
+            record["error"] = str(e)
+            status = "failed"
+            self._failed_at[filename] = time.monotonic()
+
+        with open(self.store_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        self.manifest[filename] = {"digest": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "status": status}
+        self._save_manifest()
+        return record
+
+    def run_once(self) -> int:
+        """Processes everything currently pending; returns the number of files analyzed."""
+        processed = 0
+        for filename in self.pending_files():
+            if self.process_file(filename) is not None:
+                processed += 1
+        return processed
+
+    def run_forever(self):
+        """Runs until stop() is called, woken by inotify events or every poll_interval seconds."""
+        observer = None
+        if self.use_inotify:
+            observer = Observer()
+            observer.schedule(_WakeOnChange(self._wake), self.watch_dir, recursive=False)
+            observer.start()
+            logger.info(f"👀 Watching {self.watch_dir} for new files (inotify).")
+        else:
+            logger.info(f"👀 Polling {self.watch_dir} every {self.poll_interval}s.")
+        try:
+            while not self._stop.is_set():
+                processed = self.run_once()
+                if processed:
+                    logger.info(f"✅ Analyzed {processed} new or changed file(s).")
+                # Events only wake the loop early; the timeout still rescans for files that were settling
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuously analyze PDF/EML files dropped into a folder.")
+    parser.add_argument("--watch", required=True, help="Drop folder to watch")
+    parser.add_argument("--store", default="results/ingest_results.jsonl", help="Append-only JSONL results store")
+    parser.add_argument("--manifest", default="results/ingest_manifest.json", help="Checkpoint manifest")
+    parser.add_argument("--poll", action="store_true", help="Poll instead of using inotify")
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    parser.add_argument("--retry-seconds", type=float, default=300.0, help="Wait before retrying an unchanged file that failed")
+    parser.add_argument("--extraction-cache", default="cache/extractions.sqlite")
+    parser.add_argument("--response-cache", default="cache/llm_responses.sqlite")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    parser.add_argument("--trace-log", help="Append per-stage spans to this JSONL file")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="Interface for --metrics-port (0.0.0.0 exposes file names on every interface)")
+    parser.add_argument("--profile-dir", help="Write a cProfile dump per file and stage to this folder")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    tracer = Tracer(args.trace_log, args.profile_dir)
+    if args.metrics_port:
+        serve_metrics(tracer, args.metrics_port, args.metrics_host)
+
+    for path in (args.store, args.manifest):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+    extraction_cache = get_extraction_cache(args.extraction_cache)
+    response_cache = get_response_cache(args.response_cache)
+    daemon = IngestDaemon(args.watch, args.store, args.manifest, poll_interval=args.poll_interval, use_inotify=not args.poll, retry_seconds=args.retry_seconds,
+                          launcher_factory=lambda: AnalysisLauncher(args.watch, cache=response_cache, extraction_cache=extraction_cache, tracer=tracer))
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        daemon.stop()
+    finally:
+        tracer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import contextlib
+import contextvars
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+# Histogram bucket bounds in seconds, from cached lookups up to slow 14B model calls
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Numeric span attributes with these suffixes are summed into volume counters
+VOLUME_SUFFIXES = ("_bytes", "_chars", "_tokens")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def current_trace() -> Optional[str]:
+    """The file the innermost running span belongs to, or None outside any span."""
+    span = _current_span.get()
+    return span.trace if span else None
+
+
+class Span:
+    """One timed stage of a file's analysis; attributes can be added while it runs."""
+
+    __slots__ = ("name", "trace", "parent", "attrs", "start", "duration")
+
+    def __init__(self, name: str, trace: Optional[str], parent: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.trace = trace  # File the span belongs to, inherited from the enclosing span
+        self.parent = parent
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"span": self.name, "trace": self.trace, "parent": self.parent, "start": self.start,
+                "duration": round(self.duration, 6), **self.attrs}
+
+
+class Tracer:
+    """Records pipeline spans, aggregates them into Prometheus metrics and optionally appends them to a JSONL log."""
+
+    def __init__(self, jsonl_path: Optional[str] = None, profile_dir: Optional[str] = None, keep: int = 1000):
+        self.jsonl_path = jsonl_path  # Append-only span log, one JSON object per line
+        self.profile_dir = profile_dir  # cProfile output per file, when set
+        self.recent = deque(maxlen=keep)  # Last finished spans, for inspection without a log file
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+        self._sums = defaultdict(float)
+        self._buckets = defaultdict(lambda: [0] * len(BUCKETS))
+        self._errors = defaultdict(int)
+        self._volumes = defaultdict(float)
+        self._counters = defaultdict(float)  # (name, labels) -> total, for outcomes that are not timed stages
+        self._log = None
+        if jsonl_path:
+            if os.path.dirname(jsonl_path):
+                os.makedirs(os.path.dirname(jsonl_path), exist_ok=True)
+            self._log = open(jsonl_path, "a", encoding="utf-8")
+
+    @contextlib.contextmanager
+    def span(self, name: str, trace: Optional[str] = None, **attrs):
+        """Times the enclosed block as a span nested under the current one."""
+        parent = _current_span.get()
+        span = Span(name, trace or (parent.trace if parent else None), parent.name if parent else None, attrs)
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            _current_span.reset(token)
+            self._finish(span)
+
+    def _finish(self, span: Span):
+        record = span.to_dict()
+        line = json.dumps(record, default=str) + "\n" if self._log else None
+        with self._lock:
+            self._counts[span.name] += 1
+            self._sums[span.name] += span.duration
+            buckets = self._buckets[span.name]
+            for index, bound in enumerate(BUCKETS):
+                if span.duration <= bound:
+                    buckets[index] += 1
+            if "error" in span.attrs:
+                self._errors[span.name] += 1
+            for key, value in span.attrs.items():
+                if key.endswith(VOLUME_SUFFIXES) and isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._volumes[(span.name, key)] += value
+            self.recent.append(record)
+            if line:
+                self._log.write(line)
+                self._log.flush()
+
+    def add(self, name: str, value: float = 1, **labels):
+        """Adds to a labelled counter, e.g. add("parse_outcomes", method="raw"); shared by every launcher using this tracer."""
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def counters(self) -> Dict[str, Dict[str, float]]:
+        """Counter totals per name, keyed by their labels ("method=raw"); "" for a counter without labels."""
+        totals = defaultdict(dict)
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                totals[name][",".join(f"{key}={label}" for key, label in labels)] = round(value, 4)
+        return dict(totals)
+
+    @contextlib.contextmanager
+    def profile(self, name: str):
+        """Profiles the enclosed block into <profile_dir>/<name>.prof when profiling is enabled."""
+        if not self.profile_dir:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.profile_dir, re.sub(r'[^\w.-]', "_", name) + ".prof"))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage count, total and mean seconds."""
+        with self._lock:
+            return {name: {"count": count, "total_seconds": round(self._sums[name], 4), "mean_seconds": round(self._sums[name] / count, 4),
+                           "errors": self._errors[name]} for name, count in sorted(self._counts.items())}
+
+    def prometheus_text(self) -> str:
+        """Renders the aggregates in the Prometheus text exposition format."""
+        lines = ["# HELP pipeline_stage_seconds Time spent in each pipeline stage.", "# TYPE pipeline_stage_seconds histogram"]
+        with self._lock:
+            for name in sorted(self._counts):
+                for bound, count in zip(BUCKETS, self._buckets[name]):
+                    lines.append(f'pipeline_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'pipeline_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {self._counts[name]}')
+                lines.append(f'pipeline_stage_seconds_sum{{stage="{name}"}} {self._sums[name]:.6f}')
+                lines.append(f'pipeline_stage_seconds_count{{stage="{name}"}} {self._counts[name]}')
+            lines += ["# HELP pipeline_stage_errors_total Spans that ended with an exception.", "# TYPE pipeline_stage_errors_total counter"]
+            lines += [f'pipeline_stage_errors_total{{stage="{name}"}} {self._errors[name]}' for name in sorted(self._counts)]
+            lines += ["# HELP pipeline_stage_volume_total Bytes, characters and tokens handled per stage.", "# TYPE pipeline_stage_volume_total counter"]
+            lines += [f'pipeline_stage_volume_total{{stage="{name}",measure="{key}"}} {value:g}' for (name, key), value in sorted(self._volumes.items())]
+            for name in sorted({name for name, _ in self._counters}):
+                lines += [f"# TYPE pipeline_{name}_total counter"]
+                for (counter, labels), value in sorted(self._counters.items()):
+                    if counter == name:
+                        rendered = ",".join(f"{key}={json.dumps(str(label))}" for key, label in labels)
+                        lines.append(f"pipeline_{name}_total{{{rendered}}} {value:g}" if rendered else f"pipeline_{name}_total {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        with self._lock:
+            if self._log:
+                self._log.close()
+                self._log = None
+
+
+def serve_metrics(tracer: Tracer, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves tracer.prometheus_text() on http://host:port/metrics from a daemon thread.
+
+    Bound to localhost by default: the metrics name the files being analyzed. Pass host="0.0.0.0" to expose them.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            data = tracer.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Returns the shared in-memory tracer used when no tracer is configured."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
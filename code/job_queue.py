@@ -0,0 +1,295 @@
+import argparse
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from classifier import AnalysisLauncher, require_text
+from dedup import Deduplicator, analyze_deduplicated
+from extraction_cache import get_extraction_cache
+from instrumentation import Tracer
+from llm_backend import get_backend
+from llm_cache import get_response_cache
+from model_cascade import get_model_cascade
+from pre_classifier import PreClassifier
+from prompt_budget import PromptBudget
+from prompt_resources import get_prompt_resources
+from results_store import get_results_store
+from workspace import PromptArchive
+
+# Per-job settings and their defaults; anything else in the submitted options is ignored
+JOB_OPTIONS = {"llm_workers": 1, "stream": False, "max_prompt_tokens": 0, "pre_classify": False, "combined": False, "dedup": False, "static_prefix": False,
+               "fast_model": "", "escalation_threshold": 0.7, "archive": False}
+
+logger = logging.getLogger(__name__)
+
+
+class JobStore:
+    """SQLite queue of analysis jobs and their per-file results, shared by the app and the worker process."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")  # The app polls while the worker writes
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, options TEXT NOT NULL, workspace TEXT,
+                                             total INTEGER NOT NULL, created REAL NOT NULL, started REAL, finished REAL, error TEXT);
+            CREATE TABLE IF NOT EXISTS job_files (job_id TEXT NOT NULL, path TEXT NOT NULL, status TEXT NOT NULL, PRIMARY KEY (job_id, path));
+            CREATE TABLE IF NOT EXISTS job_results (seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, file TEXT NOT NULL,
+                                                    results TEXT, error TEXT, finished REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS job_results_job ON job_results (job_id, seq);
+        """)
+        # Databases created before jobs could fail as a whole have no error column
+        if "error" not in [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN error TEXT")
+        self._db.commit()
+
+    def submit(self, paths: List[str], options: Optional[Dict] = None, workspace: Optional[str] = None) -> str:
+        """Queues the files for analysis and returns the new job ID; workspace is deleted once the job is done."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute("INSERT INTO jobs (id, status, options, workspace, total, created) VALUES (?, 'queued', ?, ?, ?, ?)",
+                             (job_id, json.dumps(options or {}), workspace, len(paths), time.time()))
+            self._db.executemany("INSERT OR IGNORE INTO job_files (job_id, path, status) VALUES (?, ?, 'queued')",
+                                 [(job_id, path) for path in paths])
+            self._db.commit()
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """Marks the oldest queued job as running and returns it, or None when the queue is empty."""
+        with self._lock:
+            while True:
+                row = self._db.execute("SELECT id, options, workspace FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+                if row is None:
+                    return None
+                # Another worker may have claimed it between the two statements
+                claimed = self._db.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ? AND status = 'queued'",
+                                           (time.time(), row[0])).rowcount
+                self._db.commit()
+                if claimed:
+                    return {"id": row[0], "options": json.loads(row[1]), "workspace": row[2]}
+
+    def requeue_running(self) -> int:
+        """Puts jobs left running by a stopped worker back in the queue; their finished files are kept."""
+        with self._lock:
+            count = self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+            self._db.commit()
+            return count
+
+    def pending_files(self, job_id: str) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT path FROM job_files WHERE job_id = ? AND status = 'queued' ORDER BY rowid", (job_id,))]
+
+    def record(self, job_id: str, path: str, results: Optional[List[Dict]] = None, error: Optional[str] = None):
+        """Stores one file's results (or error) so pollers can pick it up before the job finishes."""
+        with self._lock:
+            self._db.execute("UPDATE job_files SET status = ? WHERE job_id = ? AND path = ?", ("failed" if error else "done", job_id, path))
+            self._db.execute("INSERT INTO job_results (job_id, file, results, error, finished) VALUES (?, ?, ?, ?, ?)",
+                             (job_id, os.path.basename(path), json.dumps(results if results is not None else []), error, time.time()))
+            self._db.commit()
+
+    def finish(self, job_id: str, status: str = "done", error: Optional[str] = None):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = ?, finished = ?, error = ? WHERE id = ?", (status, time.time(), error, job_id))
+            self._db.commit()
+
+    def job(self, job_id: str) -> Optional[Dict]:
+        """Returns the job's status and progress counters, or None for an unknown ID."""
+        with self._lock:
+            row = self._db.execute("SELECT status, total, created, started, finished, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            done, failed = self._db.execute("SELECT COUNT(*), COUNT(error) FROM job_results WHERE job_id = ?", (job_id,)).fetchone()
+        return {"id": job_id, "status": row[0], "total": row[1], "done": done, "failed": failed,
+                "created": row[2], "started": row[3], "finished": row[4], "error": row[5]}
+
+    def results(self, job_id: str, after: int = 0) -> List[Dict]:
+        """Returns per-file results recorded after the seq cursor, oldest first."""
+        with self._lock:
+            rows = self._db.execute("SELECT seq, file, results, error FROM job_results WHERE job_id = ? AND seq > ? ORDER BY seq",
+                                    (job_id, after)).fetchall()
+        return [{"seq": seq, "file": file, "results": json.loads(results), "error": error} for seq, file, results, error in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class JobWorker:
+    """Runs queued jobs one after another, keeping prompt resources, the model client and caches warm between jobs."""
+
+    def __init__(self, store: JobStore, cache_path: Optional[str] = None, extraction_cache_path: Optional[str] = None,
+                 trace_path: Optional[str] = None, results_store_path: Optional[str] = None, poll_interval: float = 0.5, launcher_factory: Optional[Callable[[Dict], AnalysisLauncher]] = None,
+                 archive_root: Optional[str] = None):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.cache = get_response_cache(cache_path)
+        self.extraction_cache = get_extraction_cache(extraction_cache_path) if extraction_cache_path else None
+        self.pre_classifier = PreClassifier()
+        self.tracer = Tracer(trace_path)
+        self.results_store = get_results_store(results_store_path) if results_store_path else None  # Each job is appended as one Parquet batch
+        self.launcher_factory = launcher_factory or self.make_launcher
+        self.archive_root = archive_root  # Jobs submitted with archive=True keep their prompts and responses in archive_root/<job id>
+        self._stop = threading.Event()
+
+    def make_launcher(self, options: Dict) -> AnalysisLauncher:
+        budget = PromptBudget(options["max_prompt_tokens"]) if options["max_prompt_tokens"] else None
+        return AnalysisLauncher(None, cache=self.cache, stream=options["stream"], extraction_cache=self.extraction_cache, budget=budget,
+                                pre_classifier=self.pre_classifier if options["pre_classify"] else None, combined=options["combined"], tracer=self.tracer,
+                                static_prefix=options["static_prefix"],
+                                cascade=get_model_cascade(options["fast_model"], threshold=float(options["escalation_threshold"])) if options["fast_model"] else None,
+                                archive=PromptArchive(options["archive_dir"]) if options.get("archive_dir") else None)
+
+    def warm_up(self):
+        # Load prompt files, open the model client and pin the model before the first job arrives
+        get_prompt_resources()
+        try:
+            get_backend().preload()
+        except Exception as e:
+            logger.warning(f"Could not preload the model: {e}")
+
+    def extract(self, path: str, options: Dict) -> str:
+        return require_text(path, self.launcher_factory(options).extract_text_from_path(path))
+
+    def analyze(self, path: str, options: Dict) -> List[Dict]:
+        return self.launcher_factory(options).process_text(os.path.basename(path), self.extract(path, options))
+
+    def run_deduplicated(self, job: Dict, options: Dict):
+        deduplicator = Deduplicator()
+        for path, results, error in analyze_deduplicated(
+                self.store.pending_files(job["id"]), lambda path: self.extract(path, options),
+                lambda path, text: self.launcher_factory(options).process_text(os.path.basename(path), text), deduplicator, int(options["llm_workers"])):
+            if error:
+                logger.error(f"Error analyzing {path}: {error}")
+            self.store.record(job["id"], path, results=results, error=error)
+        logger.info(f"🧬 Job {job['id']} duplicates: {deduplicator.stats()}")
+
+    def run_job(self, job: Dict):
+        options = {**JOB_OPTIONS, **{key: value for key, value in job["options"].items() if key in JOB_OPTIONS}}
+        if options["archive"] and self.archive_root:
+            options["archive_dir"] = os.path.join(self.archive_root, job["id"])
+        if options["dedup"]:
+            self.run_deduplicated(job, options)
+        else:
+            self.run_files(job, options)
+        if self.results_store:
+            # Read back from the queue so files finished before a restart are included
+            self.results_store.append({row["file"]: row["results"] for row in self.store.results(job["id"])}, run_id=job["id"])
+        self.store.finish(job["id"])
+        if job["workspace"]:
+            shutil.rmtree(job["workspace"], ignore_errors=True)
+
+    def run_files(self, job: Dict, options: Dict):
+        with ThreadPoolExecutor(max_workers=max(1, int(options["llm_workers"]))) as pool:
+            futures = {pool.submit(self.analyze, path, options): path for path in self.store.pending_files(job["id"])}
+            # Results are stored in completion order so the app can show each file as soon as it is done
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    self.store.record(job["id"], path, results=future.result())
+                except Exception as e:
+                    logger.error(f"Error analyzing {path}: {e}")
+                    self.store.record(job["id"], path, error=str(e))
+
+    def run_once(self) -> bool:
+        """Runs the next queued job; returns False when there was nothing to do."""
+        job = self.store.claim()
+        if job is None:
+            return False
+        logger.info(f"▶️ Running job {job['id']}")
+        try:
+            self.run_job(job)
+        except Exception as e:
+            # Left running, the job would be requeued on the next worker start and fail again, blocking the queue
+            logger.exception(f"❌ Job {job['id']} failed: {e}")
+            self.store.finish(job["id"], "failed", error=str(e))
+            if job["workspace"]:
+                shutil.rmtree(job["workspace"], ignore_errors=True)
+            return True
+        logger.info(f"✅ Job {job['id']} finished. Pipeline counters so far: {self.tracer.counters()}")
+        return True
+
+    def run_forever(self):
+        """Runs jobs until stop() is called; assumes it is the only worker for its database."""
+        self.warm_up()
+        requeued = self.store.requeue_running()
+        if requeued:
+            logger.info(f"🔁 Resuming {requeued} interrupted job(s).")
+        while not self._stop.is_set():
+            if not self.run_once():
+                self._stop.wait(self.poll_interval)
+        self.tracer.close()
+
+    def stop(self):
+        self._stop.set()
+
+
+def run_worker(db_path: str, **worker_options):
+    """Process entry point: serves the job queue in db_path until the process is terminated."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    JobWorker(JobStore(db_path), **worker_options).run_forever()
+
+
+_queues: Dict[str, JobStore] = {}
+_workers: Dict[str, multiprocessing.Process] = {}
+_queues_lock = threading.Lock()
+
+
+def get_job_queue(db_path: str = "results/jobs.sqlite", start_worker: bool = True, **worker_options) -> JobStore:
+    """Returns the shared job store for db_path, starting (or restarting) its worker process when requested."""
+    with _queues_lock:
+        if db_path not in _queues:
+            _queues[db_path] = JobStore(db_path)
+        worker = _workers.get(db_path)
+        if start_worker and (worker is None or not worker.is_alive()):
+            # spawn, not fork: the app process runs Streamlit's threads. Not a daemon, so it can fan large PDFs out to
+            # a process pool; stop_job_workers() ends it when the app exits
+            worker = multiprocessing.get_context("spawn").Process(target=run_worker, args=(db_path,), kwargs=worker_options, daemon=False)
+            worker.start()
+            if not _workers:
+                # Registered after multiprocessing's own exit hook, so it runs first and that hook has nothing left to join
+                atexit.register(stop_job_workers)
+            _workers[db_path] = worker
+        return _queues[db_path]
+
+
+def stop_job_workers(timeout: float = 5.0):
+    """Stops the worker processes started by get_job_queue; their running jobs are resumed by the next worker."""
+    with _queues_lock:
+        for worker in _workers.values():
+            if worker.is_alive():
+                worker.terminate()
+        for worker in _workers.values():
+            worker.join(timeout)
+        _workers.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the analysis job worker outside the Streamlit app.")
+    parser.add_argument("--db", default="results/jobs.sqlite", help="Job queue database shared with the app")
+    parser.add_argument("--response-cache", default="cache/llm_responses.sqlite")
+    parser.add_argument("--extraction-cache", default="cache/extractions.sqlite")
+    parser.add_argument("--results-store", default="results/store", help="Parquet results store folder")
+    parser.add_argument("--trace-log", help="Append per-stage spans to this JSONL file")
+    parser.add_argument("--archive-root", default="results/archive", help="Folder for the prompts and responses of jobs submitted with archiving on")
+    args = parser.parse_args()
+    try:
+        run_worker(args.db, cache_path=args.response_cache, extraction_cache_path=args.extraction_cache, trace_path=args.trace_log,
+                   results_store_path=args.results_store, archive_root=args.archive_root)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
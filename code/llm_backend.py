@@ -0,0 +1,213 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import httpx
+import ollama
+
+
+class LLMBackend:
+    """Base class for chat model backends used by the classifiers."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.calls = 0
+        # Server-reported prompt evaluation, to see how much of each prompt the server could reuse from its cache
+        self.prompt_eval_calls = 0
+        self.prompt_eval_tokens = 0
+        self.prompt_eval_seconds = 0.0
+        self._eval_lock = threading.Lock()
+        self._last_eval = threading.local()
+
+    def chat(self, prompt: str, schema: Optional[Dict] = None, system: Optional[str] = None) -> str:
+        """Sends a user prompt (after an optional system message) and returns the response text, constrained to a JSON schema when given."""
+        raise NotImplementedError
+
+    def chat_stream(self, prompt: str, schema: Optional[Dict] = None, system: Optional[str] = None) -> Iterator[str]:
+        """Yields the response text in chunks as it is generated."""
+        yield self.chat(prompt, schema, system)
+
+    def preload(self):
+        """Loads the model ahead of the first request; a no-op for backends without a model server."""
+
+    @staticmethod
+    def _messages(prompt: str, system: Optional[str] = None) -> List[Dict[str, str]]:
+        messages = [{'role': 'system', 'content': system}] if system else []
+        return messages + [{'role': 'user', 'content': prompt}]
+
+    def _record_eval(self, response):
+        count, duration = response.get('prompt_eval_count'), response.get('prompt_eval_duration')
+        if count is None or duration is None:
+            return
+        with self._eval_lock:
+            self.prompt_eval_calls += 1
+            self.prompt_eval_tokens += count
+            self.prompt_eval_seconds += duration / 1e9
+        self._last_eval.value = {"prompt_eval_tokens": count, "prompt_eval_seconds": duration / 1e9}
+
+    def last_eval(self) -> Dict[str, float]:
+        """Prompt evaluation reported for the latest call on this thread, empty when the backend reports none."""
+        return getattr(self._last_eval, "value", {})
+
+    def eval_stats(self) -> Dict[str, float]:
+        with self._eval_lock:
+            calls = self.prompt_eval_calls
+            return {"calls": calls, "prompt_eval_tokens": self.prompt_eval_tokens, "prompt_eval_seconds": round(self.prompt_eval_seconds, 4),
+                    "mean_prompt_eval_seconds": round(self.prompt_eval_seconds / calls, 4) if calls else 0.0,
+                    "mean_prompt_eval_tokens": round(self.prompt_eval_tokens / calls, 1) if calls else 0.0}
+
+    def chat_batch(self, prompts: List[str], max_workers: int = 4) -> List[str]:
+        """Sends several prompts at once and returns the responses in prompt order."""
+        if not prompts:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prompts)))) as pool:
+            return list(pool.map(self.chat, prompts))
+
+
+class OllamaBackend(LLMBackend):
+    """Ollama backend with a persistent, pooled HTTP client and a pinned model."""
+
+    def __init__(self, model: str = "deepseek-r1:14b", host: Optional[str] = None, keep_alive: Union[str, float] = "30m",
+                 max_connections: int = 8, timeout: Optional[float] = None, options: Optional[Dict] = None):
+        super().__init__(model)
+        self.host = host
+        self.keep_alive = keep_alive  # How long Ollama keeps the model loaded after a call
+        self.max_connections = max_connections
+        self.options = options
+        self.client = ollama.Client(
+            host=host,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def chat(self, prompt: str, schema: Optional[Dict] = None, system: Optional[str] = None) -> str:
+        self.calls += 1
+        self._last_eval.value = {}
+        response = self.client.chat(model=self.model, messages=self._messages(prompt, system),
+                                    keep_alive=self.keep_alive, options=self.options, format=schema)
+        self._record_eval(response)
+        return response['message']['content']
+
+    def chat_stream(self, prompt: str, schema: Optional[Dict] = None, system: Optional[str] = None) -> Iterator[str]:
+        self.calls += 1
+        self._last_eval.value = {}
+        for chunk in self.client.chat(model=self.model, messages=self._messages(prompt, system),
+                                      keep_alive=self.keep_alive, options=self.options, format=schema, stream=True):
+            if chunk.get('done'):
+                self._record_eval(chunk)
+            yield chunk['message']['content']
+
+    def preload(self):
+        # An empty chat loads the model and pins it for keep_alive without generating anything
+        self.client.chat(model=self.model, messages=[], keep_alive=self.keep_alive)
+
+    def chat_batch(self, prompts: List[str], max_workers: Optional[int] = None) -> List[str]:
+        # Ollama has no multi-prompt endpoint; concurrent requests on the pooled client are
+        # batched server-side (OLLAMA_NUM_PARALLEL), so fill the connection pool.
+        return super().chat_batch(prompts, max_workers or self.max_connections)
+
+
+CATEGORY_PATTERN = re.compile(r'Category Name:\s*(.+?)\n\s*\*\s*Description:\s*(.+?)\n')
+
+
+class StubBackend(LLMBackend):
+    """Deterministic offline backend for tests and load tests; answers in the same format as the real model."""
+
+    def __init__(self, model: str = "stub", latency: float = 0.0, responder: Optional[Callable[[str], str]] = None, chunk_size: int = 16):
+        super().__init__(model)
+        self.latency = latency  # Seconds to sleep per call to simulate model time
+        self.chunk_size = chunk_size  # Characters per streamed chunk
+        self.responder = responder or self.default_response
+        self.schemas = []  # Schemas requested per call, to check structured-output wiring
+        self._lock = threading.Lock()
+
+    def chat(self, prompt: str, schema: Optional[Dict] = None, system: Optional[str] = None) -> str:
+        with self._lock:
+            self.calls += 1
+            self.schemas.append(schema)
+        if self.latency:
+            time.sleep(self.latency)
+        return self.responder(f"{system}\n\n{prompt}" if system else prompt)
+
+    def chat_stream(self, prompt: str, schema: Optional[Dict] = None, system: Optional[str] = None) -> Iterator[str]:
+        with self._lock:
+            self.calls += 1
+            self.schemas.append(schema)
+        text = self.responder(f"{system}\n\n{prompt}" if system else prompt)
+        # Spread the simulated latency evenly over the streamed chunks
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+        for chunk in chunks:
+            if self.latency:
+                time.sleep(self.latency / len(chunks))
+            yield chunk
+
+    @staticmethod
+    def _score(seed: str) -> float:
+        """Derives a stable confidence score in [0.5, 1.0) from the prompt."""
+        return round(0.5 + int(hashlib.sha256(seed.encode("utf-8")).hexdigest()[:8], 16) / 0x100000000 / 2, 2)
+
+    @staticmethod
+    def _split_prompt(prompt: str) -> Tuple[List[Tuple[str, str]], str]:
+        """Returns the (name, description) categories and the email text found in a prompt."""
+        # Single-pass prompts list the sub-category rulesets after the categories
+        categories = re.findall(CATEGORY_PATTERN, prompt.split("Sub-categories for ", 1)[0])
+        email = prompt.split("Email to Classify:\n", 1)[-1].split("\n\nInstructions:", 1)[0]
+        return categories, email
+
+    def default_response(self, prompt: str) -> str:
+        categories, email = self._split_prompt(prompt)
+        email_words = set(re.findall(r'[a-z]{4,}', email.lower()))
+
+        def overlap(category):
+            # Words from the category name count three times as much as description words
+            name_words = set(re.findall(r'[a-z]{4,}', category[0].lower()))
+            description_words = set(re.findall(r'[a-z]{4,}', category[1].lower()))
+            return 3 * len(email_words & name_words) + len(email_words & description_words)
+
+        best = max(categories, key=overlap, default=("Unknown", ""))
+        # Sub-categories of the chosen category, when the prompt carries its ruleset
+        section = re.search(r'Sub-categories for ' + re.escape(best[0]) + r':\n(.*?)(?=\n\nSub-categories for |\n\nEmail to Classify:|\n\nInstructions:)', prompt, re.DOTALL)
+        sub_categories = re.findall(CATEGORY_PATTERN, section.group(1) + "\n") if section else []
+        score = self._score(prompt)
+        if '"classification"' not in prompt:
+            return "```json\n" + json.dumps({"category": best[0], "confidence_score": score}) + "\n```"
+
+        amount = re.search(r'[$€£¥]\s?[\d,]+(?:\.\d+)?', email)
+        date = re.search(r'\d{2}/\d{2}/\d{4}', email)
+        account = re.search(r'Account[^\d]{0,12}(\d{4,})', email, re.IGNORECASE)
+        deal = re.search(r'Deal\s+([A-Z0-9]+)', email)
+        item = {
+            "classification": {"category": best[0], "confidence_score": score},
+            "extracted_fields": {
+                "deal_name": f"Deal {deal.group(1)}" if deal else "NA",
+                "amount": amount.group(0) if amount else "NA",
+                "transaction_date": date.group(0) if date else "NA",
+                "account_number": account.group(1) if account else "NA",
+                "currency": "USD" if amount and amount.group(0).startswith("$") else "NA",
+            },
+            "associated_text": email.strip()[:500],
+            "explanation": "Deterministic stub response.",
+        }
+        if '"sub_classification"' in prompt:
+            sub = max(sub_categories, key=overlap) if sub_categories else None
+            item["sub_classification"] = {"category": sub[0], "confidence_score": score} if sub else None
+        return "<think>stub</think>\n```json\n" + json.dumps([item], indent=4) + "\n```"
+
+
+BACKENDS = {"ollama": OllamaBackend, "stub": StubBackend}
+
+_backends: Dict[Tuple[str, str], LLMBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str = "ollama", **kwargs) -> LLMBackend:
+    """Returns a shared backend instance so its client and connection pool persist across files."""
+    key = (name, repr(sorted(kwargs.items())))
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = BACKENDS[name](**kwargs)
+        return _backends[key]
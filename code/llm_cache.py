@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Content-addressed cache of model responses with an in-memory LRU tier and an optional SQLite tier."""
+
+    def __init__(self, max_entries: int = 1024, db_path: Optional[str] = None, max_disk_entries: int = 100000, ttl: Optional[float] = None,
+                 busy_timeout: float = 5.0):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl  # Seconds a response stays valid, None keeps it until evicted
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_errors = 0  # SQLite calls that failed (e.g. still locked after busy_timeout) and were treated as misses
+        self._db = None
+        if db_path:
+            if os.path.dirname(db_path):
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            # The app, the job worker, the daemon and the CLI share this file: WAL lets readers run during a write,
+            # and the busy timeout makes concurrent writers wait instead of failing at once
+            self._db = sqlite3.connect(db_path, timeout=busy_timeout, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, version: str = "") -> str:
+        """Hashes the model, full prompt text and prompt resource version into a cache key."""
+        digest = hashlib.sha256()
+        for part in (model, prompt, version):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached response for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._memory[key]
+            if self._db is not None:
+                try:
+                    value = self._disk_get(key, now)
+                except sqlite3.OperationalError as e:
+                    self._disk_error("read", e)
+                    value = None
+                if value is not None:
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if self._expired(row[1], now):
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    def _disk_error(self, action: str, error: sqlite3.Error):
+        # A locked or busy database costs a model call at most; it never fails the analysis
+        self.disk_errors += 1
+        logger.warning(f"⚠️ Response cache {action} failed, treating it as a miss: {error}")
+        try:
+            self._db.rollback()
+        except sqlite3.Error:
+            pass
+
+    def put(self, key: str, value: str):
+        """Stores a response in both tiers, evicting the least recently used entries."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)", (key, value, now, now))
+                    if self.ttl is not None:
+                        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                    self._db.execute(
+                        "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,))
+                    self._db.commit()
+                except sqlite3.OperationalError as e:
+                    self._disk_error("write", e)
+
+    def _remember(self, key: str, value: str, created: float):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """Drops every cached response."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns hit/miss counters for both tiers."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk_errors": self.disk_errors,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+
+_caches: Dict[Optional[str], ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(db_path: Optional[str] = None) -> ResponseCache:
+    """Returns the shared cache for a SQLite path (None for memory only), creating it on first use."""
+    with _caches_lock:
+        if db_path not in _caches:
+            _caches[db_path] = ResponseCache(db_path=db_path)
+        return _caches[db_path]
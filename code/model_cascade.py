@@ -0,0 +1,76 @@
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+from llm_backend import LLMBackend, get_backend
+
+
+def answer_confidence(value: Any) -> float:
+    """Lowest confidence score in a validated answer: a classification list or a single sub-classification."""
+    if isinstance(value, dict):
+        return float(value.get("confidence_score", 0.0))
+    scores = []
+    for item in value or []:
+        scores.append(item["classification"]["confidence_score"])
+        # Single-pass answers also carry the sub-category's confidence
+        if isinstance(item.get("sub_classification"), dict):
+            scores.append(item["sub_classification"].get("confidence_score", 0.0))
+    return float(min(scores)) if scores else 0.0
+
+
+class ModelCascade:
+    """Sends every prompt to a fast model first and escalates to a strong model on low confidence or an invalid answer."""
+
+    def __init__(self, fast: LLMBackend, strong: LLMBackend, threshold: float = 0.7):
+        self.fast = fast  # Small local model for the first pass and sub-classification
+        self.strong = strong  # Reasoning model used only for escalated prompts
+        self.threshold = threshold  # Answers whose lowest confidence score is below this are escalated
+        self.routes = Counter()  # Prompts per stage and outcome, e.g. ("category", "fast")
+        self.reasons = Counter()  # Why prompts were escalated (invalid / low_confidence)
+        self.tier_calls = defaultdict(int)
+        self.tier_seconds = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def escalation_reason(self, value: Any) -> Optional[str]:
+        """None when the fast model's answer can be kept, otherwise why it must go to the strong model."""
+        if value is None:
+            return "invalid"
+        if answer_confidence(value) < self.threshold:
+            return "low_confidence"
+        return None
+
+    def record_call(self, model: str, seconds: float):
+        """Counts one uncached model call and its latency against the model's tier."""
+        with self._lock:
+            self.tier_calls[model] += 1
+            self.tier_seconds[model] += seconds
+
+    def record_route(self, stage: str, reason: Optional[str]):
+        with self._lock:
+            self.routes[(stage, "escalated" if reason else "fast")] += 1
+            if reason:
+                self.reasons[reason] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            prompts = sum(self.routes.values())
+            escalated = sum(count for (_, outcome), count in self.routes.items() if outcome == "escalated")
+            tiers = {model: {"calls": calls, "seconds": round(self.tier_seconds[model], 4), "mean_seconds": round(self.tier_seconds[model] / calls, 4)}
+                     for model, calls in self.tier_calls.items()}
+            return {"prompts": prompts, "escalated": escalated, "escalation_rate": escalated / prompts if prompts else 0.0,
+                    "reasons": dict(self.reasons), "by_stage": {f"{stage}/{outcome}": count for (stage, outcome), count in self.routes.items()},
+                    "tiers": tiers}
+
+
+_cascades: Dict[Tuple, ModelCascade] = {}
+_cascades_lock = threading.Lock()
+
+
+def get_model_cascade(fast_model: str, strong_model: Optional[str] = None, threshold: float = 0.7, backend: str = "ollama") -> ModelCascade:
+    """Returns a shared cascade over the shared backends, so routing stats add up across files and jobs."""
+    key = (backend, fast_model, strong_model, threshold)
+    with _cascades_lock:
+        if key not in _cascades:
+            strong = get_backend(backend, **({"model": strong_model} if strong_model else {}))
+            _cascades[key] = ModelCascade(get_backend(backend, model=fast_model), strong, threshold)
+        return _cascades[key]
@@ -0,0 +1,175 @@
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from prompt_budget import LABEL
+from prompt_resources import PromptResources, get_prompt_resources
+
+CATEGORY_NAME = re.compile(r'Category Name:\s*(.+)')
+DESCRIPTION = re.compile(r'Description:\s*(.+)')
+SAMPLE_EMAIL = re.compile(r'Sample Email:\s*(.+)')
+WORD = re.compile(r'[a-z]{3,}')
+# Words that carry no category signal even when a definition happens to use them
+STOPWORDS = frozenset(
+    "the and for are this that with from our any its into like all one per has have will can just also been was were when what "
+    "someone something things them they their about some such often usually typically called includes include including".split())
+
+AMOUNT = re.compile(r'(?:([$€£¥])\s?|\b(USD|EUR|GBP|JPY|CAD|AUD|CHF)\s?)(\d[\d,]*(?:\.\d+)?)')
+DATE = re.compile(r'\b\d{1,2}/\d{1,2}/\d{2,4}\b|\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},\s*\d{4}\b')
+ACCOUNT = re.compile(r'\b(?:account|acct)\b[^\d]{0,12}(\d{4,})', re.IGNORECASE)
+DEAL = re.compile(r'\bDeal\s+([A-Z0-9][A-Za-z0-9-]*)')
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY"}
+
+
+def parse_definitions(text: str) -> List[Tuple[str, str, List[str]]]:
+    """Parses a categories/sub-category file into (name, description, sample emails) tuples."""
+    definitions = []
+    for block in re.split(r'(?=Category Name:)', text)[1:]:
+        name = CATEGORY_NAME.match(block).group(1).strip()
+        description = DESCRIPTION.search(block)
+        definitions.append((name, description.group(1).strip() if description else "", [s.strip() for s in SAMPLE_EMAIL.findall(block)]))
+    return definitions
+
+
+def extract_fields(text: str) -> Dict[str, str]:
+    """Pulls the extracted_fields the model would return, "NA" when a field is absent."""
+    amount, date, account, deal = AMOUNT.search(text), DATE.search(text), ACCOUNT.search(text), DEAL.search(text)
+    currency = "NA"
+    if amount:
+        currency = amount.group(2) or CURRENCY_SYMBOLS[amount.group(1)]
+    return {
+        "deal_name": f"Deal {deal.group(1)}" if deal else "NA",
+        "amount": amount.group(0).strip() if amount else "NA",
+        "transaction_date": date.group(0) if date else "NA",
+        "account_number": account.group(1) if account else "NA",
+        "currency": currency,
+    }
+
+
+def _stem(word: str) -> str:
+    # Just enough stemming that fee/fees and receive/received match
+    for suffix in ("ing", "ed", "es", "s", "e"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def _words(text: str) -> set:
+    # Deal codes in the sample emails (Deal KLM, Deal PQR) are examples, not category signal
+    text = DEAL.sub(" ", text).lower()
+    return {_stem(word) for word in WORD.findall(text) if word not in STOPWORDS}
+
+
+class KeywordScorer:
+    """Scores text against one set of category definitions; words shared by every category weigh nothing."""
+
+    def __init__(self, definitions: List[Tuple[str, str, List[str]]], name_weight: float = 3.0):
+        self.names = [name for name, _, _ in definitions]
+        name_words = [_words(name) for name, _, _ in definitions]
+        other_words = [_words(description + " " + " ".join(samples)) for _, description, samples in definitions]
+        document_frequency = Counter(word for index in range(len(definitions)) for word in name_words[index] | other_words[index])
+        count = len(definitions)
+        # Inverse document frequency: a word in one definition out of seven weighs log(7), a word in all of them 0
+        self.weights = []
+        for index in range(count):
+            weights = {word: math.log(count / document_frequency[word]) for word in other_words[index]}
+            for word in name_words[index]:
+                weights[word] = name_weight * math.log(count / document_frequency[word])
+            self.weights.append({word: weight for word, weight in weights.items() if weight > 0})
+
+    def rank(self, text: str) -> List[Tuple[float, str, List[str]]]:
+        """Returns (score, category, matched words) for every category, best first."""
+        words = _words(text)
+        ranked = []
+        for name, weights in zip(self.names, self.weights):
+            matched = sorted(words & weights.keys(), key=lambda word: -weights[word])
+            ranked.append((sum(weights[word] for word in matched), name, matched))
+        ranked.sort(key=lambda entry: -entry[0])
+        return ranked
+
+
+class PreClassifier:
+    """Rule-based first pass that answers clear-cut single-transaction emails without a model call."""
+
+    def __init__(self, resources: Optional[PromptResources] = None, min_confidence: float = 0.7, min_score: float = 2.0, max_chars: int = 2000):
+        self.resources = resources  # Falls back to the shared registry for resources/
+        self.min_confidence = min_confidence  # Share of the top two scores the winner must hold
+        self.min_score = min_score  # Minimum keyword evidence before a decision is trusted
+        self.max_chars = max_chars  # Longer texts are rarely routine and go to the model
+        self.checked = 0
+        self.shortcuts = 0
+        self.decisions = Counter()  # Rule-based decisions per category
+        self._lock = threading.Lock()
+        self._version = None
+        self._scorer = None
+        self._sub_scorers = {}
+
+    def _scorers(self) -> Tuple[KeywordScorer, Dict[str, KeywordScorer]]:
+        resources = self.resources or get_prompt_resources()
+        resources.refresh()
+        with self._lock:
+            # Rebuild the keyword tables whenever the definition files change
+            if self._version != resources.version:
+                self._scorer = KeywordScorer(parse_definitions(resources.texts["categories.txt"]))
+                self._sub_scorers = {category: KeywordScorer(parse_definitions(text)) for category, text in resources.sub_categories.items()}
+                self._version = resources.version
+            return self._scorer, self._sub_scorers
+
+    def _decide(self, scorer: KeywordScorer, text: str) -> Optional[Tuple[str, float, List[str]]]:
+        ranked = scorer.rank(text)
+        if not ranked:
+            return None
+        top_score, name, matched = ranked[0]
+        second_score = ranked[1][0] if len(ranked) > 1 else 0.0
+        if top_score < self.min_score:
+            return None
+        confidence = top_score / (top_score + second_score)
+        if confidence < self.min_confidence:
+            return None
+        # Never claim more certainty than the model's "very confident" band
+        return name, round(min(confidence, 0.95), 2), matched
+
+    def _record(self, category: Optional[str]):
+        with self._lock:
+            self.checked += 1
+            if category:
+                self.shortcuts += 1
+                self.decisions[category] += 1
+
+    def classify(self, text: str) -> Optional[Dict]:
+        """Returns a top-level classification item in the model's response shape, or None when not confident."""
+        body = LABEL.sub("", text or "").strip()
+        decision = None
+        # Emails mentioning several distinct amounts usually hold several transactions, which need the model
+        amounts = {match.group(3) for match in AMOUNT.finditer(body)}
+        if body and len(body) <= self.max_chars and len(amounts) <= 1:
+            scorer, _ = self._scorers()
+            decision = self._decide(scorer, body)
+        self._record(decision[0] if decision else None)
+        if decision is None:
+            return None
+        category, confidence, matched = decision
+        return {
+            "classification": {"category": category, "confidence_score": confidence},
+            "extracted_fields": extract_fields(body),
+            "associated_text": body,
+            "explanation": f"Rule-based: matched {', '.join(matched[:5])} from the {category} definition.",
+        }
+
+    def sub_classify(self, category: str, associated_text: str) -> Optional[Dict]:
+        """Returns {"name", "confidence_score"} for a sub-category, or None when not confident or no ruleset exists."""
+        _, sub_scorers = self._scorers()
+        scorer = sub_scorers.get(category)
+        if scorer is None:
+            return None
+        decision = self._decide(scorer, associated_text)
+        if decision is None:
+            return None
+        return {"name": decision[0], "confidence_score": decision[1]}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"checked": self.checked, "shortcuts": self.shortcuts,
+                    "shortcut_rate": self.shortcuts / self.checked if self.checked else 0.0, "by_category": dict(self.decisions)}
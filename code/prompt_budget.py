@@ -0,0 +1,156 @@
+import logging
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+# deepseek/llama-style tokenizers average roughly four characters per token on English text
+CHARS_PER_TOKEN = 4
+# Field placeholders that do not tell two transactions apart
+MISSING_VALUES = ("", "na", "n/a", "none", "null")
+
+logger = logging.getLogger(__name__)
+_warned_budgets = set()  # (budget, static tokens) pairs already warned about; launchers build a budget per file
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+ATTACHMENT_MARKER = re.compile(r'(Attachment (?:PDF|Text): )')
+LABEL = re.compile(r'^\[[^\]]+\]:\s*')
+QUOTE_PREFIX = re.compile(r'^(?:>\s*)+')
+BOILERPLATE = re.compile(
+    r'confidential(?:ity)? notice|this (?:e-?mail|message)(?: and any attachments?)? (?:is|are|may be) (?:confidential|privileged|intended solely)'
+    r'|intended (?:only|solely) for the (?:use of the )?(?:individual|addressee|recipient)|if you (?:are not|have received this)'
+    r'|please consider the environment|do not reply to this (?:e-?mail|message)|unsubscribe',
+    re.IGNORECASE)
+# Signals that a sentence carries transaction details worth keeping
+RELEVANT = re.compile(
+    r'[$€£¥]\s?\d|\b(?:USD|EUR|GBP|JPY|CAD|AUD|CHF)\b|\d{1,2}/\d{1,2}/\d{2,4}|\bdeal\b|\baccount\b|\bacct\b|\bfee\b|\bpayment\b'
+    r'|\btransfer\b|\bcommitment\b|\bclosing\b|\bprincipal\b|\binterest\b|\bwire\b|\bamount\b',
+    re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for budgeting (no tokenizer round trip)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _sentences(text: str) -> List[str]:
+    return [sentence for sentence in SENTENCE_SPLIT.split(text) if sentence.strip()]
+
+
+class PromptBudget:
+    """Shrinks extracted email text to fit a prompt token budget, splitting it into chunks as a last resort."""
+
+    def __init__(self, max_prompt_tokens: int = 6000, attachment_tokens: int = 1500, overlap_tokens: int = 100, min_duplicate_chars: int = 20,
+                 min_content_tokens: int = 500):
+        self.max_prompt_tokens = max_prompt_tokens  # Whole prompt, static sections included
+        self.min_content_tokens = min_content_tokens  # Email tokens allowed per prompt even when the static sections leave less room
+        self.attachment_tokens = attachment_tokens  # Per-attachment ceiling before trimming to relevant sentences
+        self.overlap_tokens = overlap_tokens  # Context repeated between consecutive chunks
+        self.min_duplicate_chars = min_duplicate_chars
+
+    def deduplicate(self, text: str) -> str:
+        """Drops quote markers and sentences already seen earlier (quoted reply chains, repeated forwards)."""
+        seen = set()
+        kept = []
+        for sentence in _sentences(text):
+            sentence = QUOTE_PREFIX.sub("", sentence.strip())
+            normalized = " ".join(LABEL.sub("", sentence).lower().split())
+            if len(normalized) >= self.min_duplicate_chars:
+                if normalized in seen:
+                    continue
+                seen.add(normalized)
+            kept.append(sentence)
+        return " ".join(kept)
+
+    def strip_boilerplate(self, text: str) -> str:
+        """Drops disclaimer and footer sentences."""
+        return " ".join(sentence for sentence in _sentences(text) if not BOILERPLATE.search(sentence))
+
+    def trim_attachments(self, text: str) -> str:
+        """Keeps only transaction-relevant sentences of attachments larger than attachment_tokens."""
+        parts = ATTACHMENT_MARKER.split(text)
+        # parts alternates: body, marker, attachment, marker, attachment, ...
+        for index in range(2, len(parts), 2):
+            attachment = parts[index]
+            if estimate_tokens(attachment) <= self.attachment_tokens:
+                continue
+            kept, used = [], 0
+            for sentence in _sentences(attachment):
+                cost = estimate_tokens(sentence) + 1
+                if RELEVANT.search(sentence) and used + cost <= self.attachment_tokens:
+                    kept.append(sentence)
+                    used += cost
+            parts[index] = (" ".join(kept) if kept else attachment[:self.attachment_tokens * CHARS_PER_TOKEN]) + " "
+        return "".join(parts)
+
+    def chunk(self, text: str, max_tokens: int) -> List[str]:
+        """Splits text on sentence boundaries into chunks of at most max_tokens, with overlap."""
+        label_match = LABEL.match(text)
+        label = label_match.group(0) if label_match else ""
+        sentences = _sentences(text[len(label):])
+        # Leave room for the label and "(part i of n)" prefix repeated on every chunk
+        max_tokens = max(1, max_tokens - estimate_tokens(label) - 5)
+        chunks, current, used = [], [], 0
+        for sentence in sentences:
+            pieces = [sentence]
+            if estimate_tokens(sentence) + 1 > max_tokens:
+                # A single oversized sentence is hard-split by characters
+                step = max(1, max_tokens - 1) * CHARS_PER_TOKEN
+                pieces = [sentence[start:start + step] for start in range(0, len(sentence), step)]
+            for piece in pieces:
+                cost = estimate_tokens(piece) + 1
+                if current and used + cost > max_tokens:
+                    chunks.append(current)
+                    # Carry the tail of the previous chunk so a transaction split at the boundary stays readable
+                    overlap, overlap_used = [], 0
+                    for previous in reversed(current):
+                        if overlap_used + estimate_tokens(previous) + 1 > self.overlap_tokens:
+                            break
+                        overlap.insert(0, previous)
+                        overlap_used += estimate_tokens(previous) + 1
+                    current, used = (overlap, overlap_used) if overlap_used + cost <= max_tokens else ([], 0)
+                current.append(piece)
+                used += cost
+        if current:
+            chunks.append(current)
+        if len(chunks) <= 1:
+            return [text]
+        return [f"{label}(part {index} of {len(chunks)}) " + " ".join(part) for index, part in enumerate(chunks, 1)]
+
+    def compact(self, text: str, static_tokens: int = 0) -> Tuple[List[str], Dict]:
+        """Runs every compaction step and returns the prompt-ready chunk(s) plus per-step token savings."""
+        available = self.max_prompt_tokens - static_tokens
+        clamped = available < self.min_content_tokens
+        if clamped and (self.max_prompt_tokens, static_tokens) not in _warned_budgets:
+            # A budget below the static prompt would otherwise split even short emails into hundreds of one-token chunks
+            _warned_budgets.add((self.max_prompt_tokens, static_tokens))
+            logger.warning(f"⚠️ Prompt budget of {self.max_prompt_tokens} tokens leaves {available} for the email after "
+                           f"{static_tokens} static tokens; using {self.min_content_tokens}.")
+        if clamped:
+            available = self.min_content_tokens
+        report = {"original_tokens": estimate_tokens(text), "available_tokens": available, "clamped": clamped, "saved_tokens": {}}
+        for step in (self.deduplicate, self.strip_boilerplate, self.trim_attachments):
+            before = estimate_tokens(text)
+            if step is not self.trim_attachments or before > available:
+                text = step(text)
+            report["saved_tokens"][step.__name__] = before - estimate_tokens(text)
+        chunks = self.chunk(text, available) if estimate_tokens(text) > available else [text]
+        report["final_tokens"] = estimate_tokens(text)
+        report["chunks"] = len(chunks)
+        return chunks, report
+
+
+def merge_classifications(chunk_items: List[List[Dict]]) -> List[Dict]:
+    """Merges per-chunk classifications, collapsing the same transaction seen in overlapping chunks."""
+    merged: Dict[Tuple, Dict] = {}
+    for items in chunk_items:
+        for item in items:
+            fields = item.get("extracted_fields") or {}
+            values = tuple(" ".join(str(fields.get(name, "")).split()).lower() for name in ("amount", "account_number", "transaction_date"))
+            if all(value in MISSING_VALUES for value in values):
+                # Nothing identifies the transaction; only the same supporting text marks it as an overlap duplicate
+                values = (" ".join(str(item.get("associated_text", "")).split()).lower(),)
+            key = (item["classification"]["category"],) + values
+            current: Optional[Dict] = merged.get(key)
+            if current is None or item["classification"]["confidence_score"] > current["classification"]["confidence_score"]:
+                merged[key] = item
+    return list(merged.values())
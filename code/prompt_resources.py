@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Opens the user message in the static-prefix layout, where the email is the only variable text
+EMAIL_HEADER = "Email to Classify:\n"
+
+
+class PromptResources:
+    """Loads the prompt resource files once and serves pre-rendered prompt prefixes."""
+
+    STATIC_FILES = ("objective.txt", "categories.txt", "instructions.txt", "sub_objective.txt", "sub_instructions.txt",
+                    "combined_objective.txt", "combined_instructions.txt")
+    RULESET_FILE = "ruleset_files.json"
+
+    def __init__(self, base_dir: str = "resources", check_interval: float = 2.0):
+        self.base_dir = base_dir
+        self.check_interval = check_interval  # Seconds between mtime checks
+        self._lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self.load()
+
+    def _read(self, path: str) -> str:
+        """Reads a required resource file, failing loudly if it is missing or empty."""
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Prompt resource {path} not found.")
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read().strip()
+        if not text:
+            raise ValueError(f"Prompt resource {path} is empty.")
+        return text
+
+    def load(self):
+        """Reads and validates the whole resource set, then swaps it in."""
+        texts = {name: self._read(os.path.join(self.base_dir, name)) for name in self.STATIC_FILES}
+        ruleset_path = os.path.join(self.base_dir, self.RULESET_FILE)
+        try:
+            rulesets = json.loads(self._read(ruleset_path))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Prompt resource {ruleset_path} is not valid JSON: {e}")
+        if not isinstance(rulesets, dict):
+            raise ValueError(f"Prompt resource {ruleset_path} must map category names to files.")
+        # Ruleset paths are relative to the working directory, as written in ruleset_files.json
+        sub_categories = {category: self._read(path) for category, path in rulesets.items() if path}
+
+        tracked = [os.path.join(self.base_dir, name) for name in self.STATIC_FILES + (self.RULESET_FILE,)]
+        tracked += [path for path in rulesets.values() if path]
+        mtimes = {path: os.stat(path).st_mtime_ns for path in tracked}
+
+        digest = hashlib.sha256()
+        for name in sorted(texts):
+            digest.update(texts[name].encode("utf-8"))
+        for category in sorted(sub_categories):
+            digest.update(category.encode("utf-8") + sub_categories[category].encode("utf-8"))
+
+        with self._lock:
+            self.texts = texts
+            self.rulesets = rulesets
+            self.sub_categories = sub_categories
+            self._mtimes = mtimes
+            self.version = digest.hexdigest()[:16]
+            self.prompt_prefix = f"{texts['objective.txt']}\n\n{texts['categories.txt']}\n\nEmail to Classify:\n"
+            self.prompt_suffix = f"\n\n{texts['instructions.txt']}"
+            self.sub_prompt_prefixes = {
+                category: f"{texts['sub_objective.txt']}\n\n{sub_text}\n\nEmail to Classify:\n"
+                for category, sub_text in sub_categories.items()
+            }
+            self.sub_prompt_suffix = f"\n\n{texts['sub_instructions.txt']}"
+            # Single-pass mode: the category list plus every sub-category ruleset, so one call answers both stages
+            rulesets_text = "\n\n".join(f"Sub-categories for {category}:\n{sub_text}" for category, sub_text in sub_categories.items())
+            self.combined_prompt_prefix = f"{texts['combined_objective.txt']}\n\n{texts['categories.txt']}\n\n{rulesets_text}\n\nEmail to Classify:\n"
+            self.combined_prompt_suffix = f"\n\n{texts['combined_instructions.txt']}"
+            # Static-prefix layout: every static section, instructions included, goes in the system message so the
+            # model server can reuse its evaluated prefix from one email to the next
+            self.system_prompt = f"{texts['objective.txt']}\n\n{texts['categories.txt']}\n\n{texts['instructions.txt']}"
+            self.combined_system_prompt = f"{texts['combined_objective.txt']}\n\n{texts['categories.txt']}\n\n{rulesets_text}\n\n{texts['combined_instructions.txt']}"
+            self.sub_system_prompts = {
+                category: f"{texts['sub_objective.txt']}\n\n{sub_text}\n\n{texts['sub_instructions.txt']}"
+                for category, sub_text in sub_categories.items()
+            }
+
+    def refresh(self) -> bool:
+        """Reloads the resources if any tracked file changed; returns True when a reload happened.
+
+        An invalid edit keeps the last good texts and version until the files are fixed.
+        """
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        for path, mtime in self._mtimes.items():
+            try:
+                changed = os.stat(path).st_mtime_ns != mtime
+            except FileNotFoundError:
+                changed = True
+            if changed:
+                logger.info(f"🔄 Prompt resources changed ({path}), reloading.")
+                try:
+                    self.load()
+                except (OSError, ValueError) as e:
+                    # A half-saved or deleted file must not stop analyses; retried at the next check
+                    logger.error(f"❌ Could not reload prompt resources, keeping version {self.version}: {e}")
+                    return False
+                return True
+        return False
+
+    def build_prompt(self, email_to_classify: str) -> str:
+        """Builds the top-level classification prompt."""
+        self.refresh()
+        with self._lock:
+            return f"{self.prompt_prefix}{email_to_classify}{self.prompt_suffix}"
+
+    def build_combined_prompt(self, email_to_classify: str) -> str:
+        """Builds the single-pass prompt that classifies and sub-classifies in one call."""
+        self.refresh()
+        with self._lock:
+            return f"{self.combined_prompt_prefix}{email_to_classify}{self.combined_prompt_suffix}"
+
+    def build_messages(self, email_to_classify: str) -> Tuple[str, str]:
+        """Builds the top-level prompt as (static system message, email-only user message)."""
+        self.refresh()
+        with self._lock:
+            return self.system_prompt, f"{EMAIL_HEADER}{email_to_classify}"
+
+    def build_combined_messages(self, email_to_classify: str) -> Tuple[str, str]:
+        """Builds the single-pass prompt as (static system message, email-only user message)."""
+        self.refresh()
+        with self._lock:
+            return self.combined_system_prompt, f"{EMAIL_HEADER}{email_to_classify}"
+
+    def build_sub_messages(self, category: str, associated_text: str) -> Optional[Tuple[str, str]]:
+        """Builds the sub-classification prompt as (static system message, user message), or None without a ruleset."""
+        self.refresh()
+        with self._lock:
+            system = self.sub_system_prompts.get(category)
+            return (system, f"{EMAIL_HEADER}{associated_text}") if system else None
+
+    def build_sub_prompt(self, category: str, associated_text: str) -> Optional[str]:
+        """Builds the sub-classification prompt, or None if the category has no ruleset."""
+        self.refresh()
+        with self._lock:
+            prefix = self.sub_prompt_prefixes.get(category)
+            return f"{prefix}{associated_text}{self.sub_prompt_suffix}" if prefix else None
+
+
+_registries: Dict[str, PromptResources] = {}
+_registries_lock = threading.Lock()
+
+
+def get_prompt_resources(base_dir: str = "resources") -> PromptResources:
+    """Returns the shared registry for a resource directory, loading it on first use."""
+    with _registries_lock:
+        if base_dir not in _registries:
+            _registries[base_dir] = PromptResources(base_dir)
+        return _registries[base_dir]
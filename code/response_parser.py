@@ -0,0 +1,150 @@
+import json
+import re
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+THINK_BLOCK = re.compile(r'^\s*<think>.*?</think>', re.DOTALL)
+STRICT_FENCE = re.compile(r'```json\n(.*?)\n```', re.DOTALL)
+ANY_FENCE = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL | re.IGNORECASE)
+TRAILING_COMMA = re.compile(r',\s*([\]}])')
+SMART_QUOTES = str.maketrans({"\u201c": '"', "\u201d": '"'})
+# Bracket positions tried when digging a JSON value out of surrounding prose
+MAX_REPAIR_STARTS = 20
+
+
+class StreamingJSONParser:
+    """Scans streamed model output for the ```json fence (or bare JSON) and stops at the first complete JSON value."""
+
+    FENCE = "```json"
+
+    def __init__(self):
+        self.buffer = ""
+        self.json_text: Optional[str] = None
+        self.result: Any = None
+        self._json_start: Optional[int] = None
+        self._scan = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self) -> bool:
+        return self.json_text is not None
+
+    def _find_fence(self) -> bool:
+        search_from = 0
+        # deepseek-r1 reasons inside <think>...</think>; fences in there are drafts, not the answer
+        if self.buffer.lstrip().startswith("<think>"):
+            think_end = self.buffer.find("</think>")
+            if think_end < 0:
+                return False
+            search_from = think_end + len("</think>")
+        rest = self.buffer[search_from:].lstrip()
+        if rest[:1] in ("[", "{"):
+            # Schema-constrained output is bare JSON without a fence
+            self._json_start = self._scan = len(self.buffer) - len(rest)
+            return True
+        fence = self.buffer.find(self.FENCE, search_from)
+        if fence < 0:
+            return False
+        self._json_start = self._scan = fence + len(self.FENCE)
+        return True
+
+    def feed(self, chunk: str) -> bool:
+        """Adds a chunk of output; returns True once a complete JSON array or object has been parsed."""
+        self.buffer += chunk
+        if self.done:
+            return True
+        if self._json_start is None and not self._find_fence():
+            return False
+
+        # Track bracket depth outside of strings so json.loads only runs when a value may be complete
+        for index in range(self._scan, len(self.buffer)):
+            char = self.buffer[index]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = self.buffer[self._json_start:index + 1].strip()
+                    try:
+                        self.result = json.loads(candidate)
+                        self.json_text = candidate
+                        self._scan = index + 1
+                        return True
+                    except json.JSONDecodeError:
+                        pass
+        self._scan = len(self.buffer)
+        return False
+
+
+def parse_json_response(text: Optional[str]) -> Tuple[Any, str]:
+    """Parses a model answer leniently.
+
+    Returns (value, method) where method is "fenced" (```json block), "raw" (bare JSON),
+    "repaired" (recovered from loose fences, prose, trailing commas or smart quotes) or "failed".
+    """
+    if not text:
+        return None, "failed"
+    text = THINK_BLOCK.sub("", text, count=1)
+    match = STRICT_FENCE.search(text)
+    if match:
+        try:
+            return json.loads(match.group(1)), "fenced"
+        except json.JSONDecodeError:
+            pass
+    try:
+        return json.loads(text), "raw"
+    except json.JSONDecodeError:
+        pass
+
+    decoder = json.JSONDecoder()
+    for candidate in ANY_FENCE.findall(text) + [text]:
+        candidate = TRAILING_COMMA.sub(r"\1", candidate.translate(SMART_QUOTES))
+        starts = [index for index, char in enumerate(candidate) if char in "[{"][:MAX_REPAIR_STARTS]
+        for start in starts:
+            try:
+                return decoder.raw_decode(candidate, start)[0], "repaired"
+            except json.JSONDecodeError:
+                continue
+    return None, "failed"
+
+
+def stream_json_response(chunks: Iterable[str]) -> Tuple[str, Dict[str, Any]]:
+    """Consumes a token stream until a complete fenced JSON value arrives.
+
+    Returns the response text (re-fenced JSON when found, the raw output otherwise) and
+    time-to-first-token / time-to-JSON metrics in seconds.
+    """
+    start = time.perf_counter()
+    parser = StreamingJSONParser()
+    metrics = {"time_to_first_token": None, "time_to_json": None, "total_time": None, "chunks": 0, "chars": 0, "json_complete": False}
+    iterator = iter(chunks)
+    try:
+        for chunk in iterator:
+            if metrics["chunks"] == 0:
+                metrics["time_to_first_token"] = time.perf_counter() - start
+            metrics["chunks"] += 1
+            metrics["chars"] += len(chunk)
+            if parser.feed(chunk):
+                metrics["time_to_json"] = time.perf_counter() - start
+                metrics["json_complete"] = True
+                break
+    finally:
+        # Closing the generator drops the HTTP stream so the server stops generating
+        close = getattr(iterator, "close", None)
+        if close:
+            close()
+    metrics["total_time"] = time.perf_counter() - start
+    text = f"```json\n{parser.json_text}\n```" if parser.done else parser.buffer
+    return text, metrics
@@ -0,0 +1,76 @@
+import copy
+from typing import Any, Dict, List, Optional
+
+FIELD_NAMES = ("deal_name", "amount", "transaction_date", "account_number", "currency")
+
+
+def _classification(names: Optional[List[str]] = None) -> Dict:
+    category = {"type": "string", "enum": list(names)} if names else {"type": "string"}
+    return {
+        "type": "object",
+        "properties": {"category": category, "confidence_score": {"type": "number", "minimum": 0, "maximum": 1}},
+        "required": ["category", "confidence_score"],
+    }
+
+
+def classification_schema(categories: Optional[List[str]] = None, sub_categories: Optional[Dict[str, List[str]]] = None) -> Dict:
+    """JSON schema for the top-level answer; passing sub_categories adds the single-pass sub_classification key."""
+    item = {
+        "type": "object",
+        "properties": {
+            "classification": _classification(categories),
+            "extracted_fields": {
+                "type": "object",
+                "properties": {name: {"type": "string"} for name in FIELD_NAMES},
+                "required": list(FIELD_NAMES),
+            },
+            "associated_text": {"type": "string"},
+            "explanation": {"type": "string"},
+        },
+        "required": ["classification", "extracted_fields", "associated_text", "explanation"],
+    }
+    if sub_categories is not None:
+        names = sorted({name for names in sub_categories.values() for name in names})
+        item["properties"]["sub_classification"] = {"anyOf": [_classification(names), {"type": "null"}]}
+        item["required"].append("sub_classification")
+    return {"type": "array", "items": item}
+
+
+def sub_classification_schema(names: Optional[List[str]] = None) -> Dict:
+    """JSON schema for a sub-classification answer."""
+    return _classification(names)
+
+
+def _valid_classification(value: Any) -> Optional[Dict]:
+    if not isinstance(value, dict) or not isinstance(value.get("category"), str):
+        return None
+    try:
+        # Models sometimes quote the score; anything that is not a number is rejected
+        confidence = float(value.get("confidence_score"))
+    except (TypeError, ValueError):
+        return None
+    return {**value, "confidence_score": confidence}
+
+
+def validate_classification_items(value: Any) -> Optional[List[Dict]]:
+    """Returns the answer as a list of well-formed classification items, or None when it cannot be used."""
+    if isinstance(value, dict) and "classification" in value:
+        value = [value]  # A single transaction answered as a bare object
+    if not isinstance(value, list):
+        return None
+    items = []
+    for item in value:
+        classification = _valid_classification(item.get("classification")) if isinstance(item, dict) else None
+        if classification is None:
+            return None
+        item = copy.copy(item)
+        item["classification"] = classification
+        if not isinstance(item.get("extracted_fields"), dict):
+            item["extracted_fields"] = {}
+        items.append(item)
+    return items
+
+
+def validate_sub_classification(value: Any) -> Optional[Dict]:
+    """Returns a well-formed {"category", "confidence_score"} answer, or None."""
+    return _valid_classification(value)
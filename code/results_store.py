@@ -0,0 +1,197 @@
+import argparse
+import glob
+import logging
+import os
+import sys
+import threading
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from field_normalizer import normalize_output, parse_amounts, parse_dates
+
+CATEGORICAL = pa.dictionary(pa.int32(), pa.string())
+
+# One row per classified transaction; partitioned on disk by the month it was analyzed
+SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("file", pa.string()),
+    ("analyzed_at", pa.timestamp("us", tz="UTC")),
+    ("category", CATEGORICAL),
+    ("confidence", pa.float32()),
+    ("sub_category", CATEGORICAL),
+    ("sub_confidence", pa.float32()),
+    ("deal_name", pa.string()),
+    ("amount", pa.decimal128(18, 2)),
+    ("amount_text", pa.string()),
+    ("currency", CATEGORICAL),
+    ("transaction_date", pa.date32()),
+    ("transaction_date_text", pa.string()),
+    ("account_number", pa.string()),
+    ("fields_verified", pa.bool_()),
+])
+PARTITIONING = ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+
+logger = logging.getLogger(__name__)
+
+
+def parse_amount(value) -> Optional[Decimal]:
+    """Reads "$1,250.50", "EUR 14,000" or a number as a Decimal with cents, or None."""
+    amount = parse_amounts(pd.Series([value], dtype=object))["amount"].iloc[0]
+    return None if pd.isna(amount) else amount
+
+
+def parse_date(value) -> Optional[date]:
+    parsed = parse_dates(pd.Series([value], dtype=object)).iloc[0]
+    return None if pd.isna(parsed) else parsed.date()
+
+
+def _convertible(value, type: pa.DataType):
+    try:
+        pa.scalar(value, type=type)
+        return value
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+
+
+def _array(values: pd.Series, type: pa.DataType) -> pa.Array:
+    """Converts one column; values Arrow rejects (e.g. amounts beyond decimal128(18, 2)) become nulls instead of failing the batch."""
+    try:
+        return pa.array(values, type=type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        converted = [_convertible(value, type) for value in values]
+        logger.warning(f"⚠️ Stored {sum(value is not None for value in values) - sum(value is not None for value in converted)} "
+                       f"{type} value(s) as null that did not fit the column.")
+        return pa.array(converted, type=type)
+
+
+def output_to_table(output_dict: Dict[str, List[Dict]], run_id: Optional[str] = None, analyzed_at: Optional[datetime] = None) -> pa.Table:
+    """Converts launcher output ({file: [items]}) into a typed table, normalizing every field column in one batch."""
+    frame = normalize_output(output_dict)
+    frame["run_id"] = run_id
+    frame["analyzed_at"] = analyzed_at or datetime.now(timezone.utc)
+    frame["transaction_date"] = frame["transaction_date"].dt.date
+    # Model-written scores may arrive as strings ("0.9"); anything unreadable is stored as null
+    for column in ("confidence", "sub_confidence"):
+        frame[column] = pd.to_numeric(frame[column], errors="coerce")
+    arrays = []
+    for field in SCHEMA:
+        # Missing values become nulls; pandas keeps them as NaN/NA in object and nullable columns
+        values = frame[field.name].astype(object).where(frame[field.name].notna(), None)
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(_array(values, field.type))
+    return pa.Table.from_arrays(arrays, schema=SCHEMA)
+
+
+class ResultsStore:
+    """Append-only Parquet dataset of classifications, partitioned by analysis month, with filtered queries."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def append(self, output_dict: Dict[str, List[Dict]], run_id: Optional[str] = None, analyzed_at: Optional[datetime] = None) -> int:
+        """Writes one batch as a new Parquet file in its analysis month; returns the number of rows stored."""
+        table = output_to_table(output_dict, run_id, analyzed_at)
+        if not table.num_rows:
+            return 0
+        analyzed_at = table.column("analyzed_at")[0].as_py()
+        folder = os.path.join(self.root, f"month={analyzed_at:%Y-%m}")
+        os.makedirs(folder, exist_ok=True)
+        self._write(folder, table)
+        return table.num_rows
+
+    @staticmethod
+    def _write(folder: str, table: pa.Table):
+        name = f"part-{uuid.uuid4().hex}.parquet"
+        # Write-then-rename; dataset discovery skips dot files, so readers never see a half-written part
+        pq.write_table(table, os.path.join(folder, f".{name}.tmp"))
+        os.replace(os.path.join(folder, f".{name}.tmp"), os.path.join(folder, name))
+
+    def dataset(self) -> ds.Dataset:
+        return ds.dataset(self.root, format="parquet", schema=SCHEMA.append(pa.field("month", pa.string())),
+                          partitioning=PARTITIONING)
+
+    def query(self, deal_name: Optional[str] = None, account_number: Optional[str] = None, category: Optional[str] = None,
+              start: Optional[date] = None, end: Optional[date] = None, analyzed_since: Optional[datetime] = None,
+              columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Returns matching rows; start/end bound the transaction date (inclusive), analyzed_since prunes whole months."""
+        expression = None
+        conditions = []
+        if deal_name is not None:
+            conditions.append(ds.field("deal_name") == deal_name)
+        if account_number is not None:
+            conditions.append(ds.field("account_number") == account_number)
+        if category is not None:
+            conditions.append(ds.field("category") == category)
+        if start is not None:
+            conditions.append(ds.field("transaction_date") >= pa.scalar(start, pa.date32()))
+        if end is not None:
+            conditions.append(ds.field("transaction_date") <= pa.scalar(end, pa.date32()))
+        if analyzed_since is not None:
+            # The partition filter skips older months without opening their files
+            conditions.append(ds.field("month") >= f"{analyzed_since:%Y-%m}")
+            conditions.append(ds.field("analyzed_at") >= pa.scalar(analyzed_since, pa.timestamp("us", tz="UTC")))
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        table = self.dataset().to_table(columns=columns or SCHEMA.names, filter=expression)
+        return table.to_pandas(date_as_object=False)
+
+    def compact(self) -> int:
+        """Merges each month's part files into one file sorted by transaction date and deal; returns files removed."""
+        removed = 0
+        with self._lock:
+            for folder in sorted(glob.glob(os.path.join(self.root, "month=*"))):
+                parts = sorted(glob.glob(os.path.join(folder, "part-*.parquet")))
+                if len(parts) < 2:
+                    continue
+                table = ds.dataset(parts, format="parquet", schema=SCHEMA).to_table()
+                table = table.sort_by([("transaction_date", "ascending"), ("deal_name", "ascending")])
+                self._write(folder, table.unify_dictionaries().combine_chunks())
+                for part in parts:
+                    os.remove(part)
+                removed += len(parts) - 1
+        return removed
+
+
+_stores: Dict[str, ResultsStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_results_store(root: str = "results/store") -> ResultsStore:
+    """Returns the shared store for a folder, creating it on first use."""
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = ResultsStore(root)
+        return _stores[root]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Query or compact the Parquet results store.")
+    parser.add_argument("--store", default="results/store")
+    parser.add_argument("--deal", help="Exact deal name, e.g. \"Deal ABC\"")
+    parser.add_argument("--account")
+    parser.add_argument("--category")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="First transaction date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="Last transaction date (YYYY-MM-DD)")
+    parser.add_argument("--compact", action="store_true", help="Merge small part files instead of querying")
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.store)
+    if args.compact:
+        print(f"Removed {store.compact()} part file(s).", file=sys.stderr)
+        return
+    store.query(args.deal, args.account, args.category, args.start, args.end).to_csv(sys.stdout, index=False)
+
+
+if __name__ == "__main__":
+    main()
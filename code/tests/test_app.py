@@ -1,8 +1,10 @@
+import io
 import unittest
 from unittest.mock import patch, MagicMock, mock_open
 import sys
 import os
 import shutil
+import tempfile
 import pandas as pd
 import numpy as np
 
@@ -17,29 +19,79 @@ class TestLendingServiceApp(unittest.TestCase):
     
     def setUp(self):
         from app import LendingServiceApp  # Import inside to avoid global execution
-        self.app = LendingServiceApp()
-        self.app.temp_dir = "test_temp"
-        os.makedirs(self.app.temp_dir, exist_ok=True)
+        self.workspace_root = tempfile.mkdtemp()
+        self.app = LendingServiceApp(workspace_root=self.workspace_root)
         # Add project root to sys.path
         sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
     def tearDown(self):
-        if os.path.exists(self.app.temp_dir):
-            shutil.rmtree(self.app.temp_dir)
+        shutil.rmtree(self.workspace_root, ignore_errors=True)
     
-    @patch("os.listdir", return_value=["file1.pdf", "file2.eml"])
     @patch("classifier.AnalysisLauncher", return_value=mock_analysis_launcher)
-    def test_analyze_files(self, mock_launcher, mock_listdir):
-        self.app.file_paths = ["test_temp/file1.pdf", "test_temp/file2.eml"]
+    def test_analyze_files(self, mock_launcher):
+        self.app.file_paths = ["inbox/file1.pdf", "inbox/file2.eml"]
         result = self.app.analyze_files()
         
         self.assertEqual(len(result), 2)
         self.assertIn("file1.pdf", result)
         self.assertIn("file2.eml", result)
     
-    def test_clean_inventory(self):
+    @patch("classifier.AnalysisLauncher")
+    def test_analyze_files_isolates_failures(self, mock_launcher):
+        def process_text(filename, text):
+            if filename == "bad.eml":
+                raise ValueError("bad file")
+            return [{"category": "Loan"}]
+        engine = MagicMock()
+        engine.process_text.side_effect = process_text
+        mock_launcher.return_value = engine
+        self.app.file_paths = ["inbox/good.pdf", "inbox/bad.eml"]
+        self.app.llm_workers = 2
+        result = self.app.analyze_files()
+
+        self.assertEqual(list(result), ["good.pdf", "bad.eml"])
+        self.assertEqual(result["good.pdf"], [{"category": "Loan"}])
+        self.assertEqual(result["bad.eml"], [])
+        self.assertIn("bad.eml", self.app.errors)
+
+    @patch("classifier.AnalysisLauncher")
+    def test_files_without_text_fail_without_a_model_call(self, mock_launcher):
+        engine = MagicMock()
+        engine.extract_text_from_path.side_effect = lambda path: "" if path.endswith("scan.pdf") else f"[{os.path.basename(path)}]: text"
+        engine.process_text.return_value = [{"category": "Loan"}]
+        mock_launcher.return_value = engine
+        self.app.file_paths = ["inbox/scan.pdf", "inbox/good.eml"]
+        for dedup in (False, True):
+            self.app.dedup = dedup
+            result = self.app.analyze_files()
+
+            self.assertEqual(result["scan.pdf"], [])
+            self.assertEqual(self.app.errors, {"scan.pdf": "No text could be extracted from scan.pdf."})
+            self.assertEqual([call.args[0] for call in engine.process_text.call_args_list], ["good.eml"])
+            engine.process_text.reset_mock()
+
+    def test_save_upload_copies_in_chunks(self):
+        uploaded = io.BytesIO(b"x" * 2500)
+        uploaded.name = "big.pdf"
+        uploaded.read(10)
+        with patch("workspace.UPLOAD_CHUNK_BYTES", 1000):
+            path = self.app.save_upload(uploaded)
+        self.assertEqual(path, os.path.join(self.app.workspace.path, "big.pdf"))
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"x" * 2500)
+
+    def test_clean_inventory_removes_only_own_workspace(self):
+        from app import LendingServiceApp
+        other = LendingServiceApp(workspace_root=self.workspace_root)
+        uploaded = io.BytesIO(b"data")
+        uploaded.name = "a.pdf"
+        mine, theirs = self.app.save_upload(uploaded), other.save_upload(uploaded)
+        self.assertNotEqual(os.path.dirname(mine), os.path.dirname(theirs))
+
         self.app.clean_inventory()
-        self.assertFalse(os.path.exists(self.app.temp_dir))
+        self.assertFalse(os.path.exists(mine))
+        self.assertTrue(os.path.exists(theirs))
+        self.assertIsNone(self.app.workspace)
     
     def test_flatten_output(self):
         output_dict = {
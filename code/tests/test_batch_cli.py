@@ -0,0 +1,93 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import MagicMock, patch
+from batch_cli import completed_files, iter_deduplicated_records, iter_input_files, iter_records, main
+from dedup import Deduplicator
+
+class TestBatchCli(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.tmp_dir, "in")
+        os.makedirs(self.input_dir)
+        for filename in ("a.eml", "b.pdf", "c.eml", "notes.txt"):
+            with open(os.path.join(self.input_dir, filename), "w") as f:
+                f.write(filename)
+        self.output = os.path.join(self.tmp_dir, "out.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def launcher_factory(self):
+        launcher = MagicMock()
+        launcher.extract_text_from_path.side_effect = lambda path: os.path.basename(path)
+        def process_text(filename, text):
+            if filename == "b.pdf":
+                raise ValueError("unreadable")
+            return [{"category": "Fee Payment"}, {"category": "Adjustment"}]
+        launcher.process_text.side_effect = process_text
+        return launcher
+
+    def test_iter_input_files_filters_supported_types(self):
+        files = [os.path.basename(path) for path in iter_input_files([self.input_dir])]
+        self.assertEqual(files, ["a.eml", "b.pdf", "c.eml"])
+
+    def test_iter_records_one_record_per_item_and_isolates_errors(self):
+        records = list(iter_records(iter_input_files([self.input_dir]), self.launcher_factory, workers=2))
+        by_file = {}
+        for record in records:
+            by_file.setdefault(os.path.basename(record["file"]), []).append(record)
+
+        self.assertEqual([record.get("index") for record in by_file["a.eml"]], [0, 1, None])
+        self.assertEqual(by_file["a.eml"][-1], {"file": os.path.join(self.input_dir, "a.eml"), "done": True, "items": 2})
+        self.assertEqual(by_file["b.pdf"], [{"file": os.path.join(self.input_dir, "b.pdf"), "error": "unreadable"}])
+
+    def test_dedup_classifies_one_file_per_cluster(self):
+        launchers = []
+        def launcher_factory():
+            launcher = self.launcher_factory()
+            launcher.extract_text_from_path.side_effect = lambda path: "Pay the $500 fee for Deal ABC." if path.endswith(".eml") else "b"
+            launchers.append(launcher)
+            return launcher
+        deduplicator = Deduplicator()
+        records = list(iter_deduplicated_records(iter_input_files([self.input_dir]), launcher_factory, deduplicator, workers=2, window=2))
+
+        self.assertEqual(sum(launcher.process_text.call_count for launcher in launchers), 3)  # windows [a.eml, b.pdf] and [c.eml]
+        self.assertEqual(len(records), 7)  # Two items and a done record per email, one error record
+        deduplicator = Deduplicator()
+        records = list(iter_deduplicated_records(iter_input_files([self.input_dir]), launcher_factory, deduplicator, workers=2))
+        self.assertEqual([record.get("duplicate_of") for record in records if record["file"].endswith("c.eml")], ["a.eml", "a.eml", None])
+        self.assertEqual(deduplicator.stats()["calls_saved"], 1)
+
+    def test_limit_and_resume(self):
+        cache_args = ["--response-cache", os.path.join(self.tmp_dir, "r.sqlite"), "--extraction-cache", os.path.join(self.tmp_dir, "e.sqlite")]
+        with patch("batch_cli.AnalysisLauncher", side_effect=lambda *args, **kwargs: self.launcher_factory()):
+            main([self.input_dir, "-o", self.output, "--limit", "1", "--backend", "stub"] + cache_args)
+            self.assertEqual(completed_files(self.output), {os.path.join(self.input_dir, "a.eml")})
+
+            main([self.input_dir, "-o", self.output, "--resume", "--backend", "stub"] + cache_args)
+
+        with open(self.output) as f:
+            files = [json.loads(line)["file"] for line in f]
+        self.assertEqual(files.count(os.path.join(self.input_dir, "a.eml")), 3)  # two items and a done record, written once
+        self.assertEqual(completed_files(self.output), {os.path.join(self.input_dir, name) for name in ("a.eml", "c.eml")})
+
+    def test_resume_redoes_partly_written_and_empty_files(self):
+        a, c = os.path.join(self.input_dir, "a.eml"), os.path.join(self.input_dir, "c.eml")
+        with open(self.output, "w") as f:
+            f.write(json.dumps({"file": a, "index": 0, "category": "Fee Payment"}) + "\n")  # Crashed before the second item
+            f.write(json.dumps({"file": c, "done": True, "items": 0}) + "\n")
+        self.assertEqual(completed_files(self.output), {c})
+
+        def launcher_factory():
+            launcher = self.launcher_factory()
+            launcher.extract_text_from_path.side_effect = lambda path: ""
+            return launcher
+        records = list(iter_records([a], launcher_factory))
+        self.assertEqual(records, [{"file": a, "error": "No text could be extracted from a.eml."}])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,23 +1,31 @@
 import unittest
+import base64
+import fitz
 from unittest.mock import patch, MagicMock, mock_open
 import json
 import os
+import tempfile
+import time
 from classifier import AnalysisLauncher
+from document_extractor import SpillBuffer
+from llm_backend import StubBackend
+from extraction_cache import ExtractionCache
+from llm_cache import ResponseCache
+from prompt_resources import PromptResources
 
 class TestAnalysisLauncher(unittest.TestCase):
     
     def setUp(self):
         self.launcher = AnalysisLauncher("temp")
 
-    @patch("pdfplumber.open")
-    def test_extract_text_from_pdf(self, mock_pdfplumber):
-        mock_pdf = MagicMock()
-        mock_pdf.pages = [MagicMock() for _ in range(2)]
-        mock_pdf.pages[0].extract_text.return_value = "Page 1 text"
-        mock_pdf.pages[1].extract_text.return_value = "Page 2 text"
-        mock_pdfplumber.return_value.__enter__.return_value = mock_pdf
-        
-        result = self.launcher.extract_text_from_pdf("dummy.pdf")
+    def test_extract_text_from_pdf(self):
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), "Page 1 text")
+        doc.new_page().insert_text((72, 72), "Page 2 text")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_path = os.path.join(tmp_dir, "dummy.pdf")
+            doc.save(pdf_path)
+            result = self.launcher.extract_text_from_pdf(pdf_path)
         self.assertEqual(result, "Page 1 text Page 2 text")
     
     @patch("builtins.open", new_callable=mock_open, read_data="sample text")
@@ -36,6 +44,75 @@ class TestAnalysisLauncher(unittest.TestCase):
         self.assertEqual(body, "Email body text")
         self.assertEqual(attachment, "")
     
+    @patch("mailparser.parse_from_file")
+    def test_extract_text_from_eml_pdf_attachment_in_memory(self, mock_mailparser):
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), "Wire $500 for Deal ABC")
+        mock_mail = MagicMock()
+        mock_mail.body = "See attached"
+        mock_mail.attachments = [{"mail_content_type": "application/pdf", "filename": "wire.pdf", "payload": base64.b64encode(doc.tobytes()).decode()}]
+        mock_mailparser.return_value = mock_mail
+
+        with patch("builtins.open") as mock_file:
+            body, attachment = self.launcher.extract_text_from_eml("dummy.eml")
+        mock_file.assert_not_called()
+        self.assertIn("Attachment PDF: Wire $500 for Deal ABC", attachment)
+
+    @patch("mailparser.parse_from_file")
+    def test_large_pdf_attachment_spills_to_disk_and_chunks_stream(self, mock_mailparser):
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), "Wire $500 for Deal ABC")
+        mock_mail = MagicMock()
+        mock_mail.body = "See *attached*\nthanks"
+        mock_mail.attachments = [{"mail_content_type": "text/plain", "payload": "Note 1"},
+                                 {"mail_content_type": "application/pdf", "filename": "wire.pdf", "payload": base64.b64encode(doc.tobytes()).decode()}]
+        mock_mailparser.return_value = mock_mail
+        self.launcher.extractor.spill_bytes = 64
+
+        with patch("classifier.SpillBuffer", wraps=SpillBuffer) as mock_spill:
+            chunks = list(self.launcher.iter_document_chunks("dummy.eml"))
+        self.assertEqual(mock_spill.call_args.args, (64,))
+        self.assertEqual(chunks, ["See attached thanks", "--- Attachment Content --- Attachment Text: Note 1", "Attachment PDF: Wire $500 for Deal ABC"])
+        self.assertEqual(self.launcher.extract_document_text("dummy.eml"), " ".join(chunks))
+
+    def test_failed_extraction_drops_partial_text_and_is_not_cached(self):
+        state = {"fail": True}
+
+        def iter_text(path):
+            yield "page 0 text"
+            if state["fail"]:
+                raise RuntimeError("broken page")
+            yield "page 1 text"
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_path = os.path.join(tmp_dir, "a.pdf")
+            with open(pdf_path, "wb") as f:
+                f.write(b"%PDF")
+            launcher = AnalysisLauncher(None, extraction_cache=ExtractionCache(os.path.join(tmp_dir, "cache.sqlite")))
+            with patch.object(launcher.extractor, "iter_text", side_effect=iter_text):
+                self.assertEqual(launcher.extract_text_from_path(pdf_path), "")
+                state["fail"] = False
+                self.assertEqual(launcher.extract_text_from_path(pdf_path), "[a.pdf]: page 0 text page 1 text")
+
+    @patch("classifier.AnalysisLauncher.extract_document_text", return_value="Wire $500 for Deal ABC")
+    def test_extract_text_from_file_uses_extraction_cache(self, mock_extract):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                os.makedirs("temp")
+                with open(os.path.join("temp", "a.eml"), "w") as f:
+                    f.write("raw email")
+                launcher = AnalysisLauncher("temp", extraction_cache=ExtractionCache("cache.sqlite"))
+                first = launcher.extract_text_from_file("a.eml")
+                second = launcher.extract_text_from_file("a.eml")
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(first, "[a.eml]: Wire $500 for Deal ABC")
+        self.assertEqual(second, first)
+        mock_extract.assert_called_once()
+
     # @patch("classifier.AnalysisLauncher.extract_text_from_file", return_value="Extracted file content")
     # @patch("classifier.AnalysisLauncher.read_file", side_effect=lambda x: json.dumps({"Loan": "loan_subcategories.json"}) if "resources" in x else "")
     # @patch("ollama.chat")
@@ -62,6 +139,98 @@ class TestAnalysisLauncher(unittest.TestCase):
 
 
     
+    def test_sub_classify_all_preserves_order(self):
+        def responder(prompt):
+            time.sleep(0.05 if prompt == "first" else 0)
+            return f"reply to {prompt}"
+        launcher = AnalysisLauncher("temp", cache=ResponseCache(), backend=StubBackend(responder=responder))
+
+        result = launcher.sub_classify_all(["first", "second", "third"])
+        self.assertEqual(result, ["reply to first", "reply to second", "reply to third"])
+
+    def test_sub_classify_all_timeout(self):
+        launcher = AnalysisLauncher("temp", sub_timeout=0.1, cache=ResponseCache(), backend=StubBackend(latency=2.0))
+
+        started = time.perf_counter()
+        self.assertEqual(launcher.sub_classify_all(["slow"]), [None])
+        self.assertLess(time.perf_counter() - started, 1.0)  # Returns at the timeout, not when the slow call ends
+
+    @patch("classifier.AnalysisLauncher.extract_text_from_file", return_value="[a.eml]: Please submit a fee payment of $250 for Deal KLM on 03/15/2025, account 54321.")
+    def test_process_with_stub_backend_uses_cache(self, mock_extract):
+        backend = StubBackend()
+        launcher = AnalysisLauncher("temp", cache=ResponseCache(), backend=backend, resources=PromptResources("resources"))
+        with patch("builtins.open", mock_open()):
+            first = launcher.process("a.eml")
+            second = launcher.process("a.eml")
+
+        self.assertEqual(first, second)
+        self.assertEqual(first[0]["category"], "Fee Payment")
+        self.assertEqual(first[0]["extracted_fields"]["account_number"], "54321")
+        self.assertEqual(backend.calls, 2)  # classification + sub-classification, second run fully cached
+
+    @patch("classifier.AnalysisLauncher.extract_text_from_file", return_value="[a.eml]: Receive $14,000 inbound for Deal MNO on 03/25/2025, account 77889.")
+    def test_process_streaming_matches_blocking(self, mock_extract):
+        resources = PromptResources("resources")
+        blocking = AnalysisLauncher("temp", cache=ResponseCache(), backend=StubBackend(), resources=resources)
+        streaming = AnalysisLauncher("temp", cache=ResponseCache(), backend=StubBackend(chunk_size=7), resources=resources, stream=True)
+        with patch("builtins.open", mock_open()):
+            self.assertEqual(streaming.process("a.eml"), blocking.process("a.eml"))
+        self.assertTrue(all(metrics["json_complete"] for metrics in streaming.llm_metrics))
+
+    @patch("classifier.AnalysisLauncher.extract_text_from_file", return_value="[a.eml]: Submit the quarterly ongoing fee payment of $500 for Deal ABC, account 12345, administrative costs.")
+    def test_single_pass_matches_two_stage_schema_in_one_call(self, mock_extract):
+        resources = PromptResources("resources")
+        two_stage_backend, single_pass_backend = StubBackend(), StubBackend()
+        two_stage = AnalysisLauncher("temp", cache=ResponseCache(), backend=two_stage_backend, resources=resources)
+        single_pass = AnalysisLauncher("temp", cache=ResponseCache(), backend=single_pass_backend, resources=resources, combined=True)
+        with patch("builtins.open", mock_open()):
+            expected = two_stage.process("a.eml")
+            result = single_pass.process("a.eml")
+
+        self.assertEqual((two_stage_backend.calls, single_pass_backend.calls), (2, 1))
+        self.assertEqual([set(entry) for entry in result], [set(entry) for entry in expected])
+        self.assertEqual(result[0]["sub_category"]["name"], expected[0]["sub_category"]["name"])
+
+    def test_static_prefix_sends_same_system_prompt_for_every_email(self):
+        backend = StubBackend()
+        systems = []
+        chat = backend.chat
+        backend.chat = lambda prompt, schema=None, system=None: systems.append(system) or chat(prompt, schema, system)
+        launcher = AnalysisLauncher("temp", cache=ResponseCache(), backend=backend, resources=PromptResources("resources"), static_prefix=True)
+        first = launcher.process_text("a.eml", "[a.eml]: Please submit a fee payment of $250 for Deal QRS on 03/15/2025, account 54321.")
+        launcher.process_text("b.eml", "[b.eml]: Please submit a fee payment of $900 for Deal XYZ on 04/01/2025, account 11111.")
+
+        self.assertEqual(first[0]["category"], "Fee Payment")
+        self.assertEqual(systems[0], systems[2])
+        self.assertNotIn("Deal QRS", systems[0])
+
+    def test_unparseable_answer_is_retried_once_then_fails_cleanly(self):
+        resources = PromptResources("resources")
+        answers = iter(["no json here", '[{"classification": {"category": "Fee Payment", "confidence_score": "0.9"}}]'])
+        backend = StubBackend(responder=lambda prompt: next(answers, "still no json"))
+        launcher = AnalysisLauncher("temp", cache=ResponseCache(), backend=backend, resources=resources)
+        with patch("builtins.open", mock_open()):
+            items = launcher.classify_text("[a.eml]: Submit a fee payment.")
+            self.assertEqual(items[0]["classification"], {"category": "Fee Payment", "confidence_score": 0.9})
+            self.assertEqual(backend.schemas[0]["items"]["properties"]["classification"]["properties"]["category"]["enum"][4], "Fee Payment")
+            with self.assertRaises(ValueError):
+                launcher.classify_text("[b.eml]: Something else.")
+
+        self.assertEqual(backend.calls, 4)
+        self.assertEqual(launcher.parse_stats, {"raw": 1, "retries": 2, "failed": 1})
+
+    def test_invalid_sub_answer_keeps_item(self):
+        def responder(prompt):
+            if '"classification"' in prompt:
+                return '```json\n[{"classification": {"category": "Fee Payment", "confidence_score": 0.9}, "extracted_fields": {}}]\n```'
+            return "not json"
+        launcher = AnalysisLauncher("temp", cache=ResponseCache(), backend=StubBackend(responder=responder), resources=PromptResources("resources"))
+        with patch("builtins.open", mock_open()):
+            output = launcher.process_text("a.eml", "[a.eml]: Submit a fee payment.")
+
+        self.assertEqual(output, [{"category": "Fee Payment", "confidence_score": 0.9, "sub_category": {}, "extracted_fields": {}, "associated_text": ""}])
+        self.assertEqual(launcher.parse_stats["failed"], 1)
+
     @patch("re.search")
     def test_extract_json_block(self, mock_re_search):
         mock_re_search.return_value = MagicMock(group=lambda _: '{"key": "value"}')
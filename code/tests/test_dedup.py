@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+from dedup import Deduplicator, analyze_deduplicated, email_headers, fingerprint
+
+NOTICE = ("Dear Team, please transfer $14,000 from Deal ABC to account 77889 on 03/26/2025. The funds relate to the quarterly "
+          "settlement of the facility and should be booked against the usual cost centre. Kind regards, Alex Carter, Agent Bank Operations.")
+NO_HEADERS = {"message_id": [], "references": []}
+
+class TestDedup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_eml(self, filename, headers, body):
+        path = os.path.join(self.tmp_dir, filename)
+        with open(path, "w") as f:
+            f.write("".join(f"{name}: {value}\n" for name, value in headers.items()) + f"\n{body}\n")
+        return path
+
+    def test_exact_and_near_duplicates_share_a_representative(self):
+        deduplicator = Deduplicator()
+        representatives = deduplicator.cluster({
+            "a.eml": (f"[a.eml]: {NOTICE}", NO_HEADERS),
+            "b.eml": (f"[b.eml]: {NOTICE}", NO_HEADERS),
+            "c.eml": (f"[c.eml]: {NOTICE.replace('Kind regards', 'Best regards')}", NO_HEADERS),
+            "d.eml": (f"[d.eml]: {NOTICE.replace('$14,000', '$15,000')}", NO_HEADERS),
+            "e.pdf": ("[e.pdf]: ", NO_HEADERS),
+            "f.pdf": ("[f.pdf]: ", NO_HEADERS),
+        })
+
+        self.assertEqual(len({representatives[key] for key in ("a.eml", "b.eml", "c.eml")}), 1)
+        self.assertEqual(representatives["d.eml"], "d.eml")
+        self.assertNotEqual(representatives["e.pdf"], representatives["f.pdf"])
+        stats = deduplicator.stats()
+        self.assertEqual((stats["documents"], stats["clusters"], stats["calls_saved"], stats["exact"], stats["near"]), (6, 4, 2, 1, 1))
+
+    def test_numbered_file_names_do_not_split_clusters(self):
+        representatives = Deduplicator().cluster({
+            "request_0001.eml": (f"[request_0001.eml]: {NOTICE}", NO_HEADERS),
+            "request_0002.eml": (f"[request_0002.eml]: {NOTICE.replace('Kind regards', 'Best regards')}", NO_HEADERS),
+        })
+        self.assertEqual(representatives["request_0001.eml"], representatives["request_0002.eml"])
+
+    def test_reply_without_new_figures_joins_its_thread(self):
+        original = self.write_eml("a.eml", {"Message-ID": "<1@bank>"}, NOTICE)
+        reply = self.write_eml("b.eml", {"Message-ID": "<2@bank>", "In-Reply-To": "<1@bank>"}, "Approved for Deal ABC, go ahead.")
+        self.assertEqual(email_headers(reply), {"message_id": ["<2@bank>"], "references": ["<1@bank>"]})
+        self.assertEqual(fingerprint("Thanks. On Mar 27, 2025 at 10:22 Bob wrote: Deal ABC"), ("ABC",))
+
+        deduplicator = Deduplicator()
+        representatives = deduplicator.cluster({original: ("Transfer for Deal ABC.", email_headers(original)),
+                                                reply: ("Approved for Deal ABC, go ahead.", email_headers(reply))})
+        self.assertEqual(representatives[original], representatives[reply])
+        self.assertEqual(deduplicator.stats()["thread"], 1)
+
+    def test_results_are_fanned_out_to_duplicates(self):
+        classified = []
+        def classify(path, text):
+            classified.append(path)
+            if path == "bad.pdf":
+                raise ValueError("model down")
+            return [{"category": "Fee Payment"}]
+        texts = {"a.eml": NOTICE, "b.eml": NOTICE, "bad.pdf": "something else entirely"}
+
+        results = {path: (items, error) for path, items, error in analyze_deduplicated(list(texts), texts.get, classify, Deduplicator(), workers=2)}
+
+        self.assertEqual(sorted(classified), ["a.eml", "bad.pdf"])
+        self.assertEqual(results["bad.pdf"], ([], "model down"))
+        self.assertEqual(results["a.eml"], ([{"category": "Fee Payment"}], None))
+        self.assertEqual(results["b.eml"], ([{"category": "Fee Payment", "duplicate_of": "a.eml"}], None))
+
+if __name__ == "__main__":
+    unittest.main()
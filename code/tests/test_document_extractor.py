@@ -0,0 +1,80 @@
+import base64
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+import fitz
+import document_extractor
+from document_extractor import DocumentExtractor, SpillBuffer, decode_base64
+
+def make_pdf(page_texts):
+    doc = fitz.open()
+    for text in page_texts:
+        page = doc.new_page()
+        if text:
+            page.insert_text((72, 72), text)
+    return doc.tobytes()
+
+class TestDocumentExtractor(unittest.TestCase):
+
+    def test_extract_text_from_bytes(self):
+        extractor = DocumentExtractor(page_workers=1)
+        pdf_data = make_pdf(["Wire $500 for Deal ABC", "Account 12345 on 03/25/2025"])
+        self.assertEqual(extractor.extract_text(pdf_data), "Wire $500 for Deal ABC Account 12345 on 03/25/2025")
+
+    @patch("pdfplumber.open")
+    def test_falls_back_to_pdfplumber_for_sparse_pages_only(self, mock_pdfplumber):
+        mock_pdf = MagicMock()
+        mock_pdf.pages = [MagicMock(), MagicMock()]
+        mock_pdf.pages[1].extract_text.return_value = "Recovered table row | 500.00 | USD"
+        mock_pdfplumber.return_value.__enter__.return_value = mock_pdf
+
+        extractor = DocumentExtractor(page_workers=1)
+        pages = extractor.extract_pages(make_pdf(["A page with plenty of extractable text", ""]))
+
+        self.assertEqual(pages[1], "Recovered table row | 500.00 | USD")
+        mock_pdf.pages[0].extract_text.assert_not_called()
+
+    def test_parallel_pages_match_sequential(self):
+        pdf_data = make_pdf([f"Page {index} of the credit agreement" for index in range(9)])
+        sequential = DocumentExtractor(page_workers=1).extract_pages(pdf_data)
+        parallel = DocumentExtractor(page_workers=3, parallel_page_threshold=4).extract_pages(pdf_data)
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(len(parallel), 9)
+
+    def test_large_documents_share_one_bounded_pool(self):
+        pdf_data = make_pdf([f"Page {index} of the credit agreement" for index in range(6)])
+        DocumentExtractor(page_workers=2, parallel_page_threshold=4).extract_pages(pdf_data)
+        pool = document_extractor.get_page_pool()
+        DocumentExtractor(page_workers=3, parallel_page_threshold=4).extract_pages(pdf_data)
+
+        self.assertIs(document_extractor.get_page_pool(), pool)
+        self.assertEqual(pool._max_workers, document_extractor.MAX_PAGE_WORKERS)
+        self.assertNotEqual(pool._mp_context.get_start_method(), "fork")  # The app process runs threads
+        self.assertLessEqual(DocumentExtractor().page_workers, document_extractor.MAX_PAGE_WORKERS)
+
+    def test_pages_are_yielded_in_batches(self):
+        pdf_data = make_pdf([f"Page {index} of the credit agreement" for index in range(5)])
+        extractor = DocumentExtractor(page_workers=1, page_batch=2)
+        with patch("document_extractor.extract_page_range", wraps=document_extractor.extract_page_range) as mock_range:
+            pages = extractor.iter_pages(pdf_data)
+            self.assertEqual(next(pages).strip(), "Page 0 of the credit agreement")
+            self.assertEqual(mock_range.call_count, 1)
+            self.assertEqual(len(list(pages)), 4)
+        self.assertEqual([call.args[1:3] for call in mock_range.call_args_list], [(0, 2), (2, 4), (4, 5)])
+
+    def test_spill_buffer_moves_to_disk_past_limit(self):
+        pdf_data = make_pdf(["Wire $500 for Deal ABC"])
+        payload = base64.encodebytes(pdf_data).decode()  # MIME-style, wrapped every 76 characters
+        with SpillBuffer(max_memory=len(pdf_data) - 1) as buffer:
+            self.assertEqual(decode_base64(payload, buffer, chunk_chars=101), len(pdf_data))
+            path = buffer.source()
+            self.assertTrue(os.path.isfile(path))
+            self.assertEqual(DocumentExtractor(page_workers=1).extract_text(path), "Wire $500 for Deal ABC")
+        self.assertFalse(os.path.exists(path))
+
+        with SpillBuffer() as buffer:
+            decode_base64(payload, buffer, chunk_chars=7)
+            self.assertEqual(buffer.source(), pdf_data)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from extraction_cache import ExtractionCache, file_digest
+
+class TestExtractionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "extractions.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip_survives_restart(self):
+        cache = ExtractionCache(self.db_path)
+        key = cache.make_key("abc", "1")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "Wire $500 for Deal ABC " * 100)
+
+        restarted = ExtractionCache(self.db_path)
+        self.assertEqual(restarted.get(key), "Wire $500 for Deal ABC " * 100)
+        self.assertIsNone(restarted.get(cache.make_key("abc", "2")))
+        self.assertLess(restarted.stats()["bytes"], 200)  # stored compressed
+
+    def test_evicts_least_recently_used_above_size_limit(self):
+        cache = ExtractionCache(self.db_path, max_bytes=1)
+        with patch("time.time", return_value=1.0):
+            cache.put("old", "first document")
+        with patch("time.time", return_value=2.0):
+            cache.put("new", "second document")
+
+        self.assertIsNone(cache.get("old"))
+        self.assertEqual(cache.get("new"), "second document")
+
+    def test_file_digest_tracks_content(self):
+        path = os.path.join(self.tmp_dir, "a.eml")
+        with open(path, "w") as f:
+            f.write("one")
+        first = file_digest(path)
+        with open(path, "w") as f:
+            f.write("two")
+        self.assertNotEqual(first, file_digest(path))
+
+if __name__ == "__main__":
+    unittest.main()
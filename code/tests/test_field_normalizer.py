@@ -0,0 +1,80 @@
+import unittest
+from decimal import Decimal
+import pandas as pd
+from field_normalizer import normalize_fields, normalize_output, parse_currencies, parse_dates
+
+class TestFieldNormalizer(unittest.TestCase):
+
+    def test_columns_are_typed_in_batch(self):
+        fields = pd.DataFrame({
+            "deal_name": ["deal abc", "Deal MNO", "NA"],
+            "amount": ["$1,250.50", "EUR 14,000", 50000],
+            "transaction_date": ["March 26th, 2025", "2025-03-25", "next week"],
+            "account_number": ["Acct 12-345", "77889", None],
+            "currency": ["NA", "euros", "usd"],
+        })
+        normalized = normalize_fields(fields)
+
+        self.assertEqual(list(normalized["amount"]), [Decimal("1250.50"), Decimal("14000.00"), Decimal("50000.00")])
+        self.assertEqual(str(normalized["transaction_date"].dtype), "datetime64[ns]")
+        self.assertEqual(normalized["transaction_date"][0], pd.Timestamp("2025-03-26"))
+        self.assertTrue(pd.isna(normalized["transaction_date"][2]))
+        self.assertEqual(list(normalized["currency"]), ["USD", "EUR", "USD"])  # The first comes from the amount's symbol
+        self.assertEqual(list(normalized["deal_name"][:2]), ["Deal ABC", "Deal MNO"])
+        self.assertEqual(normalized["account_number"][0], "12345")
+        self.assertTrue(normalized["fields_verified"].isna().all())  # No source text to check against
+
+    def test_cross_checks_and_fills_from_source_text(self):
+        output = {
+            "a.eml": [{"category": "Fee Payment", "confidence_score": 0.9, "sub_category": {},
+                       "extracted_fields": {"deal_name": "Deal ABC", "amount": "$1,250.50", "transaction_date": "03/26/2025", "account_number": "99999", "currency": "USD"},
+                       "associated_text": "Pay $1,250.50 for Deal ABC on 03/26/2025 from account 12345."}],
+            "b.pdf": [{"category": "Money Movement - Inbound", "confidence_score": 0.7, "sub_category": {},
+                       "extracted_fields": {"deal_name": "NA", "amount": "NA", "transaction_date": "NA", "account_number": "NA", "currency": "NA"},
+                       "associated_text": "Receive EUR 14,000 inbound for Deal MNO on March 25, 2025, account 77889."}],
+        }
+        frame = normalize_output(output)
+
+        first, second = frame.iloc[0], frame.iloc[1]
+        self.assertTrue(first["amount_verified"] and first["date_verified"] and first["deal_verified"])
+        self.assertFalse(first["account_verified"])  # The model's account number is not in the email
+        self.assertFalse(first["fields_verified"])
+        self.assertEqual((second["amount"], second["currency"], second["deal_name"], second["account_number"]),
+                         (Decimal("14000.00"), "EUR", "Deal MNO", "77889"))
+        self.assertEqual(second["transaction_date"], pd.Timestamp("2025-03-25"))
+        self.assertTrue(second["fields_verified"])
+        self.assertEqual(first["amount_text"], "$1,250.50")
+
+    def test_scale_words_multiply_amounts(self):
+        output = {
+            "a.eml": [{"category": "Fee Payment", "confidence_score": 0.9, "sub_category": {},
+                       "extracted_fields": {"amount": "USD 1.5 million"}, "associated_text": "Wire USD 1.5 million for Deal ABC."}],
+            "b.eml": [{"category": "Fee Payment", "confidence_score": 0.9, "sub_category": {},
+                       "extracted_fields": {"amount": "$2.5M"}, "associated_text": "Wire $2.5M today."}],
+            "c.eml": [{"category": "Fee Payment", "confidence_score": 0.9, "sub_category": {},
+                       "extracted_fields": {"amount": "$1.5"}, "associated_text": "Wire $1.5 million today."}],
+        }
+        frame = normalize_output(output)
+
+        self.assertEqual(list(frame["amount"][:2]), [Decimal("1500000.00"), Decimal("2500000.00")])
+        self.assertEqual(list(frame["currency"][:2]), ["USD", "USD"])
+        self.assertTrue(frame["amount_verified"][0] and frame["amount_verified"][1])
+        self.assertFalse(frame["amount_verified"][2])  # The unscaled 1.5 is not the 1.5 million in the email
+
+    def test_deal_names_are_matched_in_source_text(self):
+        source = pd.Series(["Funding for the ACME term-facility closes Friday.", "Pay for Deal XYZ.", "Pay for Deal XYZ.", "Fee due."])
+        fields = pd.DataFrame({"deal_name": ["Acme Term Facility", "deal xyz", "Deal ABC", "Beta Revolver"]})
+        verified = normalize_fields(fields, source)["deal_verified"]
+
+        self.assertTrue(verified[0])  # Case and punctuation differ, words match
+        self.assertTrue(verified[1])
+        self.assertFalse(verified[2])  # The text names a different deal
+        self.assertTrue(pd.isna(verified[3]))  # Free-form name not in the text is unknown, not failed
+
+    def test_scalar_helpers_and_empty_output(self):
+        self.assertEqual(list(parse_currencies(pd.Series(["£", "Japanese YEN", "XYZ"])).fillna("-")), ["GBP", "JPY", "-"])
+        self.assertEqual(parse_dates(pd.Series(["25 March 2025"]))[0], pd.Timestamp("2025-03-25"))
+        self.assertEqual(len(normalize_output({})), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import MagicMock
+from ingest_daemon import IngestDaemon
+
+class TestIngestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.watch_dir = os.path.join(self.tmp_dir, "drop")
+        os.makedirs(self.watch_dir)
+        self.store_path = os.path.join(self.tmp_dir, "results.jsonl")
+        self.manifest_path = os.path.join(self.tmp_dir, "manifest.json")
+        self.launcher = MagicMock()
+        self.launcher.extract_text_from_path.side_effect = lambda path: open(path).read()
+        self.launcher.process_text.side_effect = lambda filename, text: [{"category": text}]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_daemon(self):
+        return IngestDaemon(self.watch_dir, self.store_path, self.manifest_path, settle_seconds=0, use_inotify=False,
+                            launcher_factory=lambda: self.launcher)
+
+    def write(self, filename, text, age_ns=0):
+        path = os.path.join(self.watch_dir, filename)
+        with open(path, "w") as f:
+            f.write(text)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - age_ns))
+
+    def records(self):
+        with open(self.store_path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_processes_only_new_or_changed_files(self):
+        self.write("a.eml", "Fee Payment")
+        self.write("notes.txt", "ignored")
+        daemon = self.make_daemon()
+        self.assertEqual(daemon.run_once(), 1)
+        self.assertEqual(daemon.run_once(), 0)
+
+        self.write("a.eml", "Fee Payment", age_ns=10**9)  # touched, same content
+        self.assertEqual(daemon.run_once(), 0)
+        self.write("a.eml", "Closing Notice", age_ns=2 * 10**9)
+        self.write("b.pdf", "Adjustment")
+        self.assertEqual(daemon.run_once(), 2)
+
+        self.assertEqual([record["results"][0]["category"] for record in self.records()], ["Fee Payment", "Closing Notice", "Adjustment"])
+
+    def test_restart_resumes_from_manifest(self):
+        self.write("a.eml", "Fee Payment")
+        self.make_daemon().run_once()
+        self.write("b.eml", "Adjustment")
+
+        self.assertEqual(self.make_daemon().run_once(), 1)
+        self.assertEqual(self.launcher.process_text.call_count, 2)
+
+    def test_failed_file_is_recorded_and_retried_after_restart(self):
+        self.write("bad.eml", "boom")
+        self.launcher.process_text.side_effect = ValueError("model down")
+        daemon = self.make_daemon()
+        daemon.run_once()
+        self.assertEqual(self.records()[0]["error"], "model down")
+        self.assertEqual(daemon.manifest["bad.eml"]["status"], "failed")
+
+        self.launcher.process_text.side_effect = lambda filename, text: [{"category": text}]
+        self.assertEqual(self.make_daemon().run_once(), 1)
+
+    def test_unchanged_failed_file_waits_for_backoff(self):
+        self.write("bad.eml", "boom")
+        self.launcher.process_text.side_effect = ValueError("model down")
+        daemon = self.make_daemon()
+        for _ in range(5):
+            daemon.run_once()
+        self.write("bad.eml", "boom", age_ns=10**9)  # touched, same content
+        daemon.run_once()
+        self.assertEqual(self.launcher.process_text.call_count, 1)
+        self.assertEqual(len(self.records()), 1)
+
+        daemon.retry_seconds = 0  # backoff expired
+        self.assertEqual(daemon.run_once(), 1)
+        self.assertEqual(self.launcher.process_text.call_count, 2)
+        self.write("bad.eml", "fixed", age_ns=2 * 10**9)  # changed files are retried right away
+        self.launcher.process_text.side_effect = lambda filename, text: [{"category": text}]
+        daemon.retry_seconds = 300.0
+        self.assertEqual(daemon.run_once(), 1)
+        self.assertEqual([record.get("error") for record in self.records()], ["model down", "model down", None])
+
+    def test_file_without_text_fails_and_backs_off(self):
+        self.write("scan.pdf", "")
+        daemon = self.make_daemon()
+        daemon.run_once()
+        daemon.run_once()
+
+        self.launcher.process_text.assert_not_called()
+        self.assertEqual(daemon.manifest["scan.pdf"]["status"], "failed")
+        self.assertEqual([record["error"] for record in self.records()], ["No text could be extracted from scan.pdf."])
+
+if __name__ == "__main__":
+    unittest.main()
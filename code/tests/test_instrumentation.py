@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+import unittest
+from classifier import AnalysisLauncher
+from instrumentation import Tracer
+from llm_backend import StubBackend
+from llm_cache import ResponseCache
+from prompt_budget import PromptBudget
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_nested_spans_inherit_trace(self):
+        tracer = Tracer()
+        with tracer.span("file", trace="a.eml"):
+            with tracer.span("llm_call", prompt_chars=120) as span:
+                span.set(response_chars=40)
+
+        inner, outer = tracer.recent
+        self.assertEqual((inner["span"], inner["trace"], inner["parent"]), ("llm_call", "a.eml", "file"))
+        self.assertEqual(inner["response_chars"], 40)
+        self.assertEqual((outer["trace"], outer["parent"]), ("a.eml", None))
+        self.assertEqual(tracer.stats()["llm_call"]["count"], 1)
+
+    def test_errors_and_prometheus_text(self):
+        tracer = Tracer()
+        with self.assertRaises(ValueError):
+            with tracer.span("parse"):
+                raise ValueError("bad json")
+        with tracer.span("extract", input_bytes=2048):
+            pass
+
+        text = tracer.prometheus_text()
+        self.assertEqual(tracer.recent[0]["error"], "ValueError")
+        self.assertIn('pipeline_stage_seconds_count{stage="parse"} 1', text)
+        self.assertIn('pipeline_stage_seconds_bucket{stage="extract",le="+Inf"} 1', text)
+        self.assertIn('pipeline_stage_errors_total{stage="parse"} 1', text)
+        self.assertIn('pipeline_stage_volume_total{stage="extract",measure="input_bytes"} 2048', text)
+
+    def test_jsonl_log_and_profile(self):
+        with tempfile.TemporaryDirectory() as folder:
+            tracer = Tracer(os.path.join(folder, "trace.jsonl"), profile_dir=os.path.join(folder, "profiles"))
+            with tracer.profile("a.eml.classify"), tracer.span("file", trace="a.eml"):
+                sum(range(1000))
+            tracer.close()
+
+            with open(os.path.join(folder, "trace.jsonl"), encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual([record["span"] for record in records], ["file"])
+            self.assertTrue(os.path.exists(os.path.join(folder, "profiles", "a.eml.classify.prof")))
+
+    def test_launcher_reports_stages(self):
+        tracer = Tracer()
+        launcher = AnalysisLauncher("temp", cache=ResponseCache(), backend=StubBackend(), tracer=tracer)
+        launcher.process_text("a.eml", "[a.eml]: Please process the $500 ongoing fee payment for Deal ABC on 03/26/2025.")
+
+        stats = tracer.stats()
+        for stage in ("file", "build_prompt", "llm_call", "parse", "sub_classify"):
+            self.assertIn(stage, stats)
+        self.assertTrue(all(record["trace"] == "a.eml" for record in tracer.recent))
+
+    def test_counters_add_up_across_launchers(self):
+        tracer = Tracer()
+        for filename in ("a.eml", "b.eml"):
+            # A new launcher per file, as the app, job worker, daemon and CLI build them
+            launcher = AnalysisLauncher("temp", cache=ResponseCache(), backend=StubBackend(), tracer=tracer, budget=PromptBudget(100000))
+            launcher.process_text(filename, f"[{filename}]: Please process the $500 ongoing fee payment for Deal ABC on 03/26/2025.")
+
+        counters = tracer.counters()
+        self.assertEqual(sum(counters["parse_outcomes"].values()), 4)  # Category and sub-category per file
+        self.assertEqual(counters["decisions"], {"source=model,stage=category": 2, "source=model,stage=sub_category": 2})
+        self.assertEqual(counters["budget_texts"], {"clamped=False": 2})
+        self.assertIn('pipeline_decisions_total{source="model",stage="category"} 2', tracer.prometheus_text())
+
+if __name__ == "__main__":
+    unittest.main()
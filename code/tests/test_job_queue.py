@@ -0,0 +1,114 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from job_queue import JobStore, JobWorker, _workers, get_job_queue, stop_job_workers
+from results_store import ResultsStore
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.tmp_dir, "jobs.sqlite"))
+        self.options = []
+        self.launcher = MagicMock()
+        self.launcher.extract_text_from_path.side_effect = lambda path: "" if path == "empty.pdf" else os.path.basename(path)
+        self.launcher.process_text.side_effect = self.process_text
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def process_text(self, filename, text):
+        if filename == "bad.eml":
+            raise ValueError("bad file")
+        return [{"category": text}]
+
+    def make_worker(self):
+        def factory(options):
+            self.options.append(options)
+            return self.launcher
+        return JobWorker(self.store, results_store_path=os.path.join(self.tmp_dir, "store"), launcher_factory=factory,
+                         archive_root=os.path.join(self.tmp_dir, "archive"))
+
+    def test_worker_runs_job_and_results_poll_incrementally(self):
+        workspace = os.path.join(self.tmp_dir, "upload")
+        os.makedirs(workspace)
+        job_id = self.store.submit(["a.pdf", "bad.eml"], {"combined": True, "unknown": 1, "archive": True}, workspace)
+        self.assertEqual(self.store.job(job_id)["status"], "queued")
+
+        self.assertTrue(self.make_worker().run_once())
+
+        job = self.store.job(job_id)
+        self.assertEqual((job["status"], job["total"], job["done"], job["failed"]), ("done", 2, 2, 1))
+        results = {row["file"]: row for row in self.store.results(job_id)}
+        self.assertEqual(results["a.pdf"]["results"], [{"category": "a.pdf"}])
+        self.assertEqual(results["bad.eml"]["error"], "bad file")
+        self.assertEqual(self.store.results(job_id, after=max(row["seq"] for row in results.values())), [])
+        self.assertTrue(self.options[0]["combined"])
+        self.assertNotIn("unknown", self.options[0])
+        self.assertEqual(self.options[0]["archive_dir"], os.path.join(self.tmp_dir, "archive", job_id))
+        self.assertFalse(os.path.exists(workspace))
+        self.assertEqual(list(ResultsStore(os.path.join(self.tmp_dir, "store")).query()["run_id"]), [job_id])
+
+    def test_jobs_run_in_order_and_queue_drains(self):
+        first = self.store.submit(["a.pdf"])
+        second = self.store.submit(["b.pdf"])
+        self.assertEqual(self.store.claim()["id"], first)
+        self.assertEqual(self.store.claim()["id"], second)
+        self.assertIsNone(self.store.claim())
+        self.assertIsNone(self.store.job("missing"))
+
+    def test_interrupted_job_resumes_with_pending_files_only(self):
+        job_id = self.store.submit(["a.pdf", "b.pdf"])
+        self.store.claim()
+        self.store.record(job_id, "a.pdf", results=[{"category": "kept"}])
+
+        self.assertEqual(self.store.requeue_running(), 1)
+        self.make_worker().run_once()
+
+        self.assertEqual(self.launcher.process_text.call_args_list[0].args[0], "b.pdf")
+        self.assertEqual(self.launcher.process_text.call_count, 1)
+        self.assertEqual([row["file"] for row in self.store.results(job_id)], ["a.pdf", "b.pdf"])
+
+    def test_file_without_extracted_text_fails(self):
+        for options in ({}, {"dedup": True}):
+            job_id = self.store.submit(["empty.pdf"], options)
+            self.make_worker().run_once()
+
+            self.assertEqual(self.store.job(job_id)["failed"], 1)
+            self.assertEqual(self.store.results(job_id)[0]["error"], "No text could be extracted from empty.pdf.")
+        self.launcher.process_text.assert_not_called()
+
+    def test_failing_job_is_marked_failed_and_queue_moves_on(self):
+        broken, next_job = self.store.submit(["a.pdf"]), self.store.submit(["b.pdf"])
+        worker = self.make_worker()
+        worker.results_store.append = MagicMock(side_effect=[ValueError("store down"), 1])
+
+        self.assertTrue(worker.run_once())
+        self.assertTrue(worker.run_once())
+        self.assertEqual((self.store.job(broken)["status"], self.store.job(broken)["error"]), ("failed", "store down"))
+        self.assertEqual(self.store.job(next_job)["status"], "done")
+        self.assertEqual(self.store.requeue_running(), 0)
+
+    def test_old_database_gains_job_error_column(self):
+        path = os.path.join(self.tmp_dir, "old.sqlite")
+        with sqlite3.connect(path) as db:
+            db.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, options TEXT NOT NULL, workspace TEXT, "
+                       "total INTEGER NOT NULL, created REAL NOT NULL, started REAL, finished REAL)")
+        store = JobStore(path)
+        self.assertIsNone(store.job(store.submit(["a.pdf"]))["error"])
+        store.close()
+
+    def test_worker_process_can_start_children_and_is_stopped(self):
+        # A daemonic worker could not run the page-extraction process pool for large PDFs
+        get_job_queue(os.path.join(self.tmp_dir, "worker.sqlite"))
+        worker = _workers[os.path.join(self.tmp_dir, "worker.sqlite")]
+        self.assertFalse(worker.daemon)
+        stop_job_workers()
+        self.assertFalse(worker.is_alive())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import json
+from unittest.mock import patch
+from llm_backend import OllamaBackend, StubBackend, get_backend
+
+PROMPT = """Categories:
+1. Category Name: Fee Payment
+    * Description: Payments for extra charges tied to loans.
+2. Category Name: Money Movement - Inbound
+    * Description: Money flows into the bank from an external source.
+
+Email to Classify:
+Receive $14,000 inbound for Deal MNO on 03/25/2025, account 77889.
+
+Instructions:
+Return "classification" objects."""
+
+class TestLLMBackend(unittest.TestCase):
+
+    def test_stub_backend_is_deterministic(self):
+        backend = StubBackend()
+        first = backend.chat(PROMPT)
+        self.assertEqual(first, StubBackend().chat(PROMPT))
+
+        item = json.loads(first.split("```json\n")[1].split("\n```")[0])[0]
+        self.assertEqual(item["classification"]["category"], "Money Movement - Inbound")
+        self.assertEqual(item["extracted_fields"]["amount"], "$14,000")
+        self.assertEqual(item["extracted_fields"]["account_number"], "77889")
+        self.assertEqual(backend.calls, 1)
+
+    def test_chat_batch_keeps_prompt_order(self):
+        backend = StubBackend(responder=lambda prompt: prompt.upper())
+        self.assertEqual(backend.chat_batch(["a", "b", "c"]), ["A", "B", "C"])
+        self.assertEqual(backend.calls, 3)
+
+    @patch("ollama.Client")
+    def test_ollama_backend_reuses_client_with_keep_alive(self, mock_client):
+        mock_client.return_value.chat.return_value = {"message": {"content": "ok"}}
+        backend = OllamaBackend(model="m", keep_alive="1h")
+
+        self.assertEqual(backend.chat("p"), "ok")
+        self.assertEqual(backend.chat("q"), "ok")
+        mock_client.assert_called_once()
+        self.assertEqual(mock_client.return_value.chat.call_args.kwargs["keep_alive"], "1h")
+
+    @patch("ollama.Client")
+    def test_ollama_backend_passes_schema_as_format(self, mock_client):
+        mock_client.return_value.chat.return_value = {"message": {"content": "{}"}}
+        schema = {"type": "object"}
+        OllamaBackend(model="m").chat("p", schema)
+        self.assertEqual(mock_client.return_value.chat.call_args.kwargs["format"], schema)
+
+    @patch("ollama.Client")
+    def test_ollama_backend_sends_system_first_and_records_prompt_eval(self, mock_client):
+        mock_client.return_value.chat.return_value = {"message": {"content": "ok"}, "prompt_eval_count": 12, "prompt_eval_duration": 5e8}
+        backend = OllamaBackend(model="m")
+        backend.chat("email", system="rules")
+
+        messages = mock_client.return_value.chat.call_args.kwargs["messages"]
+        self.assertEqual([message["role"] for message in messages], ["system", "user"])
+        self.assertEqual(messages[0]["content"], "rules")
+        self.assertEqual(backend.last_eval(), {"prompt_eval_tokens": 12, "prompt_eval_seconds": 0.5})
+        self.assertEqual(backend.eval_stats()["mean_prompt_eval_tokens"], 12.0)
+
+    def test_get_backend_is_shared(self):
+        self.assertIs(get_backend("stub", latency=0.0), get_backend("stub", latency=0.0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest.mock import patch
+from llm_cache import ResponseCache
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "responses.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_key_depends_on_model_prompt_and_version(self):
+        key = ResponseCache.make_key("m", "prompt", "v1")
+        self.assertEqual(key, ResponseCache.make_key("m", "prompt", "v1"))
+        self.assertNotEqual(key, ResponseCache.make_key("m", "prompt", "v2"))
+        self.assertNotEqual(key, ResponseCache.make_key("other", "prompt", "v1"))
+
+    def test_memory_lru_eviction_and_counters(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        self.assertEqual(cache.get("a"), "1")
+        cache.put("c", "3")  # evicts b, the least recently used
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "3")
+        stats = cache.stats()
+        self.assertEqual(stats["memory_hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_disk_tier_survives_restart(self):
+        cache = ResponseCache(db_path=self.db_path)
+        cache.put("a", "1")
+
+        restarted = ResponseCache(db_path=self.db_path)
+        self.assertEqual(restarted.get("a"), "1")
+        self.assertEqual(restarted.stats()["disk_hits"], 1)
+
+    def test_locked_database_is_a_miss_not_an_error(self):
+        cache = ResponseCache(db_path=self.db_path, busy_timeout=0.05)
+        self.assertEqual(cache._db.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        other = sqlite3.connect(self.db_path)
+        other.execute("BEGIN EXCLUSIVE")  # Another process in the middle of a write
+        try:
+            with self.assertLogs("llm_cache", level="WARNING"):
+                cache.put("a", "1")
+        finally:
+            other.rollback()
+            other.close()
+
+        self.assertEqual(cache.get("a"), "1")  # Still served from memory
+        self.assertEqual(cache.stats()["disk_errors"], 1)
+        self.assertIsNone(ResponseCache(db_path=self.db_path).get("a"))
+
+    def test_disk_size_and_ttl_eviction(self):
+        cache = ResponseCache(max_entries=1, db_path=self.db_path, max_disk_entries=2, ttl=60)
+        with patch("time.time", return_value=1000.0):
+            cache.put("a", "1")
+        with patch("time.time", return_value=1000.5):
+            cache.put("b", "2")
+        with patch("time.time", return_value=1001.0):
+            cache.put("c", "3")  # disk keeps only the two most recent entries
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("b"), "2")
+        with patch("time.time", return_value=1100.0):
+            self.assertIsNone(cache.get("c"))
+
+if __name__ == "__main__":
+    unittest.main()
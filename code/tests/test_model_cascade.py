@@ -0,0 +1,58 @@
+import json
+import re
+import unittest
+from classifier import AnalysisLauncher
+from llm_backend import StubBackend
+from llm_cache import ResponseCache
+from model_cascade import ModelCascade, answer_confidence
+
+EMAIL = "[a.eml]: Please submit a fee payment of $250 for Deal KLM on 03/15/2025, account 54321."
+
+class TestModelCascade(unittest.TestCase):
+
+    def make_fast(self, score=None, text=None):
+        stub = StubBackend()
+
+        def respond(prompt):
+            if text is not None:
+                return text
+            answer = stub.default_response(prompt)
+            return re.sub(r'"confidence_score": [\d.]+', f'"confidence_score": {score}', answer) if score is not None else answer
+        return StubBackend(model="fast", responder=respond)
+
+    def launch(self, fast, threshold=0.7):
+        strong = StubBackend(model="strong")
+        cascade = ModelCascade(fast, strong, threshold)
+        launcher = AnalysisLauncher("temp", cache=ResponseCache(), cascade=cascade)
+        return launcher, cascade, strong, launcher.process_text("a.eml", EMAIL)
+
+    def test_confident_answers_stay_on_fast_model(self):
+        launcher, cascade, strong, result = self.launch(self.make_fast(score=0.95))
+
+        self.assertEqual(result[0]["category"], "Fee Payment")
+        self.assertEqual(result[0]["confidence_score"], 0.95)
+        self.assertEqual(strong.calls, 0)
+        stats = cascade.stats()
+        self.assertEqual((stats["prompts"], stats["escalated"]), (2, 0))
+        self.assertEqual(stats["tiers"]["fast"]["calls"], 2)
+
+    def test_low_confidence_and_invalid_answers_escalate(self):
+        _, cascade, strong, result = self.launch(self.make_fast(score=0.3))
+        self.assertEqual(strong.calls, 2)
+        self.assertNotEqual(result[0]["confidence_score"], 0.3)
+        self.assertEqual(cascade.stats()["reasons"], {"low_confidence": 2})
+
+        _, cascade, strong, result = self.launch(self.make_fast(text="not json"))
+        self.assertEqual(result[0]["category"], "Fee Payment")
+        self.assertEqual(cascade.stats()["reasons"]["invalid"], 2)
+        self.assertEqual(cascade.stats()["by_stage"], {"category/escalated": 1, "sub_category/escalated": 1})
+
+    def test_answer_confidence_uses_lowest_score(self):
+        items = [{"classification": {"confidence_score": 0.9}, "sub_classification": {"confidence_score": 0.6}},
+                 {"classification": {"confidence_score": 0.8}}]
+        self.assertEqual(answer_confidence(items), 0.6)
+        self.assertEqual(answer_confidence(json.loads('{"category": "x", "confidence_score": 0.75}')), 0.75)
+        self.assertEqual(answer_confidence([]), 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
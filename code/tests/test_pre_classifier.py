@@ -0,0 +1,48 @@
+import unittest
+from classifier import AnalysisLauncher
+from llm_backend import StubBackend
+from llm_cache import ResponseCache
+from pre_classifier import PreClassifier, extract_fields, parse_definitions
+from prompt_resources import PromptResources
+
+class TestPreClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.resources = PromptResources("resources")
+        self.pre_classifier = PreClassifier(self.resources)
+
+    def test_parses_definitions_from_resources(self):
+        definitions = parse_definitions(self.resources.texts["categories.txt"])
+        self.assertEqual(len(definitions), 7)
+        self.assertEqual(definitions[4][0], "Fee Payment")
+        self.assertTrue(definitions[4][2][0].startswith("Submit a fee payment"))
+
+    def test_extracts_fields(self):
+        fields = extract_fields("Receive EUR 14,000 inbound for Deal MNO on March 25, 2025, account 77889.")
+        self.assertEqual(fields, {"deal_name": "Deal MNO", "amount": "EUR 14,000", "transaction_date": "March 25, 2025",
+                                  "account_number": "77889", "currency": "EUR"})
+
+    def test_routine_email_is_classified_without_model(self):
+        item = self.pre_classifier.classify("[a.eml]: Please process the $500 ongoing fee payment for Deal ABC on 03/26/2025, quarterly administrative costs.")
+        self.assertEqual(item["classification"]["category"], "Fee Payment")
+        self.assertEqual(item["extracted_fields"]["amount"], "$500")
+        self.assertEqual(self.pre_classifier.sub_classify("Fee Payment", item["associated_text"])["name"], "Ongoing Fee")
+        self.assertEqual(self.pre_classifier.stats()["by_category"], {"Fee Payment": 1})
+
+    def test_ambiguous_or_multi_transaction_email_defers_to_model(self):
+        self.assertIsNone(self.pre_classifier.classify("[b.eml]: Hello, please see the attached documents and call me."))
+        self.assertIsNone(self.pre_classifier.classify("[c.eml]: Submit a fee payment of $250 and receive $14,000 inbound for Deal MNO."))
+        self.assertEqual(self.pre_classifier.stats()["shortcut_rate"], 0.0)
+
+    def test_launcher_skips_model_when_confident(self):
+        backend = StubBackend()
+        launcher = AnalysisLauncher("temp", cache=ResponseCache(), backend=backend, resources=self.resources, pre_classifier=self.pre_classifier)
+        output = launcher.process_text("a.eml", "[a.eml]: Please process the $500 ongoing fee payment for Deal ABC on 03/26/2025, quarterly administrative costs.")
+
+        self.assertEqual(backend.calls, 0)
+        self.assertEqual(output[0]["category"], "Fee Payment")
+        self.assertEqual(output[0]["sub_category"]["name"], "Ongoing Fee")
+        self.assertEqual([decision["source"] for decision in launcher.decisions], ["rules", "rules"])
+
+if __name__ == "__main__":
+    unittest.main()
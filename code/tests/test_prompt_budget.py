@@ -0,0 +1,67 @@
+import unittest
+from prompt_budget import PromptBudget, estimate_tokens, merge_classifications
+
+def item(category, amount, confidence):
+    return {"classification": {"category": category, "confidence_score": confidence},
+            "extracted_fields": {"amount": amount, "account_number": "12345", "transaction_date": "03/25/2025"}}
+
+class TestPromptBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.budget = PromptBudget(max_prompt_tokens=60, attachment_tokens=20, overlap_tokens=10, min_content_tokens=20)
+
+    def test_deduplicates_quoted_reply_chain(self):
+        text = "[a.eml]: Please wire $500 to account 12345 today. Thanks, Alex. > > Please wire $500 to account 12345 today. Ok."
+        self.assertEqual(self.budget.deduplicate(text), "[a.eml]: Please wire $500 to account 12345 today. Thanks, Alex. Ok.")
+
+    def test_strips_boilerplate_disclaimers(self):
+        text = "Pay the $250 fee for Deal KLM. CONFIDENTIALITY NOTICE: this email is confidential. Regards."
+        self.assertEqual(self.budget.strip_boilerplate(text), "Pay the $250 fee for Deal KLM. Regards.")
+
+    def test_trims_large_attachments_to_relevant_sentences(self):
+        filler = "The parties agree to the general terms set forth herein. " * 10
+        text = f"[a.eml]: See attached. --- Attachment Content --- Attachment PDF: {filler}Transfer $12,000 for Deal PQR on 03/27/2025."
+        trimmed = self.budget.trim_attachments(text)
+        self.assertIn("Attachment PDF: Transfer $12,000 for Deal PQR on 03/27/2025.", trimmed)
+        self.assertNotIn("general terms", trimmed)
+
+    def test_compact_chunks_oversized_text_and_reports_savings(self):
+        sentences = [f"Transfer ${index},000 for Deal D{index} on 03/{index + 1:02d}/2025." for index in range(12)]
+        text = "[big.pdf]: " + " ".join(sentences + sentences[:3])
+        chunks, report = self.budget.compact(text, static_tokens=10)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(chunk.startswith("[big.pdf]: (part ") for chunk in chunks))
+        self.assertTrue(all(estimate_tokens(chunk) <= 50 for chunk in chunks))
+        self.assertGreater(report["saved_tokens"]["deduplicate"], 0)
+        self.assertEqual(report["chunks"], len(chunks))
+        for sentence in sentences:
+            self.assertTrue(any(sentence in chunk for chunk in chunks))
+
+    def test_small_text_is_untouched(self):
+        chunks, report = PromptBudget(max_prompt_tokens=1000).compact("[a.eml]: Pay $5 fee.")
+        self.assertEqual(chunks, ["[a.eml]: Pay $5 fee."])
+        self.assertEqual(report["chunks"], 1)
+
+    def test_merge_classifications_collapses_overlap_duplicates(self):
+        merged = merge_classifications([[item("Fee Payment", "$500", 0.7)], [item("Fee Payment", "$500", 0.9), item("Adjustment", "$200", 0.8)]])
+        self.assertEqual([(entry["classification"]["category"], entry["classification"]["confidence_score"]) for entry in merged],
+                         [("Fee Payment", 0.9), ("Adjustment", 0.8)])
+
+    def test_budget_below_static_prompt_is_clamped(self):
+        text = "[a.eml]: " + " ".join(f"Pay the ${index} fee for Deal ABC on 03/25/2025." for index in range(30))
+        with self.assertLogs("prompt_budget", level="WARNING"):
+            chunks, report = PromptBudget(max_prompt_tokens=1500, min_content_tokens=500).compact(text, static_tokens=1552)
+        self.assertEqual(chunks, [text])
+        self.assertTrue(report["clamped"])
+        self.assertEqual(report["available_tokens"], 500)
+
+    def test_merge_keeps_distinct_items_without_fields(self):
+        def unknown(text):
+            return {"classification": {"category": "Unknown", "confidence_score": 0.5}, "associated_text": text,
+                    "extracted_fields": {"amount": "NA", "account_number": "NA", "transaction_date": "NA"}}
+        merged = merge_classifications([[unknown("First note.")], [unknown("Second note."), unknown("first  note.")]])
+        self.assertEqual([entry["associated_text"] for entry in merged], ["First note.", "Second note."])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from prompt_resources import PromptResources
+
+class TestPromptResources(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        for name in PromptResources.STATIC_FILES:
+            self.write(name, name.split(".")[0])
+        self.fee_file = os.path.join(self.base_dir, "sub-category-fee-payment.txt")
+        self.write("sub-category-fee-payment.txt", "fee rules")
+        self.write("ruleset_files.json", json.dumps({"Fee Payment": self.fee_file, "Adjustment": ""}))
+        self.resources = PromptResources(self.base_dir, check_interval=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def write(self, name, text):
+        with open(os.path.join(self.base_dir, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_build_prompts(self):
+        self.assertEqual(self.resources.build_prompt("EMAIL"), "objective\n\ncategories\n\nEmail to Classify:\nEMAIL\n\ninstructions")
+        self.assertEqual(self.resources.build_sub_prompt("Fee Payment", "TEXT"), "sub_objective\n\nfee rules\n\nEmail to Classify:\nTEXT\n\nsub_instructions")
+        self.assertIsNone(self.resources.build_sub_prompt("Adjustment", "TEXT"))
+        self.assertIsNone(self.resources.build_sub_prompt("Unknown", "TEXT"))
+        self.assertEqual(self.resources.build_combined_prompt("EMAIL"),
+                         "combined_objective\n\ncategories\n\nSub-categories for Fee Payment:\nfee rules\n\nEmail to Classify:\nEMAIL\n\ncombined_instructions")
+
+    def test_build_messages_keeps_email_out_of_system_prompt(self):
+        system, user = self.resources.build_messages("EMAIL")
+        self.assertEqual(system, "objective\n\ncategories\n\ninstructions")
+        self.assertEqual(user, "Email to Classify:\nEMAIL")
+        self.assertEqual(self.resources.build_sub_messages("Fee Payment", "TEXT")[0], "sub_objective\n\nfee rules\n\nsub_instructions")
+        self.assertIsNone(self.resources.build_sub_messages("Adjustment", "TEXT"))
+
+    def test_reloads_only_when_mtime_changes(self):
+        version = self.resources.version
+        self.assertFalse(self.resources.refresh())
+
+        self.write("objective.txt", "new objective")
+        stat = os.stat(os.path.join(self.base_dir, "objective.txt"))
+        os.utime(os.path.join(self.base_dir, "objective.txt"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        self.assertTrue(self.resources.build_prompt("EMAIL").startswith("new objective"))
+        self.assertNotEqual(self.resources.version, version)
+
+    def test_bad_edit_keeps_last_good_resources(self):
+        version = self.resources.version
+        self.write("objective.txt", "")
+        os.remove(self.fee_file)
+
+        with self.assertLogs("prompt_resources", level="ERROR"):
+            self.assertFalse(self.resources.refresh())
+        self.assertEqual(self.resources.version, version)
+        self.assertTrue(self.resources.build_prompt("EMAIL").startswith("objective"))
+        self.assertEqual(self.resources.build_sub_prompt("Fee Payment", "TEXT"), "sub_objective\n\nfee rules\n\nEmail to Classify:\nTEXT\n\nsub_instructions")
+
+        self.write("objective.txt", "fixed objective")
+        self.write("sub-category-fee-payment.txt", "fee rules")
+        self.assertTrue(self.resources.build_prompt("EMAIL").startswith("fixed objective"))
+
+    def test_missing_ruleset_file_fails_validation(self):
+        os.remove(self.fee_file)
+        with self.assertRaises(FileNotFoundError):
+            PromptResources(self.base_dir)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from response_parser import StreamingJSONParser, parse_json_response, stream_json_response
+
+class TestStreamingJSONParser(unittest.TestCase):
+
+    def test_stops_at_first_complete_json(self):
+        parser = StreamingJSONParser()
+        chunks = ["Sure.\n```js", "on\n[{\"category\": \"Fee", " Payment\", \"text\": \"a ] b }\"}", "]\n```\ntrailing explanation"]
+        results = [parser.feed(chunk) for chunk in chunks]
+
+        self.assertEqual(results, [False, False, False, True])
+        self.assertEqual(parser.result, [{"category": "Fee Payment", "text": "a ] b }"}])
+
+    def test_ignores_fences_inside_think_block(self):
+        parser = StreamingJSONParser()
+        self.assertFalse(parser.feed("<think>maybe ```json\n{\"draft\": 1}\n``` no"))
+        self.assertTrue(parser.feed("</think>\n```json\n{\"final\": 2}\n```"))
+        self.assertEqual(parser.result, {"final": 2})
+
+    def test_stream_json_response_closes_stream_early(self):
+        consumed = []
+        def tokens():
+            for chunk in ["<think>x</think>", "```json\n", "{\"a\": 1}", "\n```", " more", " tokens"]:
+                consumed.append(chunk)
+                yield chunk
+
+        text, metrics = stream_json_response(tokens())
+        self.assertEqual(text, "```json\n{\"a\": 1}\n```")
+        self.assertEqual(len(consumed), 3)
+        self.assertTrue(metrics["json_complete"])
+        self.assertIsNotNone(metrics["time_to_first_token"])
+        self.assertGreaterEqual(metrics["time_to_json"], metrics["time_to_first_token"])
+
+    def test_stream_without_json_returns_raw_text(self):
+        text, metrics = stream_json_response(iter(["no ", "json here"]))
+        self.assertEqual(text, "no json here")
+        self.assertFalse(metrics["json_complete"])
+        self.assertIsNone(metrics["time_to_json"])
+
+    def test_parses_bare_schema_constrained_json(self):
+        parser = StreamingJSONParser()
+        self.assertFalse(parser.feed("  [{\"category\": "))
+        self.assertTrue(parser.feed("\"Fee Payment\"}] trailing"))
+        self.assertEqual(parser.result, [{"category": "Fee Payment"}])
+
+    def test_parse_json_response_is_tolerant(self):
+        self.assertEqual(parse_json_response("<think>x</think>\n```json\n[1]\n```"), ([1], "fenced"))
+        self.assertEqual(parse_json_response('{"a": 1}'), ({"a": 1}, "raw"))
+        self.assertEqual(parse_json_response('Here it is:\n```\n{"a": [1, 2,],}\n```'), ({"a": [1, 2]}, "repaired"))
+        self.assertEqual(parse_json_response('Answer: {\u201ccategory\u201d: "Fee"} done'), ({"category": "Fee"}, "repaired"))
+        self.assertEqual(parse_json_response('[{"a": 1'), (None, "failed"))
+        self.assertEqual(parse_json_response(None), (None, "failed"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+from response_schema import classification_schema, validate_classification_items, validate_sub_classification
+
+class TestResponseSchema(unittest.TestCase):
+
+    def test_schema_enumerates_categories(self):
+        schema = classification_schema(["Fee Payment", "Adjustment"], {"Fee Payment": ["Ongoing Fee"]})
+        item = schema["items"]
+        self.assertEqual(item["properties"]["classification"]["properties"]["category"]["enum"], ["Fee Payment", "Adjustment"])
+        self.assertEqual(item["properties"]["sub_classification"]["anyOf"][0]["properties"]["category"]["enum"], ["Ongoing Fee"])
+        self.assertIn("sub_classification", item["required"])
+        self.assertNotIn("sub_classification", classification_schema()["items"]["properties"])
+
+    def test_validates_and_normalizes_items(self):
+        items = validate_classification_items({"classification": {"category": "Fee Payment", "confidence_score": "0.8"}})
+        self.assertEqual(items, [{"classification": {"category": "Fee Payment", "confidence_score": 0.8}, "extracted_fields": {}}])
+        self.assertEqual(validate_classification_items([]), [])
+        self.assertIsNone(validate_classification_items([{"classification": {"category": "Fee Payment", "confidence_score": "high"}}]))
+        self.assertIsNone(validate_classification_items({"category": "Fee Payment"}))
+
+    def test_validates_sub_classification(self):
+        self.assertEqual(validate_sub_classification({"category": "Ongoing Fee", "confidence_score": 0.7}), {"category": "Ongoing Fee", "confidence_score": 0.7})
+        self.assertIsNone(validate_sub_classification([{"category": "Ongoing Fee"}]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from results_store import ResultsStore, output_to_table, parse_amount, parse_date
+
+OUTPUT = {
+    "a.eml": [{"category": "Fee Payment", "confidence_score": 0.9, "sub_category": {"name": "Ongoing Fee", "confidence_score": 0.8},
+               "extracted_fields": {"deal_name": "Deal ABC", "amount": "$1,250.50", "transaction_date": "03/26/2025", "account_number": "NA", "currency": "USD"}}],
+    "b.pdf": [{"category": "Money Movement - Inbound", "confidence_score": 0.7, "sub_category": {},
+               "extracted_fields": {"deal_name": "Deal MNO", "amount": "EUR 14,000", "transaction_date": "March 25, 2025", "account_number": "77889", "currency": "EUR"}}],
+}
+
+class TestResultsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = ResultsStore(self.tmp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_parses_amounts_and_dates(self):
+        self.assertEqual(parse_amount("EUR 14,000"), Decimal("14000.00"))
+        self.assertEqual(parse_amount(50000), Decimal("50000.00"))
+        self.assertIsNone(parse_amount("NA"))
+        self.assertEqual(parse_date("March 25, 2025"), date(2025, 3, 25))
+        self.assertIsNone(parse_date("next week"))
+
+    def test_table_is_typed(self):
+        table = output_to_table(OUTPUT, run_id="r1")
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(str(table.schema.field("category").type), "dictionary<values=string, indices=int32, ordered=0>")
+        self.assertEqual(str(table.schema.field("confidence").type), "float")
+        self.assertEqual(table.column("amount")[0].as_py(), Decimal("1250.50"))
+        self.assertIsNone(table.column("account_number")[0].as_py())
+
+    def test_out_of_range_and_string_values_become_nulls(self):
+        output = {"c.eml": [{"category": "Fee Payment", "confidence_score": "0.9", "sub_category": {"name": "Ongoing Fee", "confidence_score": "high"},
+                             "extracted_fields": {"deal_name": "Deal ABC", "amount": "Ref 12345678901234567890", "transaction_date": "03/26/2025"}}],
+                  "d.eml": [{"category": "Fee Payment", "confidence_score": 0.8, "sub_category": {},
+                             "extracted_fields": {"amount": "$250"}}]}
+        with self.assertLogs("results_store", level="WARNING"):
+            table = output_to_table(output)
+        self.assertEqual(table.column("amount").to_pylist(), [None, Decimal("250.00")])
+        self.assertAlmostEqual(table.column("confidence")[0].as_py(), 0.9, places=5)
+        self.assertIsNone(table.column("sub_confidence")[0].as_py())
+        self.assertEqual(table.column("transaction_date")[0].as_py(), date(2025, 3, 26))
+        self.assertEqual(self.store.append(output), 2)
+
+    def test_filtered_queries(self):
+        self.store.append(OUTPUT, run_id="r1")
+        self.store.append({"c.eml": [{"category": "Fee Payment", "confidence_score": 0.5, "sub_category": {}, "extracted_fields": {}}]},
+                          run_id="r0", analyzed_at=datetime(2025, 1, 5, tzinfo=timezone.utc))
+
+        frame = self.store.query()
+        self.assertEqual(len(frame), 3)
+        self.assertEqual(str(frame["category"].dtype), "category")
+        self.assertEqual(list(self.store.query(deal_name="Deal MNO")["file"]), ["b.pdf"])
+        self.assertEqual(list(self.store.query(account_number="77889")["file"]), ["b.pdf"])
+        self.assertEqual(list(self.store.query(category="Fee Payment", start=date(2025, 3, 26), end=date(2025, 3, 31))["file"]), ["a.eml"])
+        self.assertEqual(set(self.store.query(analyzed_since=datetime(2025, 6, 1, tzinfo=timezone.utc))["run_id"]), {"r1"})
+
+    def test_compact_merges_part_files(self):
+        self.store.append(OUTPUT, run_id="r1")
+        self.store.append(OUTPUT, run_id="r2")
+        self.assertEqual(self.store.compact(), 1)
+        self.assertEqual(len(self.store.query()), 4)
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(self.tmp_dir)), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import gc
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from classifier import AnalysisLauncher
+from llm_backend import StubBackend
+from llm_cache import ResponseCache
+from workspace import PromptArchive, Workspace, default_workspace_root, safe_name
+
+class TestWorkspace(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_workspaces_are_private_and_removed(self):
+        first, second = Workspace(self.root), Workspace(self.root)
+        uploaded = io.BytesIO(b"pdf bytes")
+        uploaded.name = "../../etc/a b.pdf"
+        path = first.save_upload(uploaded)
+
+        self.assertEqual(path, os.path.join(first.path, "a_b.pdf"))
+        self.assertEqual(first.file_paths, [path])
+        self.assertNotEqual(first.path, second.path)
+        first.cleanup()
+        self.assertFalse(os.path.exists(first.path))
+        self.assertTrue(os.path.isdir(second.path))
+
+    def test_abandoned_workspace_is_removed_unless_detached(self):
+        abandoned, handed_over = Workspace(self.root), Workspace(self.root)
+        abandoned_path, handed_over_path = abandoned.path, handed_over.detach()
+        del abandoned, handed_over
+        gc.collect()
+        self.assertFalse(os.path.exists(abandoned_path))
+        self.assertTrue(os.path.isdir(handed_over_path))
+
+    def test_default_root_is_on_disk_unless_configured(self):
+        with patch.dict(os.environ, {"WORKSPACE_ROOT": ""}):
+            self.assertEqual(default_workspace_root(), os.path.join(tempfile.gettempdir(), "lending-workspaces"))
+        with patch.dict(os.environ, {"WORKSPACE_ROOT": "/dev/shm/uploads"}):
+            self.assertEqual(default_workspace_root(), "/dev/shm/uploads")
+
+    def test_archive_records_each_call_per_file(self):
+        archive = PromptArchive(os.path.join(self.root, "archive"))
+        launcher = AnalysisLauncher(None, cache=ResponseCache(), backend=StubBackend(), archive=archive)
+        launcher.process_text("a.eml", "[a.eml]: Please submit a fee payment of $250 for Deal KLM on 03/15/2025, account 54321.")
+        launcher.process_text("b.eml", "[b.eml]: Receive $14,000 inbound for Deal MNO on 03/25/2025, account 77889.")
+        launcher.process_text("a.eml", "[a.eml]: Please submit a fee payment of $250 for Deal KLM on 03/15/2025, account 54321.")
+
+        records = archive.records("a.eml")
+        self.assertEqual(len(records), 2)  # Classification and sub-classification; the cached rerun overwrites them
+        self.assertTrue(all(record["cached"] for record in records))
+        self.assertIn("Deal KLM", records[0]["prompt"])
+        self.assertEqual(sorted(os.listdir(archive.folder)), ["a.eml", "b.eml"])
+        self.assertEqual(safe_name(""), "file")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import weakref
+from typing import Dict, List, Optional
+
+# Bytes copied per step when spooling an upload to disk
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UNSAFE_NAME = re.compile(r'[^\w.-]+')
+
+
+def default_workspace_root() -> str:
+    """WORKSPACE_ROOT when set, else the system temp folder.
+
+    tmpfs (e.g. WORKSPACE_ROOT=/dev/shm/lending-workspaces) is opt-in only: it holds every session's uploads in RAM.
+    """
+    return os.environ.get("WORKSPACE_ROOT") or os.path.join(tempfile.gettempdir(), "lending-workspaces")
+
+
+def safe_name(name: str) -> str:
+    """A file or folder name with path separators and other unsafe characters replaced."""
+    return UNSAFE_NAME.sub("_", os.path.basename(name or "")).strip("._") or "file"
+
+
+class Workspace:
+    """Private folder holding one batch's input files; nothing outside it is read, written or deleted."""
+
+    def __init__(self, root: Optional[str] = None, prefix: str = "batch-"):
+        self.root = root or default_workspace_root()
+        os.makedirs(self.root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=prefix, dir=self.root)
+        self.name = os.path.basename(self.path)
+        self.file_paths: List[str] = []
+        # Removed when the owner (e.g. a browser session) is garbage collected, unless handed over with detach()
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, True)
+
+    def save_upload(self, uploaded_file) -> str:
+        """Spools one uploaded file into the workspace in fixed-size chunks and returns its path."""
+        path = os.path.join(self.path, safe_name(uploaded_file.name))
+        uploaded_file.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(uploaded_file, f, UPLOAD_CHUNK_BYTES)
+        self.file_paths.append(path)
+        return path
+
+    def detach(self) -> str:
+        """Hands the folder over to a new owner (e.g. a queued job) that will delete it; returns its path."""
+        self._finalizer.detach()
+        return self.path
+
+    def cleanup(self):
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
+
+
+class PromptArchive:
+    """Per-batch record of every prompt sent and response received, one JSON file per call grouped by input file."""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+    def record(self, trace: Optional[str], model: str, prompt: str, response: str, system: Optional[str] = None, cached: bool = False) -> str:
+        """Writes one call and returns its path; the same prompt for the same file overwrites its earlier record."""
+        folder = os.path.join(self.folder, safe_name(trace or "untraced"))
+        digest = hashlib.sha256(f"{model}\0{system or ''}\0{prompt}".encode("utf-8")).hexdigest()[:16]
+        path = os.path.join(folder, f"{digest}.json")
+        record = {"trace": trace, "model": model, "system": system, "prompt": prompt, "response": response, "cached": cached, "time": time.time()}
+        os.makedirs(folder, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+        return path
+
+    def records(self, trace: Optional[str] = None) -> List[Dict]:
+        """Archived calls for one file (or all files), oldest first."""
+        folders = [os.path.join(self.folder, safe_name(trace))] if trace else \
+            [os.path.join(self.folder, name) for name in sorted(os.listdir(self.folder))] if os.path.isdir(self.folder) else []
+        records = []
+        for folder in folders:
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                with open(os.path.join(folder, name), encoding="utf-8") as f:
+                    records.append(json.load(f))
+        return sorted(records, key=lambda record: record["time"])